@@ -0,0 +1,120 @@
+"""
+This file defines an Apache Airflow DAG that stages up to
+`LOADER_BATCH_SIZE` TSV files from the output directory at once, COPYs
+them into a single loading table in parallel, and upserts the result
+into the image table once.
+
+It is meant to drain a backlog of files (e.g., after a backfill) faster
+than `tsv_to_postgres_loader`, which loads one file per run.  A file
+that fails to load is moved to the failure directory without affecting
+the rest of the batch.
+"""
+from datetime import datetime, timedelta
+import logging
+import os
+from airflow import DAG
+
+from util.loader import operators
+
+
+logging.basicConfig(
+    format='%(asctime)s - %(name)s - %(levelname)s:  %(message)s',
+    level=logging.INFO
+)
+
+logger = logging.getLogger(__name__)
+
+DAG_ID = 'tsv_to_postgres_batch_loader'
+DB_CONN_ID = os.getenv('OPENLEDGER_CONN_ID', 'postgres_openledger_testing')
+MINIMUM_FILE_AGE_MINUTES = int(os.getenv('LOADER_FILE_AGE', 15))
+SCAN_UNREGISTERED_FILES = (
+    os.getenv('LOADER_SCAN_UNREGISTERED', 'true').lower() == 'true'
+)
+BATCH_SIZE = int(os.getenv('LOADER_BATCH_SIZE', 20))
+LOAD_WORKERS = int(os.getenv('LOADER_BATCH_WORKERS', 4))
+CONCURRENCY = 1
+SCHEDULE_CRON = None
+
+OUTPUT_DIR_PATH = os.path.realpath(os.getenv('OUTPUT_DIR', '/tmp/'))
+
+
+DAG_DEFAULT_ARGS = {
+    'owner': 'data-eng-admin',
+    'depends_on_past': False,
+    'start_date': datetime(2020, 1, 15),
+    'email_on_retry': False,
+    'retries': 2,
+    'retry_delay': timedelta(seconds=15),
+}
+
+
+def create_dag(
+        dag_id=DAG_ID,
+        args=DAG_DEFAULT_ARGS,
+        concurrency=CONCURRENCY,
+        max_active_runs=CONCURRENCY,
+        schedule_cron=SCHEDULE_CRON,
+        postgres_conn_id=DB_CONN_ID,
+        output_dir=OUTPUT_DIR_PATH,
+        minimum_file_age_minutes=MINIMUM_FILE_AGE_MINUTES,
+        batch_size=BATCH_SIZE,
+        load_workers=LOAD_WORKERS,
+        scan_unregistered_files=SCAN_UNREGISTERED_FILES,
+):
+    dag = DAG(
+        dag_id=dag_id,
+        default_args=args,
+        concurrency=concurrency,
+        max_active_runs=max_active_runs,
+        schedule_interval=schedule_cron,
+        catchup=False
+    )
+
+    with dag:
+        stage_oldest_tsv_files = operators.get_batch_file_staging_operator(
+            dag,
+            output_dir,
+            minimum_file_age_minutes,
+            batch_size,
+            scan_unregistered_files=scan_unregistered_files
+        )
+        create_loading_table = operators.get_table_creator_operator(
+            dag,
+            postgres_conn_id
+        )
+        load_local_data_batch = (
+            operators.get_load_local_data_batch_operator(
+                dag,
+                output_dir,
+                postgres_conn_id,
+                load_workers
+            )
+        )
+        delete_staged_files = operators.get_file_deletion_operator(
+            dag,
+            output_dir
+        )
+        one_failed_load = operators.get_one_failed_switch(
+            dag,
+            'load'
+        )
+        drop_loading_table = operators.get_drop_table_operator(
+            dag,
+            postgres_conn_id
+        )
+        move_staged_failures = operators.get_failure_moving_operator(
+            dag,
+            output_dir
+        )
+        (
+            stage_oldest_tsv_files
+            >> create_loading_table
+            >> load_local_data_batch
+            >> [delete_staged_files, drop_loading_table]
+        )
+        [create_loading_table, load_local_data_batch] >> one_failed_load
+        one_failed_load >> move_staged_failures
+    return dag
+
+
+globals()[DAG_ID] = create_dag()
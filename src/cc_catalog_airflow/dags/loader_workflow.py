@@ -18,6 +18,12 @@ DB_CONN_ID = os.getenv('OPENLEDGER_CONN_ID', 'postgres_openledger_testing')
 AWS_CONN_ID = os.getenv('AWS_CONN_ID', 'no_aws_conn_id')
 CCCATALOG_STORAGE_BUCKET = os.getenv('CCCATALOG_STORAGE_BUCKET')
 MINIMUM_FILE_AGE_MINUTES = int(os.getenv('LOADER_FILE_AGE', 15))
+SCAN_UNREGISTERED_FILES = (
+    os.getenv('LOADER_SCAN_UNREGISTERED', 'true').lower() == 'true'
+)
+STREAM_S3_THROUGH_WORKER = (
+    os.getenv('LOADER_STREAM_S3', 'false').lower() == 'true'
+)
 CONCURRENCY = 5
 SCHEDULE_CRON = '* * * * *'
 
@@ -44,7 +50,9 @@ def create_dag(
         aws_conn_id=AWS_CONN_ID,
         output_dir=OUTPUT_DIR_PATH,
         storage_bucket=CCCATALOG_STORAGE_BUCKET,
-        minimum_file_age_minutes=MINIMUM_FILE_AGE_MINUTES
+        minimum_file_age_minutes=MINIMUM_FILE_AGE_MINUTES,
+        stream_s3_through_worker=STREAM_S3_THROUGH_WORKER,
+        scan_unregistered_files=SCAN_UNREGISTERED_FILES
 ):
     dag = DAG(
         dag_id=dag_id,
@@ -59,7 +67,8 @@ def create_dag(
         stage_oldest_tsv_file = operators.get_file_staging_operator(
             dag,
             output_dir,
-            minimum_file_age_minutes
+            minimum_file_age_minutes,
+            scan_unregistered_files=scan_unregistered_files
         )
         create_loading_table = operators.get_table_creator_operator(
             dag,
@@ -75,7 +84,9 @@ def create_dag(
             dag,
             storage_bucket,
             aws_conn_id,
-            postgres_conn_id
+            postgres_conn_id,
+            stream_through_worker=stream_s3_through_worker,
+            output_dir=output_dir
         )
         one_failed_s3 = operators.get_one_failed_switch(
             dag,
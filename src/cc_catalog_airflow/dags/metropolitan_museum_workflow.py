@@ -17,37 +17,52 @@ DAG_DEFAULT_ARGS = {
 }
 
 DAG_ID = 'metropolitan_museum_workflow'
+FULL_DAG_ID = 'metropolitan_museum_full_workflow'
+SHARD_COUNT = 4
 
 
-def get_runner_operator(dag):
+def get_runner_operator(dag, shard_index, shard_count=SHARD_COUNT, dated=True):
     return PythonOperator(
-        task_id='pull_metropolitan_museum_data',
+        task_id=f'pull_metropolitan_museum_data_{shard_index}',
         python_callable=metropolitan_museum_of_art.main,
-        op_args=['{{ ds }}'],
+        op_args=['{{ ds }}' if dated else None],
+        op_kwargs={'shard_index': shard_index, 'shard_count': shard_count},
         depends_on_past=False,
         dag=dag
     )
 
 
-def create_dag():
+def create_dag(dag_id=DAG_ID, schedule_interval='@daily', dated=True):
+    """
+    The dated DAG pulls the objects changed on each day.  The undated
+    one pulls the whole collection, skipping objects that are unchanged
+    since they were last pulled, to catch anything the dated runs
+    missed.
+    """
     dag = DAG(
-        dag_id=DAG_ID,
+        dag_id=dag_id,
         default_args=DAG_DEFAULT_ARGS,
-        concurrency=1,
+        concurrency=SHARD_COUNT,
         max_active_runs=1,
         start_date=datetime(2020, 1, 1),
-        schedule_interval='@daily',
+        schedule_interval=schedule_interval,
         catchup=False,
     )
 
     with dag:
-        start_task = get_log_operator(dag, DAG_ID, 'Starting')
-        run_task = get_runner_operator(dag)
-        end_task = get_log_operator(dag, DAG_ID, 'Finished')
+        start_task = get_log_operator(dag, dag_id, 'Starting')
+        run_tasks = [
+            get_runner_operator(dag, i, dated=dated)
+            for i in range(SHARD_COUNT)
+        ]
+        end_task = get_log_operator(dag, dag_id, 'Finished')
 
-        start_task >> run_task >> end_task
+        start_task >> run_tasks >> end_task
 
     return dag
 
 
 globals()[DAG_ID] = create_dag()
+globals()[FULL_DAG_ID] = create_dag(
+    dag_id=FULL_DAG_ID, schedule_interval='@monthly', dated=False
+)
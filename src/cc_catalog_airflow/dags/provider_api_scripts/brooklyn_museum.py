@@ -1,6 +1,6 @@
 import os
 import logging
-import lxml.html as html
+from common import html_text
 from common.requester import DelayedRequester
 from common.storage.image import ImageStore
 
@@ -151,11 +151,10 @@ def _get_image_sizes(image):
 
 
 def _get_license_url(rights_info):
-    elements = html.fromstring(rights_info.get("description", ""))
     cc_links = [
-        elm[2]
-        for elm in elements.iterlinks()
-        if "https://creativecommons.org/" in elm[2]
+        link
+        for link in html_text.get_links(rights_info.get("description", ""))
+        if "https://creativecommons.org/" in link
     ]
     if len(cc_links) == 1:
         (license_url,) = cc_links
@@ -0,0 +1,186 @@
+"""
+This module saves the pagination state of a long-running provider script
+(e.g., a hash prefix and row offset, a cursor, or a continue token), so
+that a retried run can resume where the failed one stopped, rather than
+requesting every page again.
+
+Each checkpoint is saved along with the position of the script's
+`ImageStore` in its output file.  When a run resumes, rows written after
+the checkpoint are cut off the file, and the store appends to it from
+there, so no rows are lost or written twice.
+
+A script would use it like so:
+
+    checkpoint = Checkpoint(f'{PROVIDER}_{date}', image_store)
+    cursor = (checkpoint.resume() or {}).get('cursor', '*')
+    while cursor is not None:
+        cursor = _process_page(cursor)
+        checkpoint.save({'cursor': cursor})
+    image_store.commit()
+    checkpoint.clear()
+
+A script that must remember more than fits in a small state (e.g., the
+IDs of every record written so far) can append it to the checkpoint's
+log with `append_log`, and read it back with `read_log` after resuming.
+The log is cut back to the saved checkpoint along with the output file.
+
+Undated scripts have no date to name the checkpoint after, so they use
+`get_run_checkpoint` with a key identifying the dagrun instead.
+"""
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_SUBDIRECTORY = 'provider_checkpoints'
+
+
+class Checkpoint:
+    """
+    Saves and restores the pagination state of a script writing to
+    `image_store`.
+
+    Required init arguments:
+    name:         String identifying the run, e.g., the provider and the
+                  date being ingested.  A retry of the run must use the
+                  same name.
+    image_store:  The `ImageStore` the script writes to.
+
+    Optional init arguments:
+    checkpoint_dir:  String giving the directory in which the checkpoint
+                     is kept.  Defaults to a subdirectory of the directory
+                     of the store's output file.
+    """
+
+    def __init__(
+            self,
+            name,
+            image_store,
+            checkpoint_dir=None,
+            checkpoint_subdirectory=CHECKPOINT_SUBDIRECTORY,
+    ):
+        if checkpoint_dir is None:
+            checkpoint_dir = os.path.join(
+                os.path.dirname(image_store.output_path),
+                checkpoint_subdirectory
+            )
+        self._image_store = image_store
+        self._path = os.path.join(checkpoint_dir, f'{name}.json')
+        self._log_path = os.path.join(checkpoint_dir, f'{name}.log')
+
+    def resume(self):
+        """
+        Point the image store at the position saved with the checkpoint,
+        and return the saved state.  Returns None if there is no
+        checkpoint, or if it can not be resumed.
+        """
+        try:
+            with open(self._path) as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            logger.info(f'No checkpoint found at {self._path}')
+            self._truncate_log(0)
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f'Could not read checkpoint {self._path}:  {e}')
+            self._truncate_log(0)
+            return None
+
+        resumed = self._image_store.resume(
+            checkpoint['output_path'],
+            checkpoint['byte_offset'],
+            checkpoint['total_images'],
+        )
+        if not resumed:
+            self._truncate_log(0)
+            return None
+        self._truncate_log(checkpoint.get('log_offset', 0))
+        logger.info(f'Resuming from checkpoint {checkpoint["state"]}')
+        return checkpoint['state']
+
+    def save(self, state):
+        """
+        Save `state`, which must be serializable as JSON, along with the
+        current position of the image store.  The checkpoint file is
+        replaced atomically, so a failure while saving leaves the last
+        checkpoint in place.
+        """
+        output_path, byte_offset, total_images = (
+            self._image_store.get_position()
+        )
+        checkpoint = {
+            'state': state,
+            'output_path': output_path,
+            'byte_offset': byte_offset,
+            'total_images': total_images,
+            'log_offset': self._get_log_size(),
+        }
+        os.makedirs(os.path.dirname(self._path), exist_ok=True)
+        temp_path = f'{self._path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(temp_path, self._path)
+        logger.debug(f'Saved checkpoint {checkpoint}')
+
+    def append_log(self, values):
+        """
+        Append each of `values` to the log as a line.  Lines appended
+        after the last `save` are dropped when the checkpoint is resumed.
+        """
+        os.makedirs(os.path.dirname(self._log_path), exist_ok=True)
+        with open(self._log_path, 'a') as f:
+            f.writelines(f'{v}\n' for v in values)
+
+    def read_log(self):
+        """
+        Return the lines of the log, without their line endings.
+        """
+        try:
+            with open(self._log_path) as f:
+                return [line.rstrip('\n') for line in f]
+        except FileNotFoundError:
+            return []
+
+    def clear(self):
+        """
+        Remove the checkpoint, once the run it belongs to has finished.
+        """
+        try:
+            os.remove(self._path)
+            logger.info(f'Removed checkpoint {self._path}')
+        except FileNotFoundError:
+            pass
+        self._truncate_log(0)
+
+    def _get_log_size(self):
+        try:
+            return os.path.getsize(self._log_path)
+        except FileNotFoundError:
+            return 0
+
+    def _truncate_log(self, log_offset):
+        if log_offset == 0:
+            try:
+                os.remove(self._log_path)
+            except FileNotFoundError:
+                pass
+        else:
+            with open(self._log_path, 'r+') as f:
+                f.truncate(log_offset)
+
+
+def get_run_checkpoint(provider, run_key, image_store):
+    """
+    Return a checkpoint for the run of `provider` identified by
+    `run_key`, which must be the same for every try of the run.  If
+    `run_key` is None, a new run can not be told apart from a retry, so
+    any checkpoint left behind by an earlier run is removed, and the run
+    starts over.
+    """
+    if run_key is None:
+        checkpoint = Checkpoint(provider, image_store)
+        checkpoint.clear()
+    else:
+        checkpoint = Checkpoint(f'{provider}_{run_key}', image_store)
+    return checkpoint
@@ -0,0 +1,55 @@
+"""
+This module extracts the text and links from the HTML snippets that
+providers put in descriptions, bylines, and rights statements.
+
+Most of these strings are plain text, so they are only parsed if they
+contain a `<` or `&`.  Parsed results are cached, since the same strings
+(e.g., an artist's byline) come up again and again within a run.
+"""
+from functools import lru_cache
+import logging
+
+from lxml import etree
+import lxml.html as html
+
+logger = logging.getLogger(__name__)
+
+CACHE_SIZE = 4096
+
+_TEXT_XPATH = etree.XPath('//text()')
+
+
+def get_text(html_string, separator=' '):
+    """
+    Return all text in `html_string`, joined by `separator` and
+    stripped of surrounding whitespace.
+    """
+    return _extract(html_string, separator)[0]
+
+
+def get_text_and_links(html_string, separator=''):
+    """
+    Return a tuple of the text of `html_string` (see `get_text`), and a
+    list of the URLs linked in it, in document order.
+    """
+    text, links = _extract(html_string, separator)
+    return text, list(links)
+
+
+def get_links(html_string):
+    """
+    Return a list of the URLs linked in `html_string`, in document order.
+    """
+    return list(_extract(html_string, '')[1])
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _extract(html_string, separator):
+    if '<' not in html_string and '&' not in html_string:
+        return html_string.strip(), ()
+    if not html_string.strip():
+        return '', ()
+    element = html.fromstring(html_string)
+    text = separator.join(_TEXT_XPATH(element)).strip()
+    links = tuple(link[2] for link in element.iterlinks())
+    return text, links
@@ -1,9 +1,15 @@
+import fcntl
 import logging
+import os
 import requests
+import tempfile
+import threading
 import time
 
 logger = logging.getLogger(__name__)
 
+BUDGET_SUBDIRECTORY = 'request_budgets'
+
 
 class DelayedRequester:
     """
@@ -12,7 +18,9 @@ class DelayedRequester:
     receives).  The difference is that when this class is initialized
     with a non-zero `delay` parameter, it waits for at least that number
     of seconds between consecutive requests. This is to avoid hitting
-    rate limits of APIs.
+    rate limits of APIs.  The delay is shared by all threads using the
+    same instance, so several threads can make requests concurrently
+    without exceeding the rate limit.
 
     Optional Arguments:
     delay:  an integer giving the minimum number of seconds to wait
@@ -22,6 +30,7 @@ class DelayedRequester:
     def __init__(self, delay=0):
         self._DELAY = delay
         self._last_request = 0
+        self._lock = threading.Lock()
 
     def get(self, url, params=None, **kwargs):
         """
@@ -37,7 +46,6 @@ class DelayedRequester:
         logger.info(f'Using query parameters {params}')
         logger.info(f'Using headers {kwargs.get("headers")}')
         self._delay_processing()
-        self._last_request = time.time()
         try:
             response = requests.get(url, params=params, **kwargs)
             if response.status_code == requests.codes.ok:
@@ -54,11 +62,20 @@ class DelayedRequester:
             return None
 
     def _delay_processing(self):
-        wait = self._DELAY - (time.time() - self._last_request)
+        # Each caller reserves the next free request time before waiting,
+        # so that concurrent callers are spaced by the delay.
+        with self._lock:
+            wait = self._reserve_request_time()
         if wait >= 0:
             logging.debug(f'Waiting {wait} second(s)')
             time.sleep(wait)
 
+    def _reserve_request_time(self):
+        now = time.time()
+        wait = self._DELAY - (now - self._last_request)
+        self._last_request = now + max(wait, 0)
+        return wait
+
     def get_response_json(
             self,
             endpoint,
@@ -100,3 +117,51 @@ class DelayedRequester:
             )
 
         return response_json
+
+
+class SharedDelayedRequester(DelayedRequester):
+    """
+    A `DelayedRequester` whose delay is shared by every process on the
+    host using the same `budget_name`, e.g., the concurrent tasks of a
+    day-partitioned ingestion DAG.  The time of the last request is kept
+    in a small file, which is locked while a request time is reserved.
+
+    Optional Arguments:
+    delay:        an integer giving the minimum number of seconds to wait
+                  between consecutive requests of all processes sharing
+                  the budget.
+    budget_name:  a string naming the shared budget.
+    budget_dir:   a string giving the directory in which the budget file
+                  is kept.  Defaults to a subdirectory of the system's
+                  temporary directory.
+    """
+
+    def __init__(
+            self,
+            delay=0,
+            budget_name='default',
+            budget_dir=None,
+            budget_subdirectory=BUDGET_SUBDIRECTORY,
+    ):
+        super().__init__(delay)
+        if budget_dir is None:
+            budget_dir = os.path.join(
+                tempfile.gettempdir(), budget_subdirectory
+            )
+        self._budget_path = os.path.join(budget_dir, f'{budget_name}.budget')
+
+    def _reserve_request_time(self):
+        os.makedirs(os.path.dirname(self._budget_path), exist_ok=True)
+        with open(self._budget_path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(0)
+            try:
+                last_request = float(f.read())
+            except ValueError:
+                last_request = 0
+            now = time.time()
+            wait = self._DELAY - (now - last_request)
+            f.seek(0)
+            f.truncate()
+            f.write(repr(now + max(wait, 0)))
+        return wait
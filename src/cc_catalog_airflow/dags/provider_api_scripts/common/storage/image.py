@@ -2,9 +2,11 @@ from collections import namedtuple
 from datetime import datetime
 import logging
 import os
+import sqlite3
 
 from common.storage import util
 from common.storage import columns
+from common.storage import manifest
 
 logger = logging.getLogger(__name__)
 
@@ -225,11 +227,57 @@ class ImageStore:
         return self._total_images
 
     def commit(self):
-        """Writes all remaining images in the buffer to disk."""
+        """
+        Writes all remaining images in the buffer to disk, and registers
+        the output file in the loader manifest of its directory.
+        """
         self._flush_buffer()
+        self._register_output_file()
 
         return self._total_images
 
+    def get_position(self):
+        """
+        Writes all remaining images in the buffer to disk, and returns
+        the output path, the size of the output file in bytes, and the
+        total number of images so far.  The store can later be resumed
+        from this position with `resume`.
+        """
+        self._flush_buffer()
+        if os.path.exists(self._OUTPUT_PATH):
+            byte_offset = os.path.getsize(self._OUTPUT_PATH)
+        else:
+            byte_offset = 0
+        return self._OUTPUT_PATH, byte_offset, self._total_images
+
+    def resume(self, output_path, byte_offset, total_images):
+        """
+        Continues writing to `output_path` from a position returned by
+        `get_position`.  Anything written to the file after that position
+        is discarded.  Returns False, and leaves the store unchanged, if
+        the file no longer holds the data up to that position.
+        """
+        if byte_offset > 0 and (
+                not os.path.exists(output_path)
+                or os.path.getsize(output_path) < byte_offset
+        ):
+            logger.warning(
+                'Cannot resume from {}:  file is missing or too short.'
+                .format(output_path)
+            )
+            return False
+        if os.path.exists(output_path):
+            with open(output_path, 'r+') as f:
+                f.truncate(byte_offset)
+        logger.info(
+            'Resuming {} at byte {} with {} images'
+            .format(output_path, byte_offset, total_images)
+        )
+        self._image_buffer = []
+        self._OUTPUT_PATH = output_path
+        self._total_images = total_images
+        return True
+
     def _initialize_output_path(self, output_dir, output_file, provider):
         if output_dir is None:
             logger.info(
@@ -261,6 +309,12 @@ class ImageStore:
     """Get total images for directly using in scripts."""
     total_images = property(_get_total_images)
 
+    def _get_output_path(self):
+        return self._OUTPUT_PATH
+
+    """Get the path of the output file."""
+    output_path = property(_get_output_path)
+
     def _get_image(
             self,
             foreign_identifier,
@@ -331,6 +385,22 @@ class ImageStore:
                 [s if s is not None else '\\N' for s in prepared_strings]
             ) + '\n'
 
+    def _register_output_file(self):
+        if not os.path.exists(self._OUTPUT_PATH):
+            logger.debug('No output file!  Nothing to register.')
+            return
+        try:
+            manifest.register_file(
+                self._OUTPUT_PATH,
+                provider=self._PROVIDER,
+                row_count=self._total_images,
+            )
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(
+                'Could not register {} in the loader manifest:  {}'
+                .format(self._OUTPUT_PATH, e)
+            )
+
     def _flush_buffer(self):
         buffer_length = len(self._image_buffer)
         if buffer_length > 0:
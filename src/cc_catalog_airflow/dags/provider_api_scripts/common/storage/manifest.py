@@ -0,0 +1,143 @@
+"""
+This module keeps a small SQLite index of the finished TSV files in an
+output directory, so that the loader can find the next files to load
+without listing the directory and checking modification times.
+
+`ImageStore.commit` registers each file once it is finished, along with
+its provider, row count, size, and MD5 checksum.  The loader claims the
+oldest entries in a single transaction, so a file is never claimed
+before it is finished, and two loader runs never claim the same file.
+"""
+from collections import namedtuple
+from contextlib import contextmanager
+import hashlib
+import logging
+import os
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE_NAME = '.tsv_manifest.sqlite'
+LOCK_TIMEOUT_SECONDS = 30
+CHECKSUM_CHUNK_SIZE = 8 * 1024 * 1024
+
+ManifestEntry = namedtuple(
+    'ManifestEntry',
+    ['file_path', 'provider', 'row_count', 'byte_size', 'checksum']
+)
+
+_CREATE_TABLE_QUERY = (
+    'CREATE TABLE IF NOT EXISTS tsv_files ('
+    ' file_name TEXT PRIMARY KEY,'
+    ' provider TEXT,'
+    ' row_count INTEGER,'
+    ' byte_size INTEGER NOT NULL,'
+    ' checksum TEXT NOT NULL,'
+    ' registered_at REAL NOT NULL'
+    ')'
+)
+_CREATE_INDEX_QUERY = (
+    'CREATE INDEX IF NOT EXISTS tsv_files_registered_at_idx'
+    ' ON tsv_files (registered_at)'
+)
+
+
+def get_manifest_path(output_dir, manifest_file_name=MANIFEST_FILE_NAME):
+    return os.path.join(output_dir, manifest_file_name)
+
+
+def register_file(
+        file_path,
+        provider=None,
+        row_count=None,
+        manifest_file_name=MANIFEST_FILE_NAME,
+):
+    """
+    Record the finished file at `file_path` in the manifest of the
+    directory containing it.  Registering a file again replaces its
+    entry.
+    """
+    output_dir, file_name = os.path.split(os.path.abspath(file_path))
+    byte_size, checksum = _get_size_and_checksum(file_path)
+    logger.info(
+        f'Registering {file_path} with {row_count} rows, {byte_size} bytes,'
+        f' and checksum {checksum}'
+    )
+    with _connect(get_manifest_path(output_dir, manifest_file_name)) as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute(
+            'INSERT OR REPLACE INTO tsv_files'
+            ' (file_name, provider, row_count, byte_size, checksum,'
+            ' registered_at)'
+            ' VALUES (?, ?, ?, ?, ?, ?)',
+            (file_name, provider, row_count, byte_size, checksum, time.time())
+        )
+        conn.execute('COMMIT')
+
+
+def claim_files(
+        output_dir,
+        max_files=1,
+        manifest_file_name=MANIFEST_FILE_NAME,
+):
+    """
+    Remove up to `max_files` of the oldest entries from the manifest in
+    `output_dir`, and return them as a list of `ManifestEntry`s.
+
+    The entries are selected and removed in one write transaction, so
+    concurrent callers always get disjoint lists.
+    """
+    manifest_path = get_manifest_path(output_dir, manifest_file_name)
+    if not os.path.exists(manifest_path):
+        logger.info(f'No manifest found at {manifest_path}')
+        return []
+
+    with _connect(manifest_path) as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        rows = conn.execute(
+            'SELECT file_name, provider, row_count, byte_size, checksum'
+            ' FROM tsv_files ORDER BY registered_at, rowid LIMIT ?',
+            (max_files,)
+        ).fetchall()
+        conn.executemany(
+            'DELETE FROM tsv_files WHERE file_name = ?',
+            [(r[0],) for r in rows]
+        )
+        conn.execute('COMMIT')
+
+    entries = [
+        ManifestEntry(os.path.join(output_dir, r[0]), *r[1:]) for r in rows
+    ]
+    logger.info(f'Claimed {len(entries)} files from {manifest_path}')
+    return entries
+
+
+@contextmanager
+def _connect(manifest_path, timeout=LOCK_TIMEOUT_SECONDS):
+    """
+    Open a connection to the manifest at `manifest_path`, creating it if
+    needed.  Transactions are managed explicitly by the caller, and any
+    left open are rolled back.
+    """
+    conn = sqlite3.connect(
+        manifest_path, timeout=timeout, isolation_level=None
+    )
+    try:
+        conn.execute(_CREATE_TABLE_QUERY)
+        conn.execute(_CREATE_INDEX_QUERY)
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        conn.close()
+
+
+def _get_size_and_checksum(file_path, chunk_size=CHECKSUM_CHUNK_SIZE):
+    md5 = hashlib.md5()
+    byte_size = 0
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            md5.update(chunk)
+            byte_size += len(chunk)
+    return byte_size, md5.hexdigest()
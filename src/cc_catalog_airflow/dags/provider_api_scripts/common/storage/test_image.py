@@ -2,6 +2,7 @@ import logging
 import pytest
 
 from common.storage import image
+from common.storage import manifest
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s:  %(message)s',
@@ -125,6 +126,29 @@ def test_ImageStore_commit_writes_nothing_if_no_lines_in_buffer():
     image_store.commit()
 
 
+def test_ImageStore_commit_registers_output_file(tmpdir, setup_env):
+    output_file = 'testing.tsv'
+    output_dir = str(tmpdir)
+    image_store = image.ImageStore(
+        provider='testing_provider',
+        output_file=output_file,
+        output_dir=output_dir,
+    )
+    image_store.add_item(
+        foreign_landing_url='https://images.org/image01',
+        image_url='https://images.org/image01.jpg',
+        license_url='https://creativecommons.org/licenses/cc0/1.0/'
+    )
+    image_store.commit()
+    entries = manifest.claim_files(output_dir)
+
+    assert len(entries) == 1
+    assert entries[0].file_path == str(tmpdir.join(output_file))
+    assert entries[0].provider == 'testing_provider'
+    assert entries[0].row_count == 1
+    assert entries[0].byte_size == tmpdir.join(output_file).size()
+
+
 def test_ImageStore_produces_correct_total_images(setup_env):
     image_store = image.ImageStore(provider='testing_provider')
     image_store.add_item(
@@ -0,0 +1,79 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from common.storage import manifest
+
+
+def test_claim_files_returns_empty_list_without_manifest(tmpdir):
+    assert manifest.claim_files(str(tmpdir)) == []
+
+
+def test_register_file_records_size_and_checksum(tmpdir):
+    data = 'a\tb\nc\td\n'
+    path = tmpdir.join('test.tsv')
+    path.write(data)
+    manifest.register_file(path.strpath, provider='test', row_count=2)
+    entries = manifest.claim_files(str(tmpdir))
+
+    assert entries == [
+        manifest.ManifestEntry(
+            file_path=path.strpath,
+            provider='test',
+            row_count=2,
+            byte_size=len(data),
+            checksum=hashlib.md5(data.encode()).hexdigest(),
+        )
+    ]
+
+
+def test_register_file_again_replaces_entry(tmpdir):
+    path = tmpdir.join('test.tsv')
+    path.write('a\n')
+    manifest.register_file(path.strpath, row_count=1)
+    path.write('a\nb\n')
+    manifest.register_file(path.strpath, row_count=2)
+    entries = manifest.claim_files(str(tmpdir), max_files=5)
+
+    assert len(entries) == 1
+    assert entries[0].row_count == 2
+    assert entries[0].byte_size == 4
+
+
+def test_claim_files_claims_oldest_files_first(tmpdir):
+    for name in ['first.tsv', 'second.tsv', 'third.tsv']:
+        path = tmpdir.join(name)
+        path.write('')
+        manifest.register_file(path.strpath)
+    entries = manifest.claim_files(str(tmpdir), max_files=2)
+
+    assert [e.file_path for e in entries] == [
+        tmpdir.join('first.tsv').strpath, tmpdir.join('second.tsv').strpath
+    ]
+
+
+def test_claim_files_removes_claimed_entries(tmpdir):
+    path = tmpdir.join('test.tsv')
+    path.write('')
+    manifest.register_file(path.strpath)
+    manifest.claim_files(str(tmpdir))
+
+    assert manifest.claim_files(str(tmpdir)) == []
+
+
+def test_claim_files_never_claims_file_twice_concurrently(tmpdir):
+    file_names = [f'test{i}.tsv' for i in range(20)]
+    for name in file_names:
+        path = tmpdir.join(name)
+        path.write('')
+        manifest.register_file(path.strpath)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(
+            executor.map(
+                lambda _: manifest.claim_files(str(tmpdir), max_files=3),
+                range(10)
+            )
+        )
+    claimed = [e.file_path for entries in results for e in entries]
+
+    assert len(claimed) == len(file_names)
+    assert len(set(claimed)) == len(file_names)
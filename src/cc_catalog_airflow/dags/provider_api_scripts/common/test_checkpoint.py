@@ -0,0 +1,153 @@
+import os
+
+from common import checkpoint
+from common.storage import image
+
+
+def _add_image(image_store, number):
+    image_store.add_item(
+        foreign_landing_url=f'https://images.org/image{number:02}',
+        image_url=f'https://images.org/image{number:02}.jpg',
+        license_url='https://creativecommons.org/licenses/cc0/1.0/'
+    )
+
+
+def test_resume_returns_none_without_checkpoint(tmp_path):
+    image_store = image.ImageStore(
+        provider='testing_provider', output_dir=str(tmp_path)
+    )
+    test_checkpoint = checkpoint.Checkpoint('test_run', image_store)
+    assert test_checkpoint.resume() is None
+
+
+def test_resume_restores_state_and_image_store_position(tmp_path):
+    image_store = image.ImageStore(
+        provider='testing_provider',
+        output_file='test.tsv',
+        output_dir=str(tmp_path)
+    )
+    test_checkpoint = checkpoint.Checkpoint('test_run', image_store)
+    _add_image(image_store, 1)
+    _add_image(image_store, 2)
+    test_checkpoint.save({'cursor': 'abc'})
+    with open(image_store.output_path) as f:
+        saved_lines = f.readlines()
+    _add_image(image_store, 3)
+    image_store.get_position()
+
+    new_image_store = image.ImageStore(
+        provider='testing_provider',
+        output_file='new.tsv',
+        output_dir=str(tmp_path)
+    )
+    new_checkpoint = checkpoint.Checkpoint('test_run', new_image_store)
+    assert new_checkpoint.resume() == {'cursor': 'abc'}
+    assert new_image_store.output_path == image_store.output_path
+    assert new_image_store.total_images == 2
+    with open(new_image_store.output_path) as f:
+        assert f.readlines() == saved_lines
+
+
+def test_resume_returns_none_when_output_file_is_gone(tmp_path):
+    image_store = image.ImageStore(
+        provider='testing_provider', output_dir=str(tmp_path)
+    )
+    test_checkpoint = checkpoint.Checkpoint('test_run', image_store)
+    _add_image(image_store, 1)
+    test_checkpoint.save({'cursor': 'abc'})
+    os.remove(image_store.output_path)
+
+    new_image_store = image.ImageStore(
+        provider='testing_provider',
+        output_file='new.tsv',
+        output_dir=str(tmp_path)
+    )
+    new_checkpoint = checkpoint.Checkpoint('test_run', new_image_store)
+    assert new_checkpoint.resume() is None
+    assert new_image_store.output_path != image_store.output_path
+
+
+def test_clear_removes_checkpoint(tmp_path):
+    image_store = image.ImageStore(
+        provider='testing_provider', output_dir=str(tmp_path)
+    )
+    test_checkpoint = checkpoint.Checkpoint('test_run', image_store)
+    test_checkpoint.save({'cursor': 'abc'})
+    test_checkpoint.clear()
+    assert test_checkpoint.resume() is None
+    test_checkpoint.clear()
+
+
+def test_get_run_checkpoint_resumes_same_run_only(tmp_path):
+    image_store = image.ImageStore(
+        provider='testing_provider', output_dir=str(tmp_path)
+    )
+    test_checkpoint = checkpoint.get_run_checkpoint(
+        'testing_provider', '20200101T000000', image_store
+    )
+    _add_image(image_store, 1)
+    test_checkpoint.save({'cursor': 'abc'})
+
+    same_run = checkpoint.get_run_checkpoint(
+        'testing_provider', '20200101T000000', image_store
+    )
+    next_run = checkpoint.get_run_checkpoint(
+        'testing_provider', '20200201T000000', image_store
+    )
+    assert same_run.resume() == {'cursor': 'abc'}
+    assert next_run.resume() is None
+
+
+def test_get_run_checkpoint_without_key_clears_old_checkpoint(tmp_path):
+    image_store = image.ImageStore(
+        provider='testing_provider', output_dir=str(tmp_path)
+    )
+    test_checkpoint = checkpoint.get_run_checkpoint(
+        'testing_provider', None, image_store
+    )
+    _add_image(image_store, 1)
+    test_checkpoint.save({'cursor': 'abc'})
+
+    new_checkpoint = checkpoint.get_run_checkpoint(
+        'testing_provider', None, image_store
+    )
+    assert new_checkpoint.resume() is None
+
+
+def test_resume_cuts_log_back_to_checkpoint(tmp_path):
+    image_store = image.ImageStore(
+        provider='testing_provider', output_dir=str(tmp_path)
+    )
+    test_checkpoint = checkpoint.Checkpoint('test_run', image_store)
+    _add_image(image_store, 1)
+    test_checkpoint.append_log(['a', 'b'])
+    test_checkpoint.save({'cursor': 'abc'})
+    test_checkpoint.append_log(['c'])
+
+    new_checkpoint = checkpoint.Checkpoint('test_run', image_store)
+    assert new_checkpoint.resume() == {'cursor': 'abc'}
+    assert new_checkpoint.read_log() == ['a', 'b']
+
+
+def test_resume_without_checkpoint_removes_log(tmp_path):
+    image_store = image.ImageStore(
+        provider='testing_provider', output_dir=str(tmp_path)
+    )
+    test_checkpoint = checkpoint.Checkpoint('test_run', image_store)
+    test_checkpoint.append_log(['a'])
+
+    assert test_checkpoint.resume() is None
+    assert test_checkpoint.read_log() == []
+
+
+def test_clear_removes_log(tmp_path):
+    image_store = image.ImageStore(
+        provider='testing_provider', output_dir=str(tmp_path)
+    )
+    test_checkpoint = checkpoint.Checkpoint('test_run', image_store)
+    _add_image(image_store, 1)
+    test_checkpoint.append_log(['a'])
+    test_checkpoint.save({'cursor': 'abc'})
+
+    test_checkpoint.clear()
+    assert test_checkpoint.read_log() == []
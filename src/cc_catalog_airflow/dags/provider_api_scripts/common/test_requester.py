@@ -1,3 +1,4 @@
+from concurrent.futures import ThreadPoolExecutor
 import requests
 import time
 from unittest.mock import patch, MagicMock
@@ -23,6 +24,57 @@ def test_get_waits_before_getting(monkeypatch):
     assert time.time() - start >= delay
 
 
+def test_get_spaces_concurrent_requests(monkeypatch):
+    delay = 0.1
+    request_times = []
+
+    def mock_requests_get(url, params, **kwargs):
+        request_times.append(time.time())
+        return requests.Response()
+
+    monkeypatch.setattr(requester.requests, 'get', mock_requests_get)
+    dq = requester.DelayedRequester(delay)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(dq.get, ['https://google.com'] * 4))
+    request_times.sort()
+    assert all(
+        later - earlier >= delay * 0.9
+        for earlier, later in zip(request_times, request_times[1:])
+    )
+
+
+def test_shared_requesters_space_requests_across_instances(
+        monkeypatch, tmp_path
+):
+    delay = 0.1
+    request_times = []
+
+    def mock_requests_get(url, params, **kwargs):
+        request_times.append(time.time())
+        return requests.Response()
+
+    monkeypatch.setattr(requester.requests, 'get', mock_requests_get)
+    shared_requesters = [
+        requester.SharedDelayedRequester(
+            delay, budget_name='test_budget', budget_dir=str(tmp_path)
+        )
+        for _ in range(3)
+    ]
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        list(
+            executor.map(
+                lambda dq: dq.get('https://google.com'),
+                shared_requesters * 2
+            )
+        )
+    request_times.sort()
+    assert len(request_times) == 6
+    assert all(
+        later - earlier >= delay * 0.9
+        for earlier, later in zip(request_times, request_times[1:])
+    )
+
+
 def test_get_handles_exception(monkeypatch):
     def mock_requests_get(url, params, **kwargs):
         raise requests.exceptions.ReadTimeout('test timeout!')
@@ -10,11 +10,14 @@ Notes:                  https://www.europeana.eu/api/v2/search.json
 """
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 import logging
 import os
+import time
 
-from common.requester import DelayedRequester
+from common.checkpoint import Checkpoint
+from common.requester import SharedDelayedRequester
 from common.storage import image
 from util.loader import provider_details as prov
 
@@ -25,14 +28,18 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
-DELAY = 30.0
+# DELAY is shared by all Europeana tasks running on a host, so that the
+# concurrent reingestion days together make at most one request per DELAY
+# seconds.  A lone day task gets the whole budget.
+DELAY = 10.0
+# The search API returns at most 100 rows per request.
 RESOURCES_PER_REQUEST = '100'
 PROVIDER = prov.EUROPEANA_DEFAULT_PROVIDER
 API_KEY = os.getenv('EUROPEANA_API_KEY')
 ENDPOINT = 'https://www.europeana.eu/api/v2/search.json?'
-# SUB_PROVIDERS is a collection of providers within europeana which are
-# valuable to a broad audience
-SUB_PROVIDERS = prov.EUROPEANA_SUB_PROVIDERS
+# SUB_PROVIDER_INDEX maps the data providers within europeana which are
+# valuable to a broad audience to their sub providers
+SUB_PROVIDER_INDEX = prov.EUROPEANA_SUB_PROVIDER_INDEX
 
 RESOURCE_TYPE = 'IMAGE'
 REUSE_TERMS = ['open', 'restricted']
@@ -47,45 +54,65 @@ DEFAULT_QUERY_PARAMS = {
     'qf': [f'TYPE:{RESOURCE_TYPE}', 'provider_aggregation_edm_isShownBy:*'],
 }
 
-delayed_requester = DelayedRequester(DELAY)
+delayed_requester = SharedDelayedRequester(DELAY, budget_name=PROVIDER)
 image_store = image.ImageStore(provider=PROVIDER)
 
 
 def main(date):
     logger.info(f'Processing Europeana API for date: {date}')
+    start_time = time.time()
 
     start_timestamp, end_timestamp = _derive_timestamp_pair(date)
-    _get_pagewise(start_timestamp, end_timestamp)
+    checkpoint = Checkpoint(f'{PROVIDER}_{date}', image_store)
+    state = checkpoint.resume() or {}
+    _get_pagewise(
+        start_timestamp,
+        end_timestamp,
+        cursor=state.get('cursor', '*'),
+        checkpoint=checkpoint
+    )
 
     total_images = image_store.commit()
+    checkpoint.clear()
+    hours = max(time.time() - start_time, 1) / 3600
     logger.info(f'Total images: {total_images}')
+    logger.info(f'Images per hour: {total_images / hours:.0f}')
     logger.info('Terminated!')
 
 
-def _get_pagewise(start_timestamp, end_timestamp):
-    cursor = '*'
-    total_number_of_images = 0
-    images_stored = 0
-
-    while cursor is not None:
-        image_list, next_cursor, total_number_of_images = _get_image_list(
-            start_timestamp,
-            end_timestamp,
-            cursor
+def _get_pagewise(
+        start_timestamp,
+        end_timestamp,
+        cursor='*',
+        checkpoint=None
+):
+    # The page for the next cursor is fetched in the background while the
+    # current page is processed.
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        next_page = executor.submit(
+            _get_image_list, start_timestamp, end_timestamp, cursor
         )
+        while next_page is not None:
+            image_list, cursor, total_number_of_images = next_page.result()
 
-        if next_cursor is None:
-            break
+            if cursor is not None:
+                next_page = executor.submit(
+                    _get_image_list, start_timestamp, end_timestamp, cursor
+                )
+            else:
+                next_page = None
 
-        cursor = next_cursor
+            if image_list:
+                images_stored = _process_image_list(image_list)
+                logger.info(
+                    f'Images stored: {images_stored} of '
+                    f'{total_number_of_images}'
+                )
+            elif image_list is None:
+                logger.warning('No image data!')
 
-        if image_list is not None:
-            images_stored = _process_image_list(image_list)
-            logger.info(
-                f'Images stored: {images_stored} of {total_number_of_images}')
-
-        else:
-            logger.warning('No image data!  Attempting to continue')
+            if checkpoint is not None and cursor is not None:
+                checkpoint.save({'cursor': cursor})
 
 
 def _get_image_list(
@@ -168,7 +195,7 @@ def _process_image_list(image_list):
     return total_images
 
 
-def _process_image_data(image_data, sub_providers=SUB_PROVIDERS,
+def _process_image_data(image_data, sub_provider_index=SUB_PROVIDER_INDEX,
                         provider=PROVIDER):
     logger.debug(f'Processing image data: {image_data}')
     license_url = _get_license_url(image_data.get('rights'))
@@ -180,8 +207,10 @@ def _process_image_data(image_data, sub_providers=SUB_PROVIDERS,
     meta_data = _create_meta_data_dict(image_data)
 
     data_providers = set(meta_data['dataProvider'])
-    eligible_sub_providers = {s for s in sub_providers if sub_providers[s] in
-                              data_providers}
+    eligible_sub_providers = {
+        sub_provider_index[d] for d in data_providers
+        if d in sub_provider_index
+    }
     if len(eligible_sub_providers) > 1:
         raise Exception(f"More than one sub-provider identified for the "
                         f"image with foreign ID {foreign_id}")
@@ -11,12 +11,13 @@ Notes:                  https://www.flickr.com/help/terms/api
 """
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 import logging
 import os
+import threading
 
-import lxml.html as html
-
+from common import html_text
 from common.requester import DelayedRequester
 from common.storage import image
 from util.loader import provider_details as prov
@@ -43,9 +44,25 @@ DATE_TYPE = 'upload'
 # photo data for each hour of the day separately.  This is necessary because
 # if we request too much at once, the API will return fallacious results.
 DAY_DIVISION = 48 # divide into half hour increments
-# SUB_PROVIDERS is a collection of providers within Flickr which are
-# valuable to a broad audience
-SUB_PROVIDERS = prov.FLICKR_SUB_PROVIDERS
+# The day is not actually requested in fixed portions.  DAY_DIVISION only
+# sets the size of the first window; after that, each window is sized
+# from the number of images in the previous one, aiming for
+# TARGET_WINDOW_RESULTS.  Flickr only returns the first 4000 results of
+# a search, so a window reporting more than MAX_WINDOW_RESULTS images is
+# halved (down to MIN_WINDOW_SECONDS) before any of it is processed, and
+# quiet stretches of the day are covered by windows which grow by up to
+# MAX_WINDOW_GROWTH times per step.
+MAX_WINDOW_RESULTS = 4000
+TARGET_WINDOW_RESULTS = 3000
+MIN_WINDOW_SECONDS = 60
+MAX_WINDOW_GROWTH = 4
+# Windows are processed by up to MAX_WORKERS threads at once, while the
+# next windows are being sized.  All threads share delayed_requester, so
+# together they still make at most one request per DELAY seconds.
+MAX_WORKERS = 4
+# SUB_PROVIDER_INDEX maps the owners of the collections within Flickr
+# which are valuable to a broad audience to their sub providers
+SUB_PROVIDER_INDEX = prov.FLICKR_SUB_PROVIDER_INDEX
 
 LICENSE_INFO = {
     '1': ('by-nc-sa', '2.0'),
@@ -72,6 +89,7 @@ DEFAULT_QUERY_PARAMS = {
 
 delayed_requester = DelayedRequester(DELAY)
 image_store = image.ImageStore(provider=PROVIDER)
+image_store_lock = threading.Lock()
 
 
 def main(date):
@@ -80,12 +98,12 @@ def main(date):
     timestamp_pairs = _derive_timestamp_pair_list(date)
     date_type = DATE_TYPE
 
-    for start_timestamp, end_timestamp in timestamp_pairs:
-        total_images = _process_interval(
-            start_timestamp,
-            end_timestamp,
-            date_type
-        )
+    _process_windows_adaptively(
+        int(timestamp_pairs[0][0]),
+        int(timestamp_pairs[-1][1]),
+        int(timestamp_pairs[0][1]) - int(timestamp_pairs[0][0]),
+        date_type
+    )
 
     total_images = image_store.commit()
     logger.info(f'Total images: {total_images}')
@@ -122,7 +140,149 @@ def _derive_timestamp_pair_list(date, day_division=DAY_DIVISION):
     return pair_list
 
 
-def _process_interval(start_timestamp, end_timestamp, date_type):
+def _process_windows_adaptively(
+        start_time,
+        end_time,
+        initial_window_seconds,
+        date_type,
+        max_window_results=MAX_WINDOW_RESULTS,
+        target_window_results=TARGET_WINDOW_RESULTS,
+        min_window_seconds=MIN_WINDOW_SECONDS,
+        max_window_growth=MAX_WINDOW_GROWTH,
+        max_workers=MAX_WORKERS,
+):
+    """
+    Process every image uploaded between the epoch times `start_time`
+    and `end_time`, in consecutive windows sized so that each one holds
+    as close to `target_window_results` images as possible.
+
+    The first page of each window is requested before the window is
+    processed.  If it reports more than `max_window_results` images, the
+    window is halved and the page is thrown away; otherwise it is kept
+    as the first page of the window, and the rest of the window is
+    processed by one of `max_workers` threads.  Returns a list of
+    `(start, end, reported_total, requests)` tuples, one per window.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        window_stats, discarded_requests, futures = _submit_windows(
+            executor,
+            start_time,
+            end_time,
+            initial_window_seconds,
+            date_type,
+            max_window_results,
+            target_window_results,
+            min_window_seconds,
+            max_window_growth,
+        )
+    for future in futures:
+        # Raise any exception from the worker threads.
+        future.result()
+
+    logger.info(
+        f'Processed {len(window_stats)} windows in '
+        f'{sum(s[3] for s in window_stats) + discarded_requests} requests, '
+        f'{discarded_requests} of which were discarded when splitting.'
+    )
+    return window_stats
+
+
+def _submit_windows(
+        executor,
+        start_time,
+        end_time,
+        initial_window_seconds,
+        date_type,
+        max_window_results,
+        target_window_results,
+        min_window_seconds,
+        max_window_growth,
+):
+    window_stats = []
+    discarded_requests = 0
+    futures = []
+    window_start = start_time
+    window_seconds = initial_window_seconds
+
+    while window_start < end_time:
+        window_end = min(window_start + window_seconds, end_time)
+        window_seconds = window_end - window_start
+        image_list, total_pages, total = _get_image_page(
+            str(window_start), str(window_end), date_type, 1
+        )
+
+        if total is not None and total > max_window_results:
+            if window_seconds > min_window_seconds:
+                logger.info(
+                    f'Window {window_start} to {window_end} reports {total} '
+                    f'images.  Splitting it in half.'
+                )
+                discarded_requests += 1
+                window_seconds = max(window_seconds // 2, min_window_seconds)
+                continue
+            logger.warning(
+                f'Window {window_start} to {window_end} reports {total} '
+                f'images, but can not be split further.  Some images in it '
+                f'will be missed.'
+            )
+
+        futures.append(
+            executor.submit(
+                _process_interval,
+                str(window_start),
+                str(window_end),
+                date_type,
+                first_page=(image_list, total_pages),
+            )
+        )
+        request_count = max(total_pages or 1, 1)
+        window_stats.append((window_start, window_end, total, request_count))
+        logger.info(
+            f'Window {window_start} to {window_end} ({window_seconds} '
+            f'seconds): {total} images in {request_count} requests'
+        )
+
+        window_start = window_end
+        window_seconds = _get_next_window_seconds(
+            window_seconds,
+            total,
+            target_window_results,
+            min_window_seconds,
+            max_window_growth,
+        )
+
+    return window_stats, discarded_requests, futures
+
+
+def _get_next_window_seconds(
+        window_seconds,
+        total,
+        target_window_results=TARGET_WINDOW_RESULTS,
+        min_window_seconds=MIN_WINDOW_SECONDS,
+        max_window_growth=MAX_WINDOW_GROWTH,
+):
+    if total is None:
+        return window_seconds
+    next_window_seconds = int(
+        window_seconds * target_window_results / max(total, 1)
+    )
+    return max(
+        min_window_seconds,
+        min(next_window_seconds, window_seconds * max_window_growth)
+    )
+
+
+def _process_interval(
+        start_timestamp,
+        end_timestamp,
+        date_type,
+        first_page=None
+):
+    """
+    Process all pages of images for the given interval.  If the first
+    page has already been requested, it can be given as an
+    `(image_list, total_pages)` tuple in `first_page`.
+    """
     total_pages = 1
     page_number = 1
     total_images = 0
@@ -130,12 +290,15 @@ def _process_interval(start_timestamp, end_timestamp, date_type):
     while page_number <= total_pages:
         logger.info(f'Processing page: {page_number} of {total_pages}')
 
-        image_list, new_total_pages = _get_image_list(
-            start_timestamp,
-            end_timestamp,
-            date_type,
-            page_number
-        )
+        if page_number == 1 and first_page is not None:
+            image_list, new_total_pages = first_page
+        else:
+            image_list, new_total_pages = _get_image_list(
+                start_timestamp,
+                end_timestamp,
+                date_type,
+                page_number
+            )
 
         if image_list is not None:
             total_images = _process_image_list(image_list)
@@ -161,6 +324,29 @@ def _get_image_list(
         endpoint=ENDPOINT,
         max_tries=6  # one original try, plus 5 retries
 ):
+    image_list, total_pages, _ = _get_image_page(
+        start_timestamp,
+        end_timestamp,
+        date_type,
+        page_number,
+        endpoint=endpoint,
+        max_tries=max_tries
+    )
+    return image_list, total_pages
+
+
+def _get_image_page(
+        start_timestamp,
+        end_timestamp,
+        date_type,
+        page_number,
+        endpoint=ENDPOINT,
+        max_tries=6  # one original try, plus 5 retries
+):
+    """
+    Like `_get_image_list`, but also returns the total number of images
+    which Flickr reports for the interval.
+    """
     for try_number in range(max_tries):
         query_param_dict = _build_query_param_dict(
             start_timestamp,
@@ -183,9 +369,10 @@ def _get_image_list(
     if try_number == max_tries - 1 and (
             (image_list is None) or (total_pages is None)):
         logger.warning('No more tries remaining. Returning Nonetypes.')
-        return None, None
+        return None, None, None
     else:
-        return image_list, total_pages
+        total = _extract_total_from_json(response_json)
+        return image_list, total_pages, total
 
 
 def _extract_response_json(response):
@@ -244,15 +431,25 @@ def _extract_image_list_from_json(response_json):
     return image_list, total_pages
 
 
+def _extract_total_from_json(response_json):
+    try:
+        return int(response_json['photos']['total'])
+    except (KeyError, TypeError, ValueError):
+        logger.warning('Could not get the total number of images.')
+        return None
+
+
 def _process_image_list(image_list):
     total_images = 0
-    for image_data in image_list:
-        total_images = _process_image_data(image_data)
+    # The image store is shared by the threads processing windows.
+    with image_store_lock:
+        for image_data in image_list:
+            total_images = _process_image_data(image_data)
 
     return total_images
 
 
-def _process_image_data(image_data, sub_providers=SUB_PROVIDERS,
+def _process_image_data(image_data, sub_provider_index=SUB_PROVIDER_INDEX,
                         provider=PROVIDER):
     logger.debug(f'Processing image data: {image_data}')
     image_url, height, width = _get_image_url(image_data)
@@ -264,8 +461,7 @@ def _process_image_data(image_data, sub_providers=SUB_PROVIDERS,
     foreign_landing_url = _build_foreign_landing_url(creator_url, foreign_id)
 
     owner = image_data.get('owner').strip()
-    source = next((s for s in sub_providers if owner in sub_providers[s]),
-                  provider)
+    source = sub_provider_index.get(owner, provider)
 
     return image_store.add_item(
         foreign_landing_url=foreign_landing_url,
@@ -355,9 +551,9 @@ def _create_meta_data_dict(
     logger.debug(f'description: {description}')
     if description.strip():
         try:
-            description_text = ' '.join(
-                html.fromstring(description).xpath('//text()')
-            ).strip()[:max_description_length]
+            description_text = html_text.get_text(
+                description
+            )[:max_description_length]
             meta_data['description'] = description_text
         except Exception as e:
             logger.warning(f'Could not parse description {description}!\n{e}')
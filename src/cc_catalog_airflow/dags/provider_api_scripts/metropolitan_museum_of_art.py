@@ -7,29 +7,46 @@ Output:                 TSV file containing the image, their respective
                         meta-data.
 
 Notes:                  https://metmuseum.github.io/
-                        No rate limit specified.
+                        Request rate limited to 80 requests per second.
+                        The object IDs can be split into shards, which
+                        run as separate tasks with their own output files.
+                        Objects whose metadata is unchanged since a
+                        previous run are skipped on full runs.
 """
 
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import fcntl
+import glob
+import json
+import os
+import threading
 import common.requester as requester
 import common.storage.image as image
 import logging
 
 
-DELAY = 1.0  # time delay (in seconds)
+# DELAY is shared by all shards and workers running on a host.
+DELAY = 0.1  # time delay (in seconds)
 PROVIDER = 'met'
 ENDPOINT = 'https://collectionapi.metmuseum.org/public/collection/v1/objects'
+WORKER_COUNT = 4
+LAST_MODIFIED_SUBDIRECTORY = 'met_last_modified'
 
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s:  %(message)s',
     level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-delayed_requester = requester.DelayedRequester(DELAY)
+delayed_requester = requester.SharedDelayedRequester(
+    DELAY, budget_name=PROVIDER
+)
 image_store = image.ImageStore(provider=PROVIDER)
+image_store_lock = threading.Lock()
 
 
-def main(date=None):
+def main(date=None, shard_index=0, shard_count=1, worker_count=WORKER_COUNT):
     """
     This script pulls the data for a given date from the Metropolitan
     Museum of Art API, and writes it into a .TSV file to be eventually
@@ -38,20 +55,79 @@ def main(date=None):
     Required Arguments:
 
     date:  Date String in the form YYYY-MM-DD.  This is the date for
-           which running the script will pull data.
+           which running the script will pull data.  If None, the
+           whole collection is pulled, skipping objects that are
+           unchanged since the last full run of the shard started.
+
+    Optional Arguments:
+
+    shard_index:   integer giving the shard of the object IDs to pull.
+    shard_count:   integer giving the number of shards the object IDs are
+                   split into.  Each shard is written to its own file.
+    worker_count:  integer giving the number of objects to request
+                   concurrently.
     """
 
-    logger.info(f'Begin: Met Museum API requests for date: {date}')
+    logger.info(
+        f'Begin: Met Museum API requests for date: {date}, '
+        f'shard {shard_index} of {shard_count}'
+    )
+    shard_image_store = _get_shard_image_store(shard_index, shard_count)
+    index_dir = os.path.join(
+        os.path.dirname(shard_image_store.output_path),
+        LAST_MODIFIED_SUBDIRECTORY
+    )
+
+    watermark_path = os.path.join(
+        index_dir, f'{shard_index}_of_{shard_count}.watermark'
+    )
+    run_start_date = datetime.strftime(datetime.now(), '%Y-%m-%d')
 
     fetch_the_object_id = _get_object_ids(date)
     if fetch_the_object_id:
         logger.info(f'Total object found {fetch_the_object_id[0]}')
-        _extract_the_data(fetch_the_object_id[1])
+        object_ids = _get_shard(
+            fetch_the_object_id[1] or [], shard_index, shard_count
+        )
+        if date is None:
+            unchanged_ids = _get_unchanged_object_ids(
+                object_ids,
+                _load_last_modified_index(index_dir),
+                _read_watermark(watermark_path)
+            )
+            logger.info(f'Skipping {len(unchanged_ids)} unchanged objects')
+            object_ids = [i for i in object_ids if i not in unchanged_ids]
+        _save_last_modified_index(
+            _extract_the_data(object_ids, shard_image_store, worker_count),
+            index_dir,
+            shard_index,
+            shard_count
+        )
 
-    total_images = image_store.commit()
+    total_images = shard_image_store.commit()
+    if date is None and fetch_the_object_id:
+        _save_watermark(watermark_path, run_start_date)
     logger.info(f'Total CC0 images recieved {total_images}')
 
 
+def _get_shard_image_store(shard_index, shard_count):
+    if shard_count == 1:
+        return image_store
+    timestamp = datetime.strftime(datetime.now(), '%Y%m%d%H%M%S')
+    return image.ImageStore(
+        provider=PROVIDER,
+        output_file=(
+            f'{PROVIDER}_{shard_index}_of_{shard_count}_{timestamp}.tsv'
+        )
+    )
+
+
+def _get_shard(object_ids, shard_index, shard_count):
+    # Sharding by ID, rather than by position, keeps each object in the
+    # same shard as the collection grows.
+    return [i for i in object_ids if i % shard_count == shard_index]
+
+
 def _get_object_ids(date, endpoint=ENDPOINT):
     query_params = ''
     if date:
@@ -82,18 +158,125 @@ def _get_response_json(
     return response_json
 
 
-def _extract_the_data(object_ids):
-    for i in object_ids:
-        _get_data_for_image(i)
+def _get_unchanged_object_ids(object_ids, last_modified_index, watermark):
+    """
+    Return the set of `object_ids` in `last_modified_index` whose
+    metadata has not changed since `watermark`, the date on which the
+    last successful full run started.  Every object in the index was
+    pulled, or found unchanged, by then.
+    """
+    if watermark is None or not last_modified_index:
+        return set()
+    changed_object_ids = _get_object_ids(watermark)
+    if changed_object_ids is None:
+        return set()
+    changed_object_ids = set(changed_object_ids[1] or [])
+    return {
+        i for i in object_ids
+        if i in last_modified_index and i not in changed_object_ids
+    }
+
+
+def _read_watermark(watermark_path):
+    try:
+        with open(watermark_path) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        logger.info(f'No full run recorded at {watermark_path}')
+        return None
+
+
+def _save_watermark(watermark_path, watermark):
+    os.makedirs(os.path.dirname(watermark_path), exist_ok=True)
+    temp_path = f'{watermark_path}.tmp'
+    with open(temp_path, 'w') as f:
+        f.write(watermark)
+    os.replace(temp_path, watermark_path)
+
+
+def _load_last_modified_index(index_dir):
+    last_modified_index = {}
+    for path in glob.glob(os.path.join(index_dir, '*.json')):
+        shard_index = _read_last_modified_index(path)
+        for object_id, last_modified in shard_index.items():
+            last_modified_index[object_id] = max(
+                last_modified, last_modified_index.get(object_id, '')
+            )
+    logger.info(
+        f'Loaded last modified dates of {len(last_modified_index)} objects'
+    )
+    return last_modified_index
 
 
-def _get_data_for_image(object_id):
-    object_json = _get_and_validate_object_json(object_id)
+def _save_last_modified_index(
+        last_modified_index, index_dir, shard_index, shard_count
+):
+    """
+    Merge `last_modified_index` into the index file of the shard, so
+    that a dated run, which only pulls some objects of the shard, keeps
+    the dates of the others.
+    """
+    os.makedirs(index_dir, exist_ok=True)
+    index_path = os.path.join(
+        index_dir, f'{shard_index}_of_{shard_count}.json'
+    )
+    # The dated and full DAGs may save the same shard at once.
+    with open(f'{index_path}.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        merged_index = _read_last_modified_index(index_path)
+        for object_id, last_modified in last_modified_index.items():
+            merged_index[object_id] = max(
+                last_modified, merged_index.get(object_id, '')
+            )
+        temp_path = f'{index_path}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(merged_index, f)
+        os.replace(temp_path, index_path)
+
+
+def _read_last_modified_index(index_path):
+    try:
+        with open(index_path) as f:
+            shard_index = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning(f'Could not read index {index_path}:  {e}')
+        return {}
+    return {
+        int(object_id): last_modified
+        for object_id, last_modified in shard_index.items()
+    }
+
+
+def _extract_the_data(object_ids, store=image_store, worker_count=1):
+    """
+    Pull the data for each of `object_ids` into `store`, and return a
+    dictionary of the `metadataDate` of each object pulled.  Objects
+    that could not be requested are left out.
+    """
+    with ThreadPoolExecutor(max_workers=worker_count) as executor:
+        last_modified_dates = executor.map(
+            lambda i: _get_data_for_image(i, store), object_ids
+        )
+        return {
+            i: last_modified
+            for i, last_modified in zip(object_ids, last_modified_dates)
+            if last_modified
+        }
+
+
+def _get_data_for_image(object_id, store=image_store):
+    object_json = _get_object_json(object_id)
     if not object_json:
         logger.warning(
             f'Could not retrieve object_json for object_id: {object_id}'
         )
-        return
+        return None
+    last_modified = object_json.get('metadataDate')
+    if not object_json.get('isPublicDomain'):
+        logger.warning('CC0 license not detected')
+        return last_modified
 
     main_image = object_json.get('primaryImage')
     main_thumbnail = object_json.get('primaryImageSmall')
@@ -105,28 +288,26 @@ def _get_data_for_image(object_id):
 
     meta_data = _create_meta_data(object_json)
 
-    for img, thumb in image_list:
-        foreign_id = _build_foreign_id(object_id, img)
-        image_store.add_item(
-            foreign_landing_url=object_json.get('objectURL'),
-            image_url=img,
-            thumbnail_url=thumb,
-            license_='cc0',
-            license_version='1.0',
-            foreign_identifier=foreign_id,
-            creator=object_json.get('artistDisplayName'),
-            title=object_json.get('title'),
-            meta_data=meta_data
-        )
-
-
-def _get_and_validate_object_json(object_id, endpoint=ENDPOINT):
+    with image_store_lock:
+        for img, thumb in image_list:
+            foreign_id = _build_foreign_id(object_id, img)
+            store.add_item(
+                foreign_landing_url=object_json.get('objectURL'),
+                image_url=img,
+                thumbnail_url=thumb,
+                license_='cc0',
+                license_version='1.0',
+                foreign_identifier=foreign_id,
+                creator=object_json.get('artistDisplayName'),
+                title=object_json.get('title'),
+                meta_data=meta_data
+            )
+    return last_modified
+
+
+def _get_object_json(object_id, endpoint=ENDPOINT):
     object_endpoint = f'{endpoint}/{object_id}'
-    object_json = _get_response_json(None, object_endpoint)
-    if not object_json.get('isPublicDomain'):
-        logger.warning('CC0 license not detected')
-        object_json = None
-    return object_json
+    return _get_response_json(None, object_endpoint)
 
 
 def _build_foreign_id(object_id, image_url):
@@ -157,6 +338,18 @@ if __name__ == '__main__':
         '--date',
         help='Fetches all the artwork uploaded after given date'
     )
+    parser.add_argument(
+        '--shard-index',
+        type=int,
+        default=0,
+        help='Fetches the artwork in the given shard of the object IDs'
+    )
+    parser.add_argument(
+        '--shard-count',
+        type=int,
+        default=1,
+        help='Splits the object IDs into the given number of shards'
+    )
     args = parser.parse_args()
     if args.date:
         date = args.date
@@ -165,4 +358,4 @@ if __name__ == '__main__':
         date = None
     logger.info(f'Processing images')
 
-    main(date)
+    main(date, shard_index=args.shard_index, shard_count=args.shard_count)
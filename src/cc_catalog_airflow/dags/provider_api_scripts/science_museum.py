@@ -1,4 +1,5 @@
 import logging
+from common.checkpoint import get_run_checkpoint
 from common.requester import DelayedRequester
 from common.storage.image import ImageStore
 
@@ -45,29 +46,42 @@ YEAR_RANGE = [
 ]
 
 # global variable to keep track of records pulled
-RECORD_IDS = []
+RECORD_IDS = set()
 
 
-def main():
+def main(run_key=None):
+    """
+    `run_key` identifies the dagrun, so that a retry resumes the
+    checkpoint of the try that failed, and a new run starts over.  The
+    IDs of records already written are kept in the checkpoint's log, so
+    they are not written again when later pages repeat them.
+    """
     logger.info("Begin: Science Museum script")
-    for year_range in YEAR_RANGE:
+    checkpoint = get_run_checkpoint(PROVIDER, run_key, image_store)
+    state = checkpoint.resume() or {}
+    RECORD_IDS.update(checkpoint.read_log())
+    for year_range in YEAR_RANGE[state.get("year_range_index", 0):]:
         logger.info(f"Running for years {year_range}")
         from_year, to_year = year_range
         image_count = _page_records(
             from_year=from_year,
-            to_year=to_year
+            to_year=to_year,
+            page_number=state.pop("page_number", 0),
+            checkpoint=checkpoint
         )
         logger.info(f"Images pulled till now {image_count}")
     image_count = image_store.commit()
+    checkpoint.clear()
     logger.info(f"Total images pulled {image_count}")
 
 
 def _page_records(
         from_year,
-        to_year
+        to_year,
+        page_number=0,
+        checkpoint=None
         ):
     image_count = 0
-    page_number = 0
     condition = True
     while condition:
         query_param = _get_query_param(
@@ -80,8 +94,17 @@ def _page_records(
         )
         if type(batch_data) == list:
             if len(batch_data) > 0:
+                new_record_ids = _get_new_record_ids(batch_data)
                 image_count = _handle_object_data(batch_data)
                 page_number += 1
+                if checkpoint is not None:
+                    checkpoint.append_log(new_record_ids)
+                    checkpoint.save({
+                        "year_range_index": YEAR_RANGE.index(
+                            (from_year, to_year)
+                        ),
+                        "page_number": page_number
+                    })
             else:
                 condition = False
         else:
@@ -89,6 +112,14 @@ def _page_records(
     return image_count
 
 
+def _get_new_record_ids(batch_data):
+    record_ids = [obj_.get("id") for obj_ in batch_data]
+    return [
+        id_ for id_ in dict.fromkeys(record_ids)
+        if id_ is not None and id_ not in RECORD_IDS
+    ]
+
+
 def _get_query_param(
         page_number=0,
         from_year=0,
@@ -133,7 +164,7 @@ def _handle_object_data(batch_data):
         id_ = obj_.get("id")
         if id_ in RECORD_IDS:
             continue
-        RECORD_IDS.append(id_)
+        RECORD_IDS.add(id_)
         links = obj_.get("links")
 
         if links:
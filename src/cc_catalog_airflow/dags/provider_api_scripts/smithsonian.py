@@ -14,6 +14,7 @@ import logging
 import os
 
 from common.storage import image
+from common import checkpoint as ckpt
 from common import requester
 from util.loader import provider_details as prov
 
@@ -27,14 +28,22 @@ API_ROOT = 'https://api.si.edu/openaccess/api/v1.0/'
 SEARCH_ENDPOINT = API_ROOT + 'search'
 UNITS_ENDPOINT = API_ROOT + 'terms/unit_code'
 PROVIDER = prov.SMITHSONIAN_DEFAULT_PROVIDER
-# SUB_PROVIDERS is a collection of all providers within smithsonian
-SUB_PROVIDERS = prov.SMITHSONIAN_SUB_PROVIDERS
+# SUB_PROVIDER_INDEX maps the unit codes of all providers within
+# smithsonian to their sub providers
+SUB_PROVIDER_INDEX = prov.SMITHSONIAN_SUB_PROVIDER_INDEX
 ZERO_URL = 'https://creativecommons.org/publicdomain/zero/1.0/'
 DEFAULT_PARAMS = {
     'api_key': API_KEY,
     'rows': LIMIT
 }
 RETRIES = 3
+# The API does not page reliably past MAX_PARTITION_ROWS rows of a query,
+# so hash prefixes with more rows than that are split into longer ones
+# (up to MAX_HASH_PREFIX_LENGTH hexits).  Prefixes are processed one at
+# a time:  every request waits DELAY seconds, so the rate limit, not the
+# processing of responses, is what bounds the run time.
+MAX_PARTITION_ROWS = 10000
+MAX_HASH_PREFIX_LENGTH = 6
 # CREATOR_TYPES should have lower-case strings as keys, and integers as values.
 # The integers given the preference order of the different creator types, with
 # lower being more preferred. No preference is implied between two creator
@@ -111,18 +120,52 @@ image_store = image.ImageStore(provider=PROVIDER)
 delayed_requester = requester.DelayedRequester(delay=DELAY)
 
 
-def main():
+def main(run_key=None):
     """
-    This script loops through all hash prefixes of a specified length,
-    gathering metadata for each prefix in turn. A 'hash prefix' is
-    defined as a search query that finds all objects whose hash ID
-    starts with some string of hexits of a specified length (e.g.,
-    '0a2*' is a hash prefix of length 3).
+    This script loops through hash prefixes, gathering metadata for
+    each prefix in turn.  A 'hash prefix' is defined as a search query
+    that finds all objects whose hash ID starts with some string of
+    hexits (e.g., '0a2*' is a hash prefix of length 3).
+
+    A prefix whose first page reports more than MAX_PARTITION_ROWS rows
+    is replaced by its sixteen one-hexit-longer prefixes, up to
+    MAX_HASH_PREFIX_LENGTH hexits.  The row count comes with the first
+    page, so no extra requests are needed to plan the prefixes.
+
+    Progress is saved in a checkpoint after every page, so that a failed
+    run is resumed from the prefixes and row offset it reached.
+    `run_key` identifies the dagrun, so that only a retry of the same
+    run resumes its checkpoint.
     """
-    for hash_prefix in _get_hash_prefixes(HASH_PREFIX_LENGTH):
-        total_rows = _process_hash_prefix(hash_prefix)
-        logger.info(f'Total rows for {hash_prefix}:  {total_rows}')
+    checkpoint = ckpt.get_run_checkpoint(PROVIDER, run_key, image_store)
+    state = checkpoint.resume() or {}
+    pending_prefixes = (
+        state.get('pending_prefixes')
+        or list(_get_hash_prefixes(HASH_PREFIX_LENGTH))
+    )
+    row_offset = state.get('row_offset', 0)
+
+    def _save_progress(row_offset):
+        checkpoint.save(
+            {'pending_prefixes': pending_prefixes, 'row_offset': row_offset}
+        )
+
+    while pending_prefixes:
+        hash_prefix = pending_prefixes[0]
+        total_rows = _process_hash_prefix(
+            hash_prefix, row_offset=row_offset, save_progress=_save_progress
+        )
+        pending_prefixes.pop(0)
+        if total_rows is None:
+            pending_prefixes[0:0] = [
+                hash_prefix + h for h in _get_hash_prefixes(1)
+            ]
+        else:
+            logger.info(f'Total rows for {hash_prefix}:  {total_rows}')
+        row_offset = 0
+        _save_progress(row_offset)
     total_images = image_store.commit()
+    checkpoint.clear()
     logger.info(f'Total images:  {total_images}')
 
 
@@ -206,12 +249,25 @@ def _process_hash_prefix(
         hash_prefix,
         endpoint=SEARCH_ENDPOINT,
         limit=LIMIT,
-        retries=RETRIES
+        retries=RETRIES,
+        row_offset=0,
+        save_progress=None,
+        max_partition_rows=MAX_PARTITION_ROWS,
+        max_prefix_length=MAX_HASH_PREFIX_LENGTH,
 ):
+    """
+    Process the rows of `hash_prefix` from `row_offset` on, and return
+    the number of rows it has.  After every page, `save_progress` is
+    called with the next row offset, if given.
+
+    If the first page shows that the prefix has more than
+    `max_partition_rows` rows, and it is shorter than
+    `max_prefix_length`, nothing is processed, and None is returned, so
+    that the caller can split the prefix.
+    """
     logger.info(f'Processing hash_prefix:  {hash_prefix}')
     total_images = 0
-    row_offset = 0
-    total_rows = 1
+    total_rows = row_offset + 1
     while row_offset < total_rows:
         logger.debug(f'Row offset:  {row_offset}')
         query_params = _build_query_params(row_offset, hash_prefix=hash_prefix)
@@ -223,11 +279,22 @@ def _process_hash_prefix(
         if response_json is None:
             logger.warning('response_json is None!  Continuing...')
         else:
+            total_rows = response_json.get('response', {}).get('rowCount', 0)
+            if (
+                    row_offset == 0
+                    and total_rows > max_partition_rows
+                    and len(hash_prefix) < max_prefix_length
+            ):
+                logger.info(
+                    f'{hash_prefix} has {total_rows} rows.  Splitting it.'
+                )
+                return None
             new_total = _process_response_json(response_json)
             total_images = new_total if new_total is not None else total_images
             logger.info(f'Total images so far:  {total_images}')
-            total_rows = response_json.get('response', {}).get('rowCount', 0)
         row_offset += limit
+        if save_progress is not None:
+            save_progress(row_offset)
     return total_rows
 
 
@@ -363,10 +430,9 @@ def _extract_meta_data(row, description_types=DESCRIPTION_TYPES):
     return {k: v for (k, v) in meta_data.items() if v is not None}
 
 
-def _extract_source(meta_data, sub_providers=SUB_PROVIDERS):
+def _extract_source(meta_data, sub_provider_index=SUB_PROVIDER_INDEX):
     unit_code = meta_data.get('unit_code').strip()
-    source = next((s for s in sub_providers if unit_code in
-                   sub_providers[s]), None)
+    source = sub_provider_index.get(unit_code)
     if source is None:
         raise Exception(
             f"An unknown unit code value {unit_code} encountered ")
@@ -2,6 +2,7 @@ import json
 import logging
 import os
 import requests
+import threading
 from unittest.mock import patch, MagicMock
 
 import europeana
@@ -95,6 +96,77 @@ def test_get_image_list_with_realistic_response():
     assert image_list == expect_image_list
 
 
+def test_get_pagewise_processes_every_page_including_the_last():
+    pages = {
+        '*': (['image_1', 'image_2'], 'cursor_2', 3),
+        'cursor_2': (['image_3'], None, 3),
+    }
+    checkpoint = MagicMock()
+    with patch.object(
+            europeana,
+            '_get_image_list',
+            side_effect=lambda start, end, cursor: pages[cursor]
+    ) as mock_get_image_list, patch.object(
+            europeana,
+            '_process_image_list',
+            return_value=3
+    ) as mock_process_image_list:
+        europeana._get_pagewise('1234', '5678', checkpoint=checkpoint)
+
+    assert mock_get_image_list.call_count == 2
+    assert [c.args[0] for c in mock_process_image_list.call_args_list] == [
+        ['image_1', 'image_2'], ['image_3']
+    ]
+    checkpoint.save.assert_called_once_with({'cursor': 'cursor_2'})
+
+
+def test_get_pagewise_fetches_next_page_while_processing():
+    pages = {
+        '*': (['image_1'], 'cursor_2', 2),
+        'cursor_2': (['image_2'], None, 2),
+    }
+    next_page_requested = threading.Event()
+    requested_during_processing = []
+
+    def mock_get_image_list(start, end, cursor):
+        if cursor == 'cursor_2':
+            next_page_requested.set()
+        return pages[cursor]
+
+    def mock_process_image_list(image_list):
+        if image_list == ['image_1']:
+            requested_during_processing.append(
+                next_page_requested.wait(timeout=5)
+            )
+        return 1
+
+    with patch.object(
+            europeana, '_get_image_list', side_effect=mock_get_image_list
+    ), patch.object(
+            europeana,
+            '_process_image_list',
+            side_effect=mock_process_image_list
+    ):
+        europeana._get_pagewise('1234', '5678')
+
+    assert requested_during_processing == [True]
+
+
+def test_get_pagewise_stops_when_fetching_fails():
+    with patch.object(
+            europeana,
+            '_get_image_list',
+            return_value=(None, None, None)
+    ) as mock_get_image_list, patch.object(
+            europeana,
+            '_process_image_list'
+    ) as mock_process_image_list:
+        europeana._get_pagewise('1234', '5678')
+
+    mock_get_image_list.assert_called_once()
+    mock_process_image_list.assert_not_called()
+
+
 # This test will fail if default constants change.
 def test_build_query_param_dict_default():
     start_timestamp = '1234'
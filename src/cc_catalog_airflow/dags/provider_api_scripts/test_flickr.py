@@ -4,6 +4,8 @@ import os
 import requests
 from unittest.mock import patch, MagicMock
 
+import pytest
+
 import flickr
 
 RESOURCES = os.path.join(
@@ -94,6 +96,111 @@ def test_process_interval_skips_bad_pages():
     assert mock_get_image_list.called_with('1234', '5678', 'test', 5)
 
 
+def test_process_interval_uses_given_first_page():
+    with patch.object(
+            flickr,
+            '_get_image_list',
+            return_value=([], 3)
+    ) as mock_get_image_list, patch.object(
+            flickr,
+            '_process_image_list',
+            return_value=0
+    ):
+        flickr._process_interval('1234', '5678', 'test', first_page=([], 3))
+
+    assert mock_get_image_list.call_count == 2
+
+
+def _get_fake_image_page(images_per_second):
+    def _fake_image_page(start_timestamp, end_timestamp, date_type, page):
+        total = (int(end_timestamp) - int(start_timestamp)) * images_per_second
+        return [], max(-(-total // flickr.LIMIT), 1), total
+    return _fake_image_page
+
+
+def test_process_windows_adaptively_splits_busy_windows():
+    with patch.object(
+            flickr,
+            '_get_image_page',
+            side_effect=_get_fake_image_page(3)
+    ), patch.object(
+            flickr,
+            '_process_interval'
+    ) as mock_process_interval:
+        window_stats = flickr._process_windows_adaptively(
+            0, 3600, 1800, 'test', max_window_results=4000,
+            target_window_results=3000
+        )
+
+    assert window_stats[0] == (0, 900, 2700, 6)
+    assert all(s[2] <= 4000 for s in window_stats)
+    assert window_stats[-1][1] == 3600
+    assert [s[0] for s in window_stats[1:]] == [
+        s[1] for s in window_stats[:-1]
+    ]
+    assert mock_process_interval.call_count == len(window_stats)
+
+
+def test_process_windows_adaptively_merges_sparse_windows():
+    with patch.object(
+            flickr,
+            '_get_image_page',
+            side_effect=_get_fake_image_page(0)
+    ), patch.object(
+            flickr,
+            '_process_interval'
+    ):
+        window_stats = flickr._process_windows_adaptively(
+            0, 86400, 1800, 'test', max_window_growth=4
+        )
+
+    assert [s[1] - s[0] for s in window_stats] == [1800, 7200, 28800, 48600]
+
+
+def test_process_windows_adaptively_processes_unsplittable_window():
+    with patch.object(
+            flickr,
+            '_get_image_page',
+            side_effect=_get_fake_image_page(100)
+    ), patch.object(
+            flickr,
+            '_process_interval'
+    ) as mock_process_interval:
+        window_stats = flickr._process_windows_adaptively(
+            0, 60, 60, 'test', min_window_seconds=60
+        )
+
+    assert window_stats == [(0, 60, 6000, 12)]
+    mock_process_interval.assert_called_once_with(
+        '0', '60', 'test', first_page=([], 12)
+    )
+
+
+def test_process_windows_adaptively_raises_worker_errors():
+    with patch.object(
+            flickr,
+            '_get_image_page',
+            side_effect=_get_fake_image_page(1)
+    ), patch.object(
+            flickr,
+            '_process_interval',
+            side_effect=ValueError('test error')
+    ):
+        with pytest.raises(ValueError):
+            flickr._process_windows_adaptively(0, 3600, 1800, 'test')
+
+
+def test_get_next_window_seconds_keeps_size_given_unknown_total():
+    assert flickr._get_next_window_seconds(1800, None) == 1800
+
+
+def test_get_next_window_seconds_aims_for_target():
+    actual_seconds = flickr._get_next_window_seconds(
+        1800, 6000, target_window_results=3000, min_window_seconds=60
+    )
+    assert actual_seconds == 900
+
+
 def test_get_image_list_retries_with_none_response():
     with patch.object(
             flickr.delayed_requester,
@@ -234,6 +341,15 @@ def test_extract_image_list_from_json_handles_realistic_input():
     assert actual_total_pages == expect_total_pages
 
 
+def test_extract_total_from_json_handles_realistic_input():
+    test_dict = _get_resource_json('flickr_example_pretty.json')
+    assert flickr._extract_total_from_json(test_dict) == 30
+
+
+def test_extract_total_from_json_handles_missing_photos():
+    assert flickr._extract_total_from_json({'stat': 'ok'}) is None
+
+
 def test_extract_image_list_from_json_handles_missing_photo_list():
     test_dict = {'stat': 'ok', 'photos': {}}
     assert flickr._extract_image_list_from_json(test_dict)[0] is None
@@ -167,3 +167,166 @@ def test_get_data_for_image_returns_response_json_with_additional_images(monkeyp
     )
 
     assert mock_add.call_count == 3
+
+
+def test_get_shard_splits_object_ids_by_id():
+    object_ids = [1, 2, 3, 4, 5, 6, 7]
+    shards = [mma._get_shard(object_ids, i, 3) for i in range(3)]
+
+    assert shards == [[3, 6], [1, 4, 7], [2, 5]]
+
+
+def _get_mock_object_ids(modified_dates):
+    """
+    Mock `_get_object_ids` for a collection whose objects were last
+    modified on `modified_dates`, returning every object modified on or
+    after the date queried.
+    """
+    def mock_get_object_ids(date):
+        object_ids = [
+            i for i, modified in modified_dates.items()
+            if date is None or modified[:10] >= date
+        ]
+        return [len(object_ids), object_ids]
+    return mock_get_object_ids
+
+
+def test_get_unchanged_object_ids_skips_indexed_objects_not_changed():
+    last_modified_index = {
+        1: "2020-09-01T04:51:21.98Z",
+        2: "2020-09-05T04:51:21.98Z",
+        3: "2020-09-05T04:51:21.98Z",
+    }
+    modified_dates = {
+        1: "2020-09-01T04:51:21.98Z",
+        2: "2020-09-12T04:51:21.98Z",
+        3: "2020-09-05T04:51:21.98Z",
+        4: "2020-09-11T04:51:21.98Z",
+    }
+    with patch.object(
+        mma, "_get_object_ids", side_effect=_get_mock_object_ids(modified_dates)
+    ) as mock_get_object_ids:
+        unchanged_ids = mma._get_unchanged_object_ids(
+            [1, 2, 3, 4], last_modified_index, "2020-09-10"
+        )
+
+    mock_get_object_ids.assert_called_once_with("2020-09-10")
+    assert unchanged_ids == {1, 3}
+
+
+def test_get_unchanged_object_ids_without_index_skips_nothing():
+    with patch.object(mma, "_get_object_ids") as mock_get_object_ids:
+        unchanged_ids = mma._get_unchanged_object_ids([1, 2], {}, "2020-09-10")
+
+    mock_get_object_ids.assert_not_called()
+    assert unchanged_ids == set()
+
+
+def test_get_unchanged_object_ids_without_watermark_skips_nothing():
+    with patch.object(mma, "_get_object_ids") as mock_get_object_ids:
+        unchanged_ids = mma._get_unchanged_object_ids(
+            [1, 2], {1: "2020-09-01"}, None
+        )
+
+    mock_get_object_ids.assert_not_called()
+    assert unchanged_ids == set()
+
+
+def test_get_data_for_image_with_empty_response():
+    with patch.object(mma.delayed_requester, "get_response_json", return_value=None):
+        assert mma._get_data_for_image(10) is None
+
+
+def test_extract_the_data_skips_objects_that_fail():
+    def mock_get_object_json(object_id):
+        if object_id == 2:
+            return None
+        return {"isPublicDomain": False, "metadataDate": "2020-09-01"}
+
+    with patch.object(
+        mma, "_get_object_json", side_effect=mock_get_object_json
+    ):
+        last_modified_dates = mma._extract_the_data([1, 2, 3], worker_count=2)
+
+    assert last_modified_dates == {1: "2020-09-01", 3: "2020-09-01"}
+
+
+def test_last_modified_index_merges_shard_files(tmp_path):
+    index_dir = str(tmp_path)
+    mma._save_last_modified_index({1: "2020-09-01", 2: "2020-09-01"}, index_dir, 0, 2)
+    mma._save_last_modified_index({2: "2020-09-05", 3: "2020-09-05"}, index_dir, 1, 2)
+
+    last_modified_index = mma._load_last_modified_index(index_dir)
+
+    assert last_modified_index == {
+        1: "2020-09-01",
+        2: "2020-09-05",
+        3: "2020-09-05",
+    }
+
+
+def test_main_pulls_shard_and_skips_unchanged_objects(tmp_path, monkeypatch):
+    monkeypatch.setenv("OUTPUT_DIR", str(tmp_path))
+    index_dir = os.path.join(str(tmp_path), mma.LAST_MODIFIED_SUBDIRECTORY)
+    watermark_path = os.path.join(index_dir, "1_of_2.watermark")
+    mma._save_last_modified_index({1: "2020-09-01", 3: "2020-09-01"}, index_dir, 1, 2)
+    mma._save_watermark(watermark_path, "2020-09-02")
+    modified_dates = {i: f"2020-09-{i:02}" for i in range(1, 6)}
+
+    def mock_get_data_for_image(object_id, store):
+        return modified_dates[object_id]
+
+    with patch.object(
+        mma, "_get_object_ids", side_effect=_get_mock_object_ids(modified_dates)
+    ), patch.object(
+        mma, "_get_data_for_image", side_effect=mock_get_data_for_image
+    ) as mock_get_data:
+        mma.main(shard_index=1, shard_count=2)
+
+    assert sorted(c.args[0] for c in mock_get_data.call_args_list) == [3, 5]
+    assert mma._load_last_modified_index(index_dir) == {
+        1: "2020-09-01",
+        3: "2020-09-03",
+        5: "2020-09-05",
+    }
+    assert mma._read_watermark(watermark_path) > "2020-09-02"
+
+
+def test_main_dated_run_leaves_watermark(tmp_path, monkeypatch):
+    monkeypatch.setenv("OUTPUT_DIR", str(tmp_path))
+    index_dir = os.path.join(str(tmp_path), mma.LAST_MODIFIED_SUBDIRECTORY)
+
+    with patch.object(
+        mma, "_get_object_ids", return_value=[1, [3]]
+    ), patch.object(
+        mma, "_get_data_for_image", return_value="2020-09-10"
+    ):
+        mma.main("2020-09-10", shard_index=1, shard_count=2)
+
+    assert mma._read_watermark(
+        os.path.join(index_dir, "1_of_2.watermark")
+    ) is None
+
+
+def test_main_dated_run_keeps_index_of_full_run(tmp_path, monkeypatch):
+    monkeypatch.setenv("OUTPUT_DIR", str(tmp_path))
+    index_dir = os.path.join(str(tmp_path), mma.LAST_MODIFIED_SUBDIRECTORY)
+
+    def mock_get_object_ids(date):
+        return [4, [1, 2, 3, 4]] if date is None else [1, [3]]
+
+    def mock_get_data_for_image(object_id, store):
+        return "2020-09-10" if object_id == 3 else "2020-09-01"
+
+    with patch.object(
+        mma, "_get_object_ids", side_effect=mock_get_object_ids
+    ), patch.object(
+        mma, "_get_data_for_image", side_effect=mock_get_data_for_image
+    ):
+        mma.main(shard_index=1, shard_count=2)
+        mma.main("2020-09-10", shard_index=1, shard_count=2)
+
+    assert mma._load_last_modified_index(index_dir) == {
+        1: "2020-09-01",
+        3: "2020-09-10",
+    }
@@ -89,6 +89,48 @@ def test_page_record_failure():
     assert mock_handle.call_count == 0
 
 
+def test_main_resumes_seen_record_ids():
+    object_data = _get_resource_json("objects_data.json")
+    mock_checkpoint = MagicMock()
+    mock_checkpoint.resume.return_value = {
+        "year_range_index": len(sm.YEAR_RANGE) - 1,
+        "page_number": 3
+    }
+    mock_checkpoint.read_log.return_value = ["co8102855"]
+    with patch.object(sm, "RECORD_IDS", set()), patch.object(
+        sm, "get_run_checkpoint", return_value=mock_checkpoint
+    ) as mock_get_checkpoint, patch.object(
+        sm, "_get_batch_objects", side_effect=[object_data, []]
+    ) as mock_get_batch, patch.object(
+        sm.image_store, "add_item"
+    ) as mock_add_item, patch.object(sm.image_store, "commit"):
+        sm.main(run_key="20200101T000000")
+
+    mock_get_checkpoint.assert_called_once_with(
+        sm.PROVIDER, "20200101T000000", sm.image_store
+    )
+    assert mock_get_batch.call_args_list[0][1]["query_param"][
+        "page[number]"
+    ] == 3
+    mock_add_item.assert_not_called()
+    mock_checkpoint.append_log.assert_called_once_with([])
+    mock_checkpoint.save.assert_called_once_with(
+        {"year_range_index": len(sm.YEAR_RANGE) - 1, "page_number": 4}
+    )
+    mock_checkpoint.clear.assert_called_once()
+
+
+def test_page_records_logs_new_record_ids():
+    object_data = _get_resource_json("objects_data.json")
+    mock_checkpoint = MagicMock()
+    with patch.object(sm, "RECORD_IDS", set()), patch.object(
+        sm, "_get_batch_objects", side_effect=[object_data * 2, []]
+    ), patch.object(sm.image_store, "add_item"):
+        sm._page_records(0, 1500, checkpoint=mock_checkpoint)
+
+    mock_checkpoint.append_log.assert_called_once_with(["co8102855"])
+
+
 def test_get_batch_object_success():
     query_param = {
         "has_image": 1,
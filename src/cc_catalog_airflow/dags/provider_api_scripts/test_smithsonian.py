@@ -1,7 +1,8 @@
+from copy import deepcopy
 import json
 import logging
 import os
-from unittest.mock import patch, call
+from unittest.mock import ANY, patch, call
 
 import pytest
 
@@ -194,6 +195,133 @@ def test_process_hash_prefix_with_good_response_json():
     mock_process_response.assert_has_calls(expect_process_response_calls)
 
 
+def test_main_keys_checkpoint_by_run():
+    with patch.object(
+        si.ckpt, 'Checkpoint'
+    ) as mock_checkpoint, patch.object(
+        si.image_store, 'commit'
+    ), patch.object(si, '_process_hash_prefix', return_value=0):
+        mock_checkpoint.return_value.resume.return_value = None
+        si.main(run_key='20200101T000000')
+    mock_checkpoint.assert_called_once_with(
+        f'{si.PROVIDER}_20200101T000000', si.image_store
+    )
+
+
+def test_main_resumes_from_checkpoint():
+    patch_resume = patch.object(
+        si.ckpt.Checkpoint,
+        'resume',
+        return_value={'pending_prefixes': ['a1', 'a2'], 'row_offset': 1000}
+    )
+    patch_save = patch.object(si.ckpt.Checkpoint, 'save')
+    patch_clear = patch.object(si.ckpt.Checkpoint, 'clear')
+    patch_commit = patch.object(si.image_store, 'commit')
+    patch_process_hash_prefix = patch.object(
+        si, '_process_hash_prefix', return_value=0
+    )
+    with patch_resume, patch_save, patch_clear as mock_clear, patch_commit:
+        with patch_process_hash_prefix as mock_process_hash_prefix:
+            si.main(run_key='20200101T000000')
+    assert mock_process_hash_prefix.call_args_list == [
+        call('a1', row_offset=1000, save_progress=ANY),
+        call('a2', row_offset=0, save_progress=ANY),
+    ]
+    mock_clear.assert_called_once()
+
+
+def test_main_splits_large_prefixes():
+    saved_states = []
+    patch_resume = patch.object(
+        si.ckpt.Checkpoint, 'resume', return_value=None
+    )
+    patch_save = patch.object(
+        si.ckpt.Checkpoint,
+        'save',
+        side_effect=lambda state: saved_states.append(deepcopy(state))
+    )
+    patch_clear = patch.object(si.ckpt.Checkpoint, 'clear')
+    patch_commit = patch.object(si.image_store, 'commit')
+    patch_prefix_length = patch.object(si, 'HASH_PREFIX_LENGTH', 1)
+    patch_process_hash_prefix = patch.object(
+        si,
+        '_process_hash_prefix',
+        side_effect=lambda p, **kwargs: None if p == '1' else 0
+    )
+    with patch_resume, patch_save, patch_clear, patch_commit:
+        with patch_prefix_length, patch_process_hash_prefix as mock_process:
+            si.main(run_key='20200101T000000')
+    split_prefixes = [f'1{h:x}' for h in range(16)]
+    processed_prefixes = [c[0][0] for c in mock_process.call_args_list]
+    assert processed_prefixes == (
+        ['0', '1'] + split_prefixes + [f'{h:x}' for h in range(2, 16)]
+    )
+    assert saved_states[1] == {
+        'pending_prefixes': (
+            split_prefixes + [f'{h:x}' for h in range(2, 16)]
+        ),
+        'row_offset': 0
+    }
+
+
+def test_process_hash_prefix_returns_none_for_large_prefix():
+    response_json = {'response': {'rowCount': 50}}
+    patch_get_response_json = patch.object(
+        si.delayed_requester,
+        'get_response_json',
+        return_value=response_json
+    )
+    patch_process_response = patch.object(si, '_process_response_json')
+    with patch_get_response_json as mock_get_response_json:
+        with patch_process_response as mock_process_response:
+            actual_total_rows = si._process_hash_prefix(
+                'a0', limit=10, max_partition_rows=10
+            )
+    assert actual_total_rows is None
+    mock_get_response_json.assert_called_once()
+    mock_process_response.assert_not_called()
+
+
+def test_process_hash_prefix_keeps_large_prefix_at_max_length():
+    response_json = {'response': {'rowCount': 50}}
+    patch_get_response_json = patch.object(
+        si.delayed_requester,
+        'get_response_json',
+        return_value=response_json
+    )
+    patch_process_response = patch.object(
+        si, '_process_response_json', return_value=0
+    )
+    with patch_get_response_json:
+        with patch_process_response as mock_process_response:
+            actual_total_rows = si._process_hash_prefix(
+                'a0', limit=10, max_partition_rows=10, max_prefix_length=2
+            )
+    assert actual_total_rows == 50
+    assert mock_process_response.call_count == 5
+
+
+def test_process_hash_prefix_saves_progress():
+    response_json = {'response': {'rowCount': 250}}
+    saved_progress = []
+    patch_get_response_json = patch.object(
+        si.delayed_requester,
+        'get_response_json',
+        return_value=response_json
+    )
+    patch_process_response = patch.object(
+        si, '_process_response_json', return_value=0
+    )
+    with patch_get_response_json, patch_process_response:
+        si._process_hash_prefix(
+            'a0',
+            limit=100,
+            row_offset=100,
+            save_progress=saved_progress.append
+        )
+    assert saved_progress == [200, 300]
+
+
 def test_build_query_params():
     hash_prefix = 'ff'
     row_offset = 10
@@ -1,6 +1,7 @@
 import json
 import logging
 import os
+import time
 from unittest.mock import patch
 
 import wikimedia_commons as wmc
@@ -114,12 +115,190 @@ def test_get_image_batch(monkeypatch):
     monkeypatch.setattr(wmc.delayed_requester, 'get_response_json',
                         mock_get_response_json)
     actual_image_batch, actual_continue_token = wmc._get_image_batch(
-        '2019-01-01', '2019-01-02'
+        '2019-01-01', '2019-01-02', global_usage_mode='full'
     )
     assert actual_image_batch == expect_image_batch
     assert actual_continue_token == expect_continue_token
 
 
+def test_get_image_batch_counts_global_usage(monkeypatch):
+    responses = {}
+    for name in ['wmc_pretty1', 'wmc_pretty2', 'wmc_pretty3', 'wmc_pretty123']:
+        with open(
+                os.path.join(RESOURCES, 'continuation', f'{name}.json')
+        ) as f:
+            responses[name] = json.load(f)
+
+    def mock_get_response_json(endpoint, retries, query_params, **kwargs):
+        continue_one = 'Edvard_Munch_-_Night_in_Nice_(1891).jpg|nowiki|1281339'
+        continue_two = 'Niedercunnersdorf_Gartenweg_12.JPG|dewiki|9849507'
+        if 'continue' not in query_params:
+            return responses['wmc_pretty1']
+        elif query_params['gucontinue'] == continue_one:
+            return responses['wmc_pretty2']
+        elif query_params['gucontinue'] == continue_two:
+            return responses['wmc_pretty3']
+        else:
+            return None
+
+    expect_counts = {
+        k: len(v.get('globalusage', []))
+        for k, v in responses['wmc_pretty123']['query']['pages'].items()
+    }
+    usage_stats = {}
+    monkeypatch.setattr(wmc.delayed_requester, 'get_response_json',
+                        mock_get_response_json)
+    actual_image_batch, _ = wmc._get_image_batch(
+        '2019-01-01',
+        '2019-01-02',
+        global_usage_mode='count',
+        usage_stats=usage_stats
+    )
+    actual_pages = actual_image_batch['query']['pages']
+    assert all('globalusage' not in p for p in actual_pages.values())
+    assert {
+        k: p.get(wmc.GLOBAL_USAGE_COUNT_KEY, 0)
+        for k, p in actual_pages.items()
+    } == expect_counts
+    assert usage_stats == {'requests': 3}
+
+
+def _get_synthetic_continuation_response(
+        continuation, continuations, page_count
+):
+    response = {
+        'query': {
+            'pages': {
+                str(i): {
+                    'pageid': i,
+                    'title': f'File:{i}.jpg',
+                    'globalusage': [
+                        {
+                            'title': f'Page_{continuation}',
+                            'wiki': 'en.wikipedia.org',
+                            'url': f'https://en.wikipedia.org/{continuation}',
+                        }
+                    ],
+                }
+                for i in range(page_count)
+            }
+        }
+    }
+    if continuation < continuations - 1:
+        response['continue'] = {
+            'gucontinue': f'0.jpg|enwiki|{continuation + 1}'
+        }
+    else:
+        response['batchcomplete'] = ''
+    return response
+
+
+def test_get_image_batch_benchmark_with_long_continuations():
+    # Merging used to copy the whole batch for every continuation, so it
+    # took time quadratic in the number of continuations.
+    continuations = 1000
+    page_count = 50
+
+    def mock_get_response_json(endpoint, retries, query_params, **kwargs):
+        return _get_synthetic_continuation_response(
+            _get_synthetic_continuation(query_params),
+            continuations,
+            page_count
+        )
+
+    with patch.object(
+            wmc.delayed_requester,
+            'get_response_json',
+            side_effect=mock_get_response_json
+    ):
+        start_time = time.perf_counter()
+        actual_batch, actual_continue = wmc._get_image_batch(
+            '2019-01-01', '2019-01-02', global_usage_mode='full'
+        )
+        elapsed = time.perf_counter() - start_time
+    logging.info(
+        f'Merged {continuations} continuations in {elapsed:.3f} seconds'
+    )
+
+    actual_pages = actual_batch['query']['pages']
+    assert len(actual_pages) == page_count
+    assert all(
+        len(page['globalusage']) == continuations
+        for page in actual_pages.values()
+    )
+    assert actual_continue == {}
+
+
+def _get_synthetic_continuation(query_params):
+    return int(query_params.get('gucontinue', '||0').split('|')[2])
+
+
+def test_get_image_batch_skips_capped_global_usage():
+    continuations = 1000
+
+    def mock_get_response_json(endpoint, retries, query_params, **kwargs):
+        skip_continue = f'0.jpg|{wmc.GLOBAL_USAGE_SKIP_WIKI}|0'
+        if query_params.get('gucontinue') == skip_continue:
+            continuation = continuations - 1
+        else:
+            continuation = _get_synthetic_continuation(query_params)
+        return _get_synthetic_continuation_response(
+            continuation, continuations, 2
+        )
+
+    usage_stats = {}
+    with patch.object(
+            wmc.delayed_requester,
+            'get_response_json',
+            side_effect=mock_get_response_json
+    ):
+        actual_batch, _ = wmc._get_image_batch(
+            '2019-01-01',
+            '2019-01-02',
+            global_usage_mode='count',
+            global_usage_count_cap=10,
+            usage_stats=usage_stats
+        )
+
+    assert usage_stats == {'requests': 11, 'capped_files': 1}
+    actual_page = actual_batch['query']['pages']['0']
+    assert actual_page[wmc.GLOBAL_USAGE_COUNT_KEY] == 11
+    assert actual_page[wmc.GLOBAL_USAGE_TRUNCATED_KEY] is True
+    assert wmc._create_meta_data_dict(actual_page)[
+        'global_usage_count_truncated'
+    ] is True
+
+
+def test_get_image_batch_counts_all_global_usage_without_cap():
+    continuations = 20
+
+    def mock_get_response_json(endpoint, retries, query_params, **kwargs):
+        return _get_synthetic_continuation_response(
+            _get_synthetic_continuation(query_params), continuations, 2
+        )
+
+    usage_stats = {}
+    with patch.object(
+            wmc.delayed_requester,
+            'get_response_json',
+            side_effect=mock_get_response_json
+    ):
+        actual_batch, _ = wmc._get_image_batch(
+            '2019-01-01',
+            '2019-01-02',
+            global_usage_mode='count',
+            usage_stats=usage_stats
+        )
+
+    assert usage_stats == {'requests': continuations}
+    actual_page = actual_batch['query']['pages']['0']
+    assert actual_page[wmc.GLOBAL_USAGE_COUNT_KEY] == continuations
+    assert wmc.GLOBAL_USAGE_TRUNCATED_KEY not in actual_page
+    assert 'global_usage_count_truncated' not in wmc._create_meta_data_dict(
+        actual_page
+    )
+
+
 def test_get_image_batch_returns_correctly_without_continue(monkeypatch):
     with open(
             os.path.join(RESOURCES, 'response_small_missing_continue.json')
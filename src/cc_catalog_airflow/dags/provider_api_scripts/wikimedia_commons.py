@@ -11,14 +11,13 @@ Notes:                  https://commons.wikimedia.org/wiki/API:Main_page
 """
 
 import argparse
-from copy import deepcopy
 from datetime import datetime, timedelta, timezone
 import logging
 import os
 from urllib.parse import urlparse
 
-import lxml.html as html
-
+import common.checkpoint as ckpt
+import common.html_text as html_text
 import common.requester as requester
 import common.storage.image as image
 
@@ -30,6 +29,21 @@ LIMIT = 250
 # fail without a continuation token.  The largest example seen so far
 # had a little over 1000 uses
 MEAN_GLOBAL_USAGE_LIMIT = 10000
+# Only the number of global uses of each file is stored.  In 'count'
+# mode, the globalusage list of each page is replaced by its length as
+# soon as it arrives.  In 'full' mode, every globalusage entry is kept.
+GLOBAL_USAGE_MODE = 'count'
+# If a cap is given in 'count' mode, the remaining uses of a file are
+# skipped instead of paged through once that many have been counted.
+# Its global_usage_count is then only a lower bound, and its meta_data
+# has global_usage_count_truncated set.  Off by default, since the
+# popularity metrics use the count.
+GLOBAL_USAGE_COUNT_CAP = None
+GLOBAL_USAGE_COUNT_KEY = 'globalusagecount'
+GLOBAL_USAGE_TRUNCATED_KEY = 'globalusagetruncated'
+# Sorts after every wiki ID, so that a gucontinue value with this wiki
+# continues from the next file.
+GLOBAL_USAGE_SKIP_WIKI = '~'
 DELAY = 1
 HOST = 'commons.wikimedia.org'
 ENDPOINT = f'https://{HOST}/w/api.php'
@@ -60,7 +74,11 @@ delayed_requester = requester.DelayedRequester(DELAY)
 image_store = image.ImageStore(provider=PROVIDER)
 
 
-def main(date):
+def main(
+        date,
+        global_usage_mode=GLOBAL_USAGE_MODE,
+        global_usage_count_cap=GLOBAL_USAGE_COUNT_CAP,
+):
     """
     This script pulls the data for a given date from the Wikimedia
     Commons API, and writes it into a .TSV file to be eventually read
@@ -70,19 +88,32 @@ def main(date):
 
     date:  Date String in the form YYYY-MM-DD.  This is the date for
            which running the script will pull data.
+
+    Optional Arguments:
+
+    global_usage_mode:       'count' or 'full'.  See GLOBAL_USAGE_MODE.
+    global_usage_count_cap:  integer giving the number of uses of a file
+                             after which the rest are skipped, or None.
+                             See GLOBAL_USAGE_COUNT_CAP.
     """
 
     logger.info(f'Processing Wikimedia Commons API for date: {date}')
 
-    continue_token = {}
-    total_images = 0
     start_timestamp, end_timestamp = _derive_timestamp_pair(date)
+    checkpoint = ckpt.Checkpoint(f'{PROVIDER}_{date}', image_store)
+    state = checkpoint.resume() or {}
+    continue_token = state.get('continue_token', {})
+    total_images = image_store.total_images
+    usage_stats = {'requests': 0, 'capped_files': 0}
 
     while True:
         image_batch, continue_token = _get_image_batch(
             start_timestamp,
             end_timestamp,
-            continue_token=continue_token)
+            continue_token=continue_token,
+            global_usage_mode=global_usage_mode,
+            global_usage_count_cap=global_usage_count_cap,
+            usage_stats=usage_stats)
         logger.info(f'Continue Token: {continue_token}')
         image_pages = _get_image_pages(image_batch)
         if image_pages:
@@ -91,10 +122,17 @@ def main(date):
         logger.info(f'Total Images so far: {total_images}')
         if not continue_token:
             break
+        checkpoint.save({'continue_token': continue_token})
 
     image_store.commit()
+    checkpoint.clear()
     total_images = image_store.total_images
     logger.info(f'Total images: {total_images}')
+    logger.info(
+        f'Made {usage_stats["requests"]} requests for {date}.  Skipped the '
+        f'remaining uses of {usage_stats["capped_files"]} files, saving at '
+        f'least {usage_stats["capped_files"]} requests.'
+    )
     logger.info('Terminated!')
 
 
@@ -110,8 +148,17 @@ def _get_image_batch(
         start_timestamp,
         end_timestamp,
         continue_token={},
-        retries=5
+        retries=5,
+        global_usage_mode=GLOBAL_USAGE_MODE,
+        global_usage_count_cap=GLOBAL_USAGE_COUNT_CAP,
+        usage_stats=None,
 ):
+    """
+    Request one batch of images, following continuations until the
+    batch is complete.  If given, the `usage_stats` dict has its
+    'requests' and 'capped_files' counts incremented.
+    """
+    usage_stats = usage_stats if usage_stats is not None else {}
     query_params = _build_query_params(
         start_timestamp,
         end_timestamp,
@@ -129,6 +176,7 @@ def _get_image_batch(
                 timeout=60
             )
         )
+        usage_stats['requests'] = usage_stats.get('requests', 0) + 1
 
         if response_json is None:
             image_batch = None
@@ -138,7 +186,21 @@ def _get_image_batch(
             new_continue_token = response_json.pop('continue', {})
             logger.debug(f'new_continue_token: {new_continue_token}')
             query_params.update(new_continue_token)
+            if global_usage_mode == 'count':
+                _count_global_usage(response_json)
             image_batch = _merge_response_jsons(image_batch, response_json)
+            if (
+                    global_usage_mode == 'count'
+                    and global_usage_count_cap is not None
+                    and image_batch is not None
+                    and 'gucontinue' in new_continue_token
+                    and _skip_capped_global_usage(
+                        image_batch, query_params, global_usage_count_cap
+                    )
+            ):
+                usage_stats['capped_files'] = (
+                    usage_stats.get('capped_files', 0) + 1
+                )
 
         if 'batchcomplete' in response_json:
             logger.debug('Found batchcomplete')
@@ -147,6 +209,47 @@ def _get_image_batch(
     return image_batch, new_continue_token
 
 
+def _count_global_usage(response_json):
+    # Replaces the globalusage list of each page with its length.
+    for page in (_get_image_pages(response_json) or {}).values():
+        if 'globalusage' in page:
+            page[GLOBAL_USAGE_COUNT_KEY] = len(page.pop('globalusage'))
+
+
+def _skip_capped_global_usage(
+        image_batch,
+        query_params,
+        global_usage_count_cap=GLOBAL_USAGE_COUNT_CAP
+):
+    """
+    If the usage of the file that `gucontinue` in `query_params` would
+    continue from has reached `global_usage_count_cap`, change
+    `gucontinue` to continue from the next file instead, mark the file's
+    count as truncated, and return True.
+    """
+    gucontinue = query_params.get('gucontinue')
+    if not gucontinue:
+        return False
+    continue_title = gucontinue.split('|')[0]
+    title = 'File:' + continue_title.replace('_', ' ')
+    for page in image_batch['query']['pages'].values():
+        if (
+                page.get('title') == title
+                and page.get(GLOBAL_USAGE_COUNT_KEY, 0)
+                >= global_usage_count_cap
+        ):
+            logger.info(
+                f'{title} has at least {global_usage_count_cap} uses.  '
+                f'Skipping the rest.'
+            )
+            query_params['gucontinue'] = (
+                f'{continue_title}|{GLOBAL_USAGE_SKIP_WIKI}|0'
+            )
+            page[GLOBAL_USAGE_TRUNCATED_KEY] = True
+            return True
+    return False
+
+
 def _get_image_pages(image_batch):
     image_pages = None
 
@@ -185,6 +288,11 @@ def _merge_response_jsons(left_json, right_json):
     # Note that we will keep the continue value from the right json in
     # the merged output!  This is because we assume the right json is
     # the later one in the sequence of responses.
+    #
+    # The right json is merged into the left one in place, so that
+    # merging a long sequence of continuations only costs as much as
+    # the data in the new response, rather than copying the whole
+    # accumulated batch each time.
     if left_json is None:
         return right_json
 
@@ -197,29 +305,38 @@ def _merge_response_jsons(left_json, right_json):
             or left_pages.keys() != right_pages.keys()
     ):
         logger.warning('Cannot merge responses with different pages!')
-        merged_json = None
-    else:
-        merged_json = deepcopy(left_json)
-        merged_json.update(right_json)
-        merged_pages = _get_image_pages(merged_json)
-        merged_pages.update({
-            k: _merge_image_pages(left_pages[k], right_pages[k])
-            for k in left_pages
-        })
+        return None
 
-    return merged_json
+    for key, value in right_json.items():
+        if key != 'query':
+            left_json[key] = value
+    for key, value in right_json['query'].items():
+        if key != 'pages':
+            left_json['query'][key] = value
+    for k in left_pages:
+        _merge_image_pages(left_pages[k], right_pages[k])
+
+    return left_json
 
 
 def _merge_image_pages(left_page, right_page):
-    merged_page = deepcopy(left_page)
-    merged_globalusage = (
-        left_page['globalusage']
-        + right_page['globalusage']
+    # Merges the right page into the left one in place, appending the
+    # globalusage entries of the right page to those of the left, or
+    # adding up their counts.
+    left_globalusage = left_page.get('globalusage')
+    right_globalusage = right_page.get('globalusage')
+    global_usage_count = (
+        left_page.get(GLOBAL_USAGE_COUNT_KEY, 0)
+        + right_page.get(GLOBAL_USAGE_COUNT_KEY, 0)
     )
-    merged_page.update(right_page)
-    merged_page['globalusage'] = merged_globalusage
+    left_page.update(right_page)
+    if left_globalusage is not None:
+        left_globalusage.extend(right_globalusage or [])
+        left_page['globalusage'] = left_globalusage
+    if GLOBAL_USAGE_COUNT_KEY in left_page:
+        left_page[GLOBAL_USAGE_COUNT_KEY] = global_usage_count
 
-    return merged_page
+    return left_page
 
 
 def _process_image_data(image_data):
@@ -297,11 +414,9 @@ def _extract_creator_info(image_info):
     if not artist_string:
         return (None, None)
 
-    artist_elem = html.fromstring(artist_string)
     # We take all text to replicate what is shown on Wikimedia Commons
-    artist_text = ''.join(artist_elem.xpath('//text()')).strip()
-    url_list = list(artist_elem.iterlinks())
-    artist_url = _cleanse_url(url_list[0][2]) if url_list else None
+    artist_text, url_list = html_text.get_text_and_links(artist_string)
+    artist_url = _cleanse_url(url_list[0]) if url_list else None
     return (artist_text, artist_url)
 
 
@@ -317,7 +432,9 @@ def _get_license_url(image_info):
 
 def _create_meta_data_dict(image_data):
     meta_data = {}
-    global_usage_length = len(image_data.get('globalusage', []))
+    global_usage_length = image_data.get(
+        GLOBAL_USAGE_COUNT_KEY, len(image_data.get('globalusage', []))
+    )
     image_info = _get_image_info_dict(image_data)
     date_originally_created, last_modified_at_source = _extract_date_info(
         image_info)
@@ -328,11 +445,11 @@ def _create_meta_data_dict(image_data):
         .get('value')
     )
     if description:
-        description_text = ' '.join(
-            html.fromstring(description).xpath('//text()')
-        ).strip()
+        description_text = html_text.get_text(description)
         meta_data['description'] = description_text
     meta_data['global_usage_count'] = global_usage_length
+    if image_data.get(GLOBAL_USAGE_TRUNCATED_KEY):
+        meta_data['global_usage_count_truncated'] = True
     meta_data['date_originally_created'] = date_originally_created
     meta_data['last_modified_at_source'] = last_modified_at_source
     return meta_data
@@ -3,7 +3,7 @@ This file defines an Apache Airflow DAG that completely wipes out the
 PostgreSQL relations and functions involved in calculating our
 standardized popularity metric. It then recreates relations and
 functions to make the calculation, and performs an initial calculation.
-The results are available in the `image_view` materialized view.
+The results are available in the `image_view` table.
 
 This should only be run when new SQL code is deployed for the calculation.
 """
@@ -69,6 +69,9 @@ def create_dag(
         update_metrics = operators.update_image_popularity_metrics(
             dag, postgres_conn_id
         )
+        update_indices = operators.update_image_popularity_metric_indices(
+            dag, postgres_conn_id
+        )
         create_percentile = operators.create_image_popularity_percentile(
             dag, postgres_conn_id
         )
@@ -87,7 +90,7 @@ def create_dag(
             start_task
             >> [drop_relations, drop_functions]
             >> create_metrics
-            >> [update_metrics, create_percentile]
+            >> [update_metrics, update_indices, create_percentile]
             >> create_constants
             >> create_popularity
             >> create_image_view
@@ -3,6 +3,10 @@ This file defines an Apache Airflow DAG that completely recalculates all
 popularity data, including the percentile values, and also adding any
 new popularity metrics.
 
+The popularity constants and image view rows of each provider are
+computed in parallel (up to POPULARITY_REFRESH_CONCURRENCY at once) into
+staging tables, which then replace the live ones in one transaction.
+
 This should be run at least once every 6 months, or whenever a new
 popularity metric is added.
 """
@@ -10,10 +14,7 @@ from datetime import datetime, timedelta
 import logging
 import os
 
-from airflow import DAG
-
-from util.popularity import operators
-from util.operator_util import get_log_operator
+from util.dag_factory import create_popularity_refresh_dag
 
 
 logging.basicConfig(
@@ -25,7 +26,7 @@ logger = logging.getLogger(__name__)
 
 DAG_ID = 'refresh_all_image_popularity_data'
 DB_CONN_ID = os.getenv('OPENLEDGER_CONN_ID', 'postgres_openledger_testing')
-CONCURRENCY = 1
+CONCURRENCY = int(os.getenv('POPULARITY_REFRESH_CONCURRENCY', 4))
 SCHEDULE_CRON = '@monthly'
 
 DAG_DEFAULT_ARGS = {
@@ -42,40 +43,17 @@ def create_dag(
         dag_id=DAG_ID,
         args=DAG_DEFAULT_ARGS,
         concurrency=CONCURRENCY,
-        max_active_runs=CONCURRENCY,
         schedule_cron=SCHEDULE_CRON,
         postgres_conn_id=DB_CONN_ID,
 ):
-    dag = DAG(
-        dag_id=dag_id,
+    return create_popularity_refresh_dag(
+        dag_id,
+        postgres_conn_id,
         default_args=args,
+        start_date=args['start_date'],
         concurrency=concurrency,
-        max_active_runs=max_active_runs,
-        schedule_interval=schedule_cron,
-        catchup=False
+        schedule_string=schedule_cron,
     )
-    with dag:
-        start_task = get_log_operator(dag, DAG_ID, 'Starting')
-        update_metrics = operators.update_image_popularity_metrics(
-            dag, postgres_conn_id
-        )
-        update_constants = operators.update_image_popularity_constants(
-            dag, postgres_conn_id
-        )
-        update_image_view = operators.update_image_view(
-            dag, postgres_conn_id
-        )
-        end_task = get_log_operator(dag, DAG_ID, 'Finished')
-
-        (
-            start_task
-            >> update_metrics
-            >> update_constants
-            >> update_image_view
-            >> end_task
-        )
-
-    return dag
 
 
 globals()[DAG_ID] = create_dag()
@@ -3,7 +3,7 @@ This file defines an Apache Airflow DAG that refreshes the data in
 image_view, but not the underlying tables.  This means the only effect
 of this DAG is to add or update data (including popularity data) for
 images which have been ingested since the last time the view was
-refreshed.
+refreshed.  Only those images are recomputed.
 
 This should be run once per day.
 """
@@ -60,7 +60,7 @@ def create_dag(
     with dag:
         start_task = get_log_operator(dag, DAG_ID, 'Starting')
         update_image_view = operators.update_image_view(
-            dag, postgres_conn_id
+            dag, postgres_conn_id, incremental=True
         )
         end_task = get_log_operator(dag, DAG_ID, 'Finished')
 
@@ -27,5 +27,6 @@ globals()[DAG_ID] = create_provider_api_workflow(
     start_date=START_DATE,
     schedule_string='@monthly',
     dated=False,
+    keyed_by_run=True,
     dagrun_timeout=DAGRUN_TIMEOUT
 )
@@ -28,5 +28,6 @@ globals()[DAG_ID] = create_provider_api_workflow(
     start_date=START_DATE,
     schedule_string='@weekly',
     dated=False,
+    keyed_by_run=True,
     dagrun_timeout=DAGRUN_TIMEOUT
 )
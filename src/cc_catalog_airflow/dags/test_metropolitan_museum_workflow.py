@@ -10,4 +10,4 @@ def test_dag_loads_with_no_errors(tmpdir):
     dag_bag.process_file(os.path.join(FILE_DIR, 'metropolitan_museum_workflow.py'))
     print(dag_bag.dags)
     assert len(dag_bag.import_errors) == 0
-    assert len(dag_bag.dags) == 1
+    assert len(dag_bag.dags) == 2
@@ -5,6 +5,8 @@ from airflow import DAG
 from airflow.utils.helpers import cross_downstream
 import util.operator_util as ops
 import util.config as conf
+from util.popularity import operators as popularity_ops
+from util.popularity.sql import POPULARITY_METRICS
 
 logger = logging.getLogger(__name__)
 
@@ -19,6 +21,7 @@ def create_provider_api_workflow(
         dated=True,
         day_shift=0,
         dagrun_timeout=timedelta(minutes=30),
+        keyed_by_run=False,
 ):
     """
     This factory method instantiates a DAG that will run the given
@@ -55,6 +58,11 @@ def create_provider_api_workflow(
                       be run (if `dated=True`).
     dagrun_timeout:   datetime.timedelta giving the total amount of time
                       a given dagrun may take.
+    keyed_by_run:     boolean giving whether the `main_function` takes a
+                      `run_key` keyword argument (if `dated=False`).  The
+                      key is the same for every try of a dagrun, and
+                      differs between dagruns, so it can be used to name
+                      a checkpoint.
     """
     args = deepcopy(default_args)
     args.update(start_date=start_date)
@@ -80,7 +88,11 @@ def create_provider_api_workflow(
                 day_shift=day_shift
             )
         else:
-            run_task = ops.get_main_runner_operator(dag, main_function)
+            run_task = ops.get_main_runner_operator(
+                dag,
+                main_function,
+                keyed_by_run=keyed_by_run
+            )
         end_task = ops.get_log_operator(dag, dag.dag_id, 'Finished')
 
         start_task >> run_task >> end_task
@@ -229,3 +241,117 @@ def _build_ingest_operator_list_list(
             for d in L
         ] for L in reingestion_day_list_list
     ]
+
+
+def create_popularity_refresh_dag(
+        dag_id,
+        postgres_conn_id,
+        popularity_metrics=POPULARITY_METRICS,
+        default_args=conf.DAG_DEFAULT_ARGS,
+        start_date=datetime(1970, 1, 1),
+        concurrency=4,
+        schedule_string='@monthly',
+        dagrun_timeout=timedelta(days=1),
+):
+    """
+    This factory method instantiates a DAG that recalculates the
+    popularity constants and the image view, with the work for each
+    provider in `popularity_metrics` run as a separate task.
+
+    Required Arguments:
+
+    dag_id:            string giving a unique id of the DAG to be
+                       created.
+    postgres_conn_id:  string giving the Airflow connection id of the
+                       database holding the image table.
+
+    Optional Arguments:
+
+    popularity_metrics:  dictionary whose keys are the providers for
+                         which popularity constants are computed.
+    default_args:        dictionary which is passed to the
+                         airflow.dag.DAG __init__ method.
+    start_date:          datetime.datetime giving the first valid
+                         execution date of the DAG.
+    concurrency:         integer that sets the number of tasks which can
+                         run simultaneously for this DAG, i.e., the
+                         number of providers whose popularity data is
+                         computed at once.  Keep the load on the
+                         database in mind when setting this parameter.
+    schedule_string:     string giving the schedule on which the DAG
+                         should be run.  Passed to the airflow.dag.DAG
+                         __init__ method.
+    dagrun_timeout:      datetime.timedelta giving the total amount of
+                         time a given dagrun may take.
+
+    The new popularity constants and image view are written to staging
+    tables named for the dagrun.  For each provider, the constants are
+    computed from the provider's metric index, and then that provider's
+    rows of the image view.  The rows of every provider not in
+    `popularity_metrics` are copied in parallel with these.  Once every
+    provider is done, rows updated during the refresh are replayed, and
+    the staging tables replace the live ones in a single transaction.
+    The staging tables are dropped whether or not the dagrun succeeds.
+    """
+    args = deepcopy(default_args)
+    args.update(start_date=start_date)
+    dag = DAG(
+        dag_id=dag_id,
+        default_args=args,
+        concurrency=concurrency,
+        max_active_runs=1,
+        dagrun_timeout=dagrun_timeout,
+        start_date=start_date,
+        schedule_interval=schedule_string,
+        catchup=False,
+    )
+    with dag:
+        start_task = ops.get_log_operator(dag, dag.dag_id, 'Starting')
+        update_metrics = popularity_ops.update_image_popularity_metrics(
+            dag, postgres_conn_id
+        )
+        update_indices = popularity_ops.update_image_popularity_metric_indices(
+            dag, postgres_conn_id
+        )
+        create_percentile = popularity_ops.create_image_popularity_percentile(
+            dag, postgres_conn_id
+        )
+        create_staging = popularity_ops.create_staging_popularity_relations(
+            dag, postgres_conn_id
+        )
+        swap_staging = popularity_ops.swap_staging_popularity_relations(
+            dag, postgres_conn_id
+        )
+        drop_staging = popularity_ops.drop_staging_popularity_relations(
+            dag, postgres_conn_id
+        )
+        end_task = ops.get_log_operator(dag, dag.dag_id, 'Finished')
+
+        (
+            start_task
+            >> update_metrics
+            >> update_indices
+            >> create_percentile
+            >> create_staging
+        )
+        for provider in popularity_metrics:
+            (
+                create_staging
+                >> popularity_ops.insert_staging_popularity_constants(
+                    dag, postgres_conn_id, provider
+                )
+                >> popularity_ops.insert_staging_image_view_rows(
+                    dag, postgres_conn_id, provider
+                )
+                >> swap_staging
+            )
+        (
+            create_staging
+            >> popularity_ops.insert_staging_image_view_rows(
+                dag, postgres_conn_id, excluded_providers=popularity_metrics
+            )
+            >> swap_staging
+        )
+        swap_staging >> [drop_staging, end_task]
+
+    return dag
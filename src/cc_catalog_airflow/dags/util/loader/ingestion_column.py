@@ -2,60 +2,122 @@
 This module has a couple of temporarily-needed methods to add an
 ingestion_type column to TSV files before uploading them to S3 or
 PostgreSQL.
+
+Rather than rewriting the file, `open_tsv` returns a binary file-like
+object that adds the column on the fly as the file is read.  It can be
+handed directly to COPY, or to an S3 upload.
 """
+import io
 import logging
-import os
 logger = logging.getLogger(__name__)
 
+OLD_COLS_NUMBER = 17
+NEW_COLS_NUMBER = OLD_COLS_NUMBER + 1
+COMMON_CRAWL = 'commoncrawl'
+PROVIDER_API = 'provider_api'
+READ_CHUNK_SIZE = 8 * 1024 * 1024
+
 
-def check_and_fix_tsv_file(tsv_file_name):
+def open_tsv(tsv_file_name, chunk_size=READ_CHUNK_SIZE):
     """
     This function will check whether a TSV has the right number of
-    columns for the new DB schema, and attempt to add an ingestion_type
-    column if the number is one short.
+    columns for the new DB schema, and return a binary file object for
+    reading it.  If the number is one short, the returned object adds an
+    ingestion_type column to every line as it is read.
 
     It will also log a warning if the number is completely wrong.
     """
     logger.info(f'Checking for ingestion_type column in {tsv_file_name}')
-    old_cols_number = 17
-    new_cols_number = old_cols_number + 1
-    with open(tsv_file_name) as f:
+    with open(tsv_file_name, 'rb') as f:
         test_line = f.readline()
-    line_list = [word.strip() for word in test_line.split('\t')]
-    if len(line_list) == old_cols_number:
-        _add_ingestion_type(tsv_file_name, line_list[-1])
-    elif len(line_list) == new_cols_number:
+    line_list = [word.strip() for word in test_line.split(b'\t')]
+    if len(line_list) == OLD_COLS_NUMBER:
+        source = line_list[-1].decode('utf-8', errors='replace')
+        return IngestionTypeReader(tsv_file_name, source, chunk_size)
+    elif len(line_list) == NEW_COLS_NUMBER:
         logger.info(
-            f'Found correct number of columns:  {new_cols_number}.'
-            '  Leaving file unchanged.'
+            f'Found correct number of columns:  {NEW_COLS_NUMBER}.'
+            '  Reading file unchanged.'
         )
     else:
         logger.warning(
             'Wrong number of columns in file!  This cannot be fixed...'
         )
+    return open(tsv_file_name, 'rb', buffering=chunk_size)
+
+
+class IngestionTypeReader(io.RawIOBase):
+    """
+    A read-only binary stream over a TSV file with 17 columns, which
+    yields each line with an ingestion_type column added.
+
+    The underlying file is read in chunks of roughly `chunk_size` bytes,
+    and blank lines are passed through unchanged.
+    """
+
+    def __init__(self, tsv_file_name, source, chunk_size=READ_CHUNK_SIZE):
+        self._ingestion_type = (
+            COMMON_CRAWL if source == COMMON_CRAWL else PROVIDER_API
+        )
+        logger.debug(f'Found source:  {source}')
+        logger.info(
+            f'Adding ingestion_type:  {self._ingestion_type}'
+            f' to {tsv_file_name} while reading'
+        )
+        self._suffix = b'\t' + self._ingestion_type.encode('utf-8')
+        self._file = open(tsv_file_name, 'rb')
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+        self._eof = False
+
+    def readable(self):
+        return True
+
+    def close(self):
+        if not self.closed:
+            self._file.close()
+        super().close()
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            while not self._eof:
+                self._fill_buffer()
+            size = len(self._buffer)
+        else:
+            while len(self._buffer) < size and not self._eof:
+                self._fill_buffer()
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def readline(self, size=-1):
+        while b'\n' not in self._buffer and not self._eof:
+            self._fill_buffer()
+        end = self._buffer.find(b'\n') + 1 or len(self._buffer)
+        if size is not None and size >= 0:
+            end = min(end, size)
+        return self.read(end)
 
+    def _fill_buffer(self):
+        lines = self._file.readlines(self._chunk_size)
+        if not lines:
+            self._eof = True
+        for line in lines:
+            self._buffer += self._add_ingestion_type(line)
 
-def _add_ingestion_type(tsv_file_name, source):
-    COMMON_CRAWL = 'commoncrawl'
-    PROVIDER_API = 'provider_api'
-    ingestion_type = source if source == COMMON_CRAWL else PROVIDER_API
-    logger.debug(f'Found source:  {source}')
-    logger.info(
-        f'Adding ingestion_type:  {ingestion_type} to {tsv_file_name}'
-    )
-    temp_tsv = tsv_file_name + '.new'
-    with open(tsv_file_name, 'r') as old_tsv, open(temp_tsv, 'w') as new_tsv:
-        old_line = old_tsv.readline().strip()
-        while old_line:
-            if ingestion_type == COMMON_CRAWL:
-                line_list = [word.strip() for word in old_line.split('\t')]
-                new_tsv.write(
-                    '\t'.join(line_list[:-1] + line_list[-2:]) + '\n'
-                )
-            else:
-                new_tsv.write(old_line + '\t' + ingestion_type + '\n')
-            old_line = old_tsv.readline().strip()
-
-
-    os.rename(tsv_file_name, tsv_file_name + '.old')
-    os.rename(temp_tsv, tsv_file_name)
+    def _add_ingestion_type(self, line):
+        content = line.rstrip(b'\r\n')
+        if not content:
+            return line
+        line_ending = line[len(content):] or b'\n'
+        if self._ingestion_type == COMMON_CRAWL:
+            line_list = content.split(b'\t')
+            content = b'\t'.join(line_list[:-1] + line_list[-2:])
+        else:
+            content = content + self._suffix
+        return content + line_ending
@@ -1,20 +1,106 @@
-from util.loader import paths, s3, sql, ingestion_column
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+import logging
 
+from util.loader import paths, s3, sql, streaming, validator
+from util.postgres_session import postgres_session
 
-def load_local_data(output_dir, postgres_conn_id, identifier):
+logger = logging.getLogger(__name__)
+
+BATCH_LOAD_WORKERS = 4
+
+
+def load_local_data(
+        output_dir,
+        postgres_conn_id,
+        identifier,
+        max_rows_to_skip=10
+):
     tsv_file_name = paths.get_staged_file(output_dir, identifier)
-    ingestion_column.check_and_fix_tsv_file(tsv_file_name)
-    sql.load_local_data_to_intermediate_table(
+    rejected_rows = _quarantine_malformed_rows(
+        output_dir, identifier, tsv_file_name
+    )
+    with postgres_session(postgres_conn_id):
+        sql.load_local_data_to_intermediate_table(
+            postgres_conn_id,
+            tsv_file_name,
+            identifier,
+            max_rows_to_skip=max_rows_to_skip - rejected_rows
+        )
+        sql.upsert_records_to_image_table(postgres_conn_id, identifier)
+
+
+def load_local_data_batch(
+        output_dir,
+        postgres_conn_id,
+        identifier,
+        max_workers=BATCH_LOAD_WORKERS,
+        max_rows_to_skip=10
+):
+    """
+    Load every staged TSV into the loading table, using up to
+    `max_workers` concurrent COPY sessions, then clean and upsert the
+    combined data once.
+
+    A file which cannot be loaded is moved to the failure directory, and
+    does not stop the other files from being loaded.
+    """
+    tsv_file_names = paths.get_staged_files(output_dir, identifier)
+    logger.info(f'Loading {len(tsv_file_names)} staged files')
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            tsv_file_name: executor.submit(
+                _copy_local_file,
+                output_dir,
+                postgres_conn_id,
+                identifier,
+                tsv_file_name,
+                max_rows_to_skip
+            )
+            for tsv_file_name in tsv_file_names
+        }
+
+    loaded_files = []
+    for tsv_file_name, future in futures.items():
+        try:
+            future.result()
+            loaded_files.append(tsv_file_name)
+        except Exception as e:
+            logger.warning(f'Could not load {tsv_file_name}:  {e}')
+            paths.move_staged_file_to_failure_directory(
+                output_dir, identifier, tsv_file_name
+            )
+
+    if not loaded_files:
+        raise Exception(f'None of {tsv_file_names} could be loaded')
+
+    logger.info(f'Loaded {len(loaded_files)} files.  Upserting.')
+    with postgres_session(postgres_conn_id):
+        sql.clean_intermediate_table_data(postgres_conn_id, identifier)
+        sql.upsert_records_to_image_table(postgres_conn_id, identifier)
+
+
+def _copy_local_file(
+        output_dir,
         postgres_conn_id,
+        identifier,
         tsv_file_name,
-        identifier
+        max_rows_to_skip
+):
+    rejected_rows = _quarantine_malformed_rows(
+        output_dir, identifier, tsv_file_name
+    )
+    sql.copy_local_data_to_intermediate_table(
+        postgres_conn_id,
+        tsv_file_name,
+        identifier,
+        max_rows_to_skip=max_rows_to_skip - rejected_rows
     )
-    sql.upsert_records_to_image_table(postgres_conn_id, identifier)
 
 
 def copy_to_s3(output_dir, bucket, identifier, aws_conn_id):
     tsv_file_name = paths.get_staged_file(output_dir, identifier)
-    ingestion_column.check_and_fix_tsv_file(tsv_file_name)
+    _quarantine_malformed_rows(output_dir, identifier, tsv_file_name)
     s3.copy_file_to_s3_staging(identifier, tsv_file_name, bucket, aws_conn_id)
 
 
@@ -22,13 +108,64 @@ def load_s3_data(
         bucket,
         aws_conn_id,
         postgres_conn_id,
-        identifier
+        identifier,
+        output_dir=None
 ):
-    tsv_key = s3.get_staged_s3_object(identifier, bucket, aws_conn_id)
-    sql.load_s3_data_to_intermediate_table(
-        postgres_conn_id,
+    tsv_key = _get_staged_s3_key(bucket, aws_conn_id, identifier, output_dir)
+    with postgres_session(postgres_conn_id):
+        sql.load_s3_data_to_intermediate_table(
+            postgres_conn_id,
+            bucket,
+            tsv_key,
+            identifier
+        )
+        sql.upsert_records_to_image_table(postgres_conn_id, identifier)
+
+
+def stream_s3_data(
         bucket,
-        tsv_key,
-        identifier
+        aws_conn_id,
+        postgres_conn_id,
+        identifier,
+        output_dir=None
+):
+    """
+    Load the staged S3 object by streaming it through this worker into
+    `COPY ... FROM STDIN`, decompressing it on the fly if needed.  Unlike
+    `load_s3_data`, this does not need the aws_s3 extension on the
+    database server.
+    """
+    tsv_key = _get_staged_s3_key(bucket, aws_conn_id, identifier, output_dir)
+    body = s3.get_s3_object_stream(tsv_key, bucket, aws_conn_id)
+    with postgres_session(postgres_conn_id):
+        with closing(streaming.open_decompressed(body, tsv_key)) as stream:
+            sql.copy_stream_to_intermediate_table(
+                postgres_conn_id,
+                stream,
+                identifier,
+                tsv_key
+            )
+        sql.clean_intermediate_table_data(postgres_conn_id, identifier)
+        sql.upsert_records_to_image_table(postgres_conn_id, identifier)
+
+
+def _get_staged_s3_key(bucket, aws_conn_id, identifier, output_dir):
+    """
+    Derive the staged S3 key from the locally staged file when
+    `output_dir` is given, and fall back to listing the staging prefix
+    otherwise.
+    """
+    if output_dir is not None:
+        tsv_file_name = paths.get_staged_file(output_dir, identifier)
+        return s3.get_staging_s3_key(identifier, tsv_file_name)
+    else:
+        return s3.get_staged_s3_object(identifier, bucket, aws_conn_id)
+
+
+def _quarantine_malformed_rows(output_dir, identifier, tsv_file_name):
+    quarantine_file_name = paths.get_quarantine_file(
+        output_dir, identifier, tsv_file_name
+    )
+    return validator.quarantine_malformed_rows(
+        tsv_file_name, quarantine_file_name
     )
-    sql.upsert_records_to_image_table(postgres_conn_id, identifier)
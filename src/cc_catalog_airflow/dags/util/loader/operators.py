@@ -16,12 +16,31 @@ def get_file_staging_operator(
         dag,
         output_dir,
         minimum_file_age_minutes,
-        identifier=TIMESTAMP_TEMPLATE
+        identifier=TIMESTAMP_TEMPLATE,
+        scan_unregistered_files=True
 ):
     return ShortCircuitOperator(
         task_id='stage_oldest_tsv_file',
         python_callable=paths.stage_oldest_tsv_file,
         op_args=[output_dir, identifier, minimum_file_age_minutes],
+        op_kwargs={'scan_unregistered_files': scan_unregistered_files},
+        dag=dag
+    )
+
+
+def get_batch_file_staging_operator(
+        dag,
+        output_dir,
+        minimum_file_age_minutes,
+        max_files,
+        identifier=TIMESTAMP_TEMPLATE,
+        scan_unregistered_files=True
+):
+    return ShortCircuitOperator(
+        task_id='stage_oldest_tsv_files',
+        python_callable=paths.stage_oldest_tsv_files,
+        op_args=[output_dir, identifier, minimum_file_age_minutes, max_files],
+        op_kwargs={'scan_unregistered_files': scan_unregistered_files},
         dag=dag
     )
 
@@ -54,6 +73,22 @@ def get_load_local_data_operator(
     )
 
 
+def get_load_local_data_batch_operator(
+        dag,
+        output_dir,
+        postgres_conn_id,
+        max_workers,
+        identifier=TIMESTAMP_TEMPLATE
+):
+    return PythonOperator(
+        task_id='load_local_data_batch',
+        python_callable=loader.load_local_data_batch,
+        op_args=[output_dir, postgres_conn_id, identifier, max_workers],
+        trigger_rule=TriggerRule.ALL_SUCCESS,
+        dag=dag
+    )
+
+
 def get_copy_to_s3_operator(
         dag,
         output_dir,
@@ -74,12 +109,19 @@ def get_load_s3_data_operator(
         bucket,
         aws_conn_id,
         postgres_conn_id,
-        identifier=TIMESTAMP_TEMPLATE
+        identifier=TIMESTAMP_TEMPLATE,
+        stream_through_worker=False,
+        output_dir=None
 ):
+    if stream_through_worker:
+        python_callable = loader.stream_s3_data
+    else:
+        python_callable = loader.load_s3_data
     return PythonOperator(
         task_id='load_s3_data',
-        python_callable=loader.load_s3_data,
+        python_callable=python_callable,
         op_args=[bucket, aws_conn_id, postgres_conn_id, identifier],
+        op_kwargs={'output_dir': output_dir},
         dag=dag
     )
 
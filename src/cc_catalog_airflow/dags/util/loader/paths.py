@@ -2,8 +2,11 @@ from datetime import datetime, timedelta
 import logging
 import os
 
+from provider_api_scripts.common.storage import manifest
+
 FAILURE_SUBDIRECTORY = 'db_loader_failures'
 STAGING_SUBDIRECTORY = 'db_loader_staging'
+QUARANTINE_SUFFIX = '_quarantine'
 
 logger = logging.getLogger(__name__)
 
@@ -11,14 +14,50 @@ logger = logging.getLogger(__name__)
 def stage_oldest_tsv_file(
         output_dir,
         identifier,
-        minimum_file_age_minutes
+        minimum_file_age_minutes,
+        scan_unregistered_files=True
+):
+    return stage_oldest_tsv_files(
+        output_dir,
+        identifier,
+        minimum_file_age_minutes,
+        max_files=1,
+        scan_unregistered_files=scan_unregistered_files
+    )
+
+
+def stage_oldest_tsv_files(
+        output_dir,
+        identifier,
+        minimum_file_age_minutes,
+        max_files,
+        scan_unregistered_files=True
 ):
+    """
+    Move up to `max_files` of the oldest eligible TSV files into the
+    staging directory for `identifier`.  Files are claimed one at a time
+    by renaming them, so a file claimed by a concurrent run is skipped.
+
+    Files registered in the manifest of `output_dir` are claimed first.
+    If there are none, and `scan_unregistered_files` is set, the
+    directory is scanned for files older than `minimum_file_age_minutes`
+    instead, to pick up files written by tools which do not register
+    them.
+    """
     staging_directory = _get_staging_directory(output_dir, identifier)
-    tsv_file_name = _get_oldest_tsv_file(output_dir, minimum_file_age_minutes)
-    tsv_found = tsv_file_name is not None
-    if tsv_found:
-        _move_file(tsv_file_name, staging_directory)
-    return tsv_found
+    tsv_file_names = [
+        entry.file_path
+        for entry in manifest.claim_files(output_dir, max_files)
+    ]
+    if not tsv_file_names and scan_unregistered_files:
+        tsv_file_names = _get_oldest_tsv_files(
+            output_dir, minimum_file_age_minutes, max_files
+        )
+    staged_files = [
+        f for f in tsv_file_names if _claim_file(f, staging_directory)
+    ]
+    logger.info(f'Staged {len(staged_files)} files in {staging_directory}')
+    return len(staged_files) > 0
 
 
 def delete_staged_file(output_dir, identifier):
@@ -46,13 +85,32 @@ def move_staged_files_to_failure_directory(
     os.rmdir(staging_directory)
 
 
+def move_staged_file_to_failure_directory(
+        output_dir,
+        identifier,
+        file_path
+):
+    failure_directory = _get_failure_directory(output_dir, identifier)
+    _move_file(file_path, failure_directory)
+
+
 def get_staged_file(output_dir, identifier):
-    staging_directory = _get_staging_directory(output_dir, identifier)
-    path_list = _get_full_tsv_paths(staging_directory)
+    path_list = get_staged_files(output_dir, identifier)
     assert len(path_list) == 1
     return path_list[0]
 
 
+def get_staged_files(output_dir, identifier):
+    staging_directory = _get_staging_directory(output_dir, identifier)
+    return sorted(_get_full_tsv_paths(staging_directory))
+
+
+def get_quarantine_file(output_dir, identifier, tsv_file_name):
+    failure_directory = _get_failure_directory(output_dir, identifier)
+    root, ext = os.path.splitext(os.path.basename(tsv_file_name))
+    return os.path.join(failure_directory, f'{root}{QUARANTINE_SUFFIX}{ext}')
+
+
 def _get_staging_directory(
         output_dir,
         identifier,
@@ -73,27 +131,48 @@ def _get_oldest_tsv_file(
         directory,
         minimum_file_age_minutes
 ):
-    oldest_file_name = None
+    oldest_file_names = _get_oldest_tsv_files(
+        directory, minimum_file_age_minutes, 1
+    )
+    if oldest_file_names:
+        return oldest_file_names[0]
+
+
+def _get_oldest_tsv_files(
+        directory,
+        minimum_file_age_minutes,
+        max_files
+):
     logger.info(f'getting files from {directory}')
     path_list = _get_full_tsv_paths(directory)
     logger.info(f'found files:\n{path_list}')
     tsv_last_modified_list = [(p, os.stat(p).st_mtime) for p in path_list]
     logger.info(f'last_modified_list:\n{tsv_last_modified_list}')
 
-    if len(tsv_last_modified_list) == 0:
-        return
-
-    oldest_file_modified = min(tsv_last_modified_list, key=lambda t: t[1])
     cutoff_time = datetime.now() - timedelta(minutes=minimum_file_age_minutes)
-
-    if datetime.fromtimestamp(oldest_file_modified[1]) <= cutoff_time:
-        oldest_file_name = oldest_file_modified[0]
-    else:
+    old_enough_list = sorted(
+        [
+            t for t in tsv_last_modified_list
+            if datetime.fromtimestamp(t[1]) <= cutoff_time
+        ],
+        key=lambda t: t[1]
+    )
+
+    if len(old_enough_list) == 0:
         logger.info(
             f'no file found older than {minimum_file_age_minutes} minutes.'
         )
 
-    return oldest_file_name
+    return [t[0] for t in old_enough_list[:max_files]]
+
+
+def _claim_file(file_path, new_directory):
+    try:
+        _move_file(file_path, new_directory)
+        return True
+    except FileNotFoundError:
+        logger.info(f'{file_path} was already claimed.  Skipping.')
+        return False
 
 
 def _move_file(file_path, new_directory):
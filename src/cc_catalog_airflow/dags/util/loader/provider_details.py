@@ -7,6 +7,10 @@ from the API response which helps to identify the sub provider.
 Apart from that, this file stores other provider related information which
 might be useful for retrieving sub-providers at the database level and the
 API level.
+
+Each dictionary of sub providers also has an inverted index (e.g.,
+`FLICKR_SUB_PROVIDER_INDEX`), built once at import, which maps each
+identifying value directly to its sub provider.
 """
 
 # Flickr parameters
@@ -113,3 +117,33 @@ SMITHSONIAN_SUB_PROVIDERS = {
         'SIL'  # Smithsonian Libraries
     },
 }
+
+
+def _build_sub_provider_index(sub_providers):
+    """
+    Return a dictionary mapping each value in `sub_providers` (a value
+    may be given alone, or in a set of values) to its sub provider.
+    Raises a ValueError if a value identifies more than one sub provider.
+    """
+    sub_provider_index = {}
+    for sub_provider, values in sub_providers.items():
+        if isinstance(values, str):
+            values = {values}
+        for value in values:
+            other_sub_provider = sub_provider_index.get(value, sub_provider)
+            if other_sub_provider != sub_provider:
+                raise ValueError(
+                    f'{value} identifies both {other_sub_provider} and '
+                    f'{sub_provider}'
+                )
+            sub_provider_index[value] = sub_provider
+    return sub_provider_index
+
+
+FLICKR_SUB_PROVIDER_INDEX = _build_sub_provider_index(FLICKR_SUB_PROVIDERS)
+EUROPEANA_SUB_PROVIDER_INDEX = _build_sub_provider_index(
+    EUROPEANA_SUB_PROVIDERS
+)
+SMITHSONIAN_SUB_PROVIDER_INDEX = _build_sub_provider_index(
+    SMITHSONIAN_SUB_PROVIDERS
+)
@@ -1,12 +1,26 @@
+import hashlib
+import io
 import logging
 import os
 
 from airflow.hooks.S3_hook import S3Hook
+from boto3.s3.transfer import TransferConfig
+
+from util.loader import ingestion_column
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_MEDIA_PREFIX = 'image'
 STAGING_PREFIX = 'db_loader_staging'
+MB = 1024 * 1024
+MULTIPART_THRESHOLD = 64 * MB
+MULTIPART_CHUNKSIZE = 64 * MB
+# S3 rejects parts outside these sizes, so boto3 adjusts any chunksize
+# outside them, which would change the ETag of the upload.
+MIN_PART_SIZE = 5 * MB
+MAX_PART_SIZE = 5 * 1024 * MB
+MAX_CONCURRENCY = 10
+KMS_ENCRYPTION_PREFIX = 'aws:kms'
 
 
 def copy_file_to_s3_staging(
@@ -16,17 +30,139 @@ def copy_file_to_s3_staging(
         aws_conn_id,
         media_prefix=DEFAULT_MEDIA_PREFIX,
         staging_prefix=STAGING_PREFIX,
+        multipart_threshold=MULTIPART_THRESHOLD,
+        multipart_chunksize=MULTIPART_CHUNKSIZE,
+        max_concurrency=MAX_CONCURRENCY,
+        verify_checksum=True,
 ):
+    """
+    Upload a TSV to the staging prefix for `identifier`.
+
+    Files larger than `multipart_threshold` are uploaded as multipart
+    uploads of `multipart_chunksize` parts (clamped to the part sizes S3
+    allows), with up to `max_concurrency` parts in flight at once.  The
+    ETag S3 should compute for the data is calculated while it is read,
+    and compared to the ETag of the uploaded object.  If they differ,
+    the object is deleted and an exception is raised.  Objects encrypted
+    with SSE-KMS are not verified, since their ETag is not an MD5.
+    """
     logger.info(f'Creating staging object in s3_bucket:  {s3_bucket}')
     s3 = S3Hook(aws_conn_id=aws_conn_id)
-    file_name = os.path.split(tsv_file_path)[1]
-    staging_object_prefix = _get_staging_object_prefix(
-        identifier,
-        media_prefix,
-        staging_prefix
+    staging_key = get_staging_s3_key(
+        identifier, tsv_file_path, media_prefix, staging_prefix
+    )
+    multipart_chunksize = _get_part_size(multipart_chunksize)
+    transfer_config = TransferConfig(
+        multipart_threshold=multipart_threshold,
+        multipart_chunksize=multipart_chunksize,
+        max_concurrency=max_concurrency,
+        use_threads=True,
     )
-    staging_key = _s3_join_path(staging_object_prefix, file_name)
-    s3.load_file(tsv_file_path, staging_key, bucket_name=s3_bucket)
+    client = s3.get_conn()
+    with ingestion_column.open_tsv(tsv_file_path) as tsv:
+        checksum_reader = ETagReader(
+            tsv, multipart_threshold, multipart_chunksize
+        )
+        client.upload_fileobj(
+            checksum_reader,
+            s3_bucket,
+            staging_key,
+            Config=transfer_config
+        )
+    logger.info(
+        f'Uploaded {checksum_reader.bytes_read} bytes to {staging_key}'
+    )
+    if verify_checksum:
+        _verify_etag(client, s3_bucket, staging_key, checksum_reader.etag)
+
+
+def _get_part_size(multipart_chunksize):
+    part_size = min(max(multipart_chunksize, MIN_PART_SIZE), MAX_PART_SIZE)
+    if part_size != multipart_chunksize:
+        logger.warning(
+            f'Using multipart chunksize {part_size} instead of '
+            f'{multipart_chunksize}, which S3 does not allow.'
+        )
+    return part_size
+
+
+def _verify_etag(client, s3_bucket, s3_key, expected_etag):
+    head = client.head_object(Bucket=s3_bucket, Key=s3_key)
+    encryption = head.get('ServerSideEncryption', '')
+    if encryption.startswith(KMS_ENCRYPTION_PREFIX):
+        logger.warning(
+            f'Not verifying ETag for {s3_key}, which is encrypted with'
+            f' {encryption}.'
+        )
+        return
+    actual_etag = head['ETag'].strip('"')
+    if actual_etag != expected_etag:
+        client.delete_object(Bucket=s3_bucket, Key=s3_key)
+        raise Exception(
+            f'Checksum mismatch for {s3_key}:  expected ETag {expected_etag}'
+            f' but S3 has {actual_etag}.  The object has been deleted.'
+        )
+    logger.info(f'Verified ETag {actual_etag} for {s3_key}')
+
+
+class ETagReader(io.RawIOBase):
+    """
+    A read-only stream which passes reads through to `file_obj`, and
+    computes the ETag S3 will report for the data read.
+
+    S3 reports the MD5 of the object for single-part uploads, and the
+    MD5 of the concatenated part MD5s followed by `-<number of parts>`
+    for multipart uploads.  The upload manager in boto3 switches to a
+    multipart upload once `multipart_threshold` bytes have been read, and
+    splits the data into parts of exactly `multipart_chunksize` bytes.
+    """
+
+    def __init__(self, file_obj, multipart_threshold, multipart_chunksize):
+        self._file_obj = file_obj
+        self._multipart_threshold = multipart_threshold
+        self._multipart_chunksize = multipart_chunksize
+        self._md5 = hashlib.md5()
+        self._part_md5 = hashlib.md5()
+        self._part_bytes = 0
+        self._part_digests = []
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self._file_obj.read(size)
+        self.bytes_read += len(data)
+        self._md5.update(data)
+        self._update_parts(data)
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    @property
+    def etag(self):
+        if self.bytes_read < self._multipart_threshold:
+            return self._md5.hexdigest()
+        part_digests = list(self._part_digests)
+        if self._part_bytes > 0:
+            part_digests.append(self._part_md5.digest())
+        combined = hashlib.md5(b''.join(part_digests)).hexdigest()
+        return f'{combined}-{len(part_digests)}'
+
+    def _update_parts(self, data):
+        view = memoryview(data)
+        while len(view) > 0:
+            room = self._multipart_chunksize - self._part_bytes
+            self._part_md5.update(view[:room])
+            self._part_bytes += min(room, len(view))
+            view = view[room:]
+            if self._part_bytes == self._multipart_chunksize:
+                self._part_digests.append(self._part_md5.digest())
+                self._part_md5 = hashlib.md5()
+                self._part_bytes = 0
 
 
 def get_staged_s3_object(
@@ -47,6 +183,34 @@ def get_staged_s3_object(
     return key_list[0]
 
 
+def get_staging_s3_key(
+        identifier,
+        tsv_file_path,
+        media_prefix=DEFAULT_MEDIA_PREFIX,
+        staging_prefix=STAGING_PREFIX,
+):
+    """
+    Return the key `copy_file_to_s3_staging` uses for `tsv_file_path`,
+    so that the staged object can be found without listing the prefix.
+    """
+    file_name = os.path.split(tsv_file_path)[1]
+    staging_object_prefix = _get_staging_object_prefix(
+        identifier,
+        media_prefix,
+        staging_prefix
+    )
+    return _s3_join_path(staging_object_prefix, file_name)
+
+
+def get_s3_object_stream(s3_key, s3_bucket, aws_conn_id):
+    """
+    Return a binary file-like object that reads the body of the object at
+    `s3_key` as it is downloaded.
+    """
+    s3 = S3Hook(aws_conn_id=aws_conn_id)
+    return s3.get_key(s3_key, bucket_name=s3_bucket).get()['Body']
+
+
 def _get_staging_object_prefix(
         identifier,
         media_prefix,
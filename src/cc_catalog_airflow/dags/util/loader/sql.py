@@ -1,51 +1,76 @@
+from collections import namedtuple
 import logging
 import json
+import re
 from textwrap import dedent
-from airflow.hooks.postgres_hook import PostgresHook
 from util.loader import column_names as col
+from util.loader import ingestion_column
 from util.loader import provider_details as prov
+from util.loader import streaming
+from util.postgres_session import get_postgres_session, with_postgres_session
 from psycopg2.errors import InvalidTextRepresentation
 
 logger = logging.getLogger(__name__)
 
 LOAD_TABLE_NAME_STUB = 'provider_image_data'
 IMAGE_TABLE_NAME = 'image'
+IMAGE_DEFAULT_PARTITION_SUFFIX = 'default'
+UNPARTITIONED_IMAGE_TABLE_SUFFIX = 'unpartitioned'
 DB_USER_NAME = 'deploy'
 NOW = 'NOW()'
 FALSE = "'f'"
-
-
+LOAD_TABLE_MAINTENANCE_WORK_MEM = '256MB'
+LOAD_TABLE_PARALLEL_WORKERS = None
+# The loading table can always be rebuilt from the staged TSV, so there
+# is no need to wait for its changes to be flushed to disk.
+LOAD_TABLE_SESSION_SETTINGS = {'synchronous_commit': 'off'}
+
+Column = namedtuple('Column', ['name', 'definition'])
+
+LOAD_TABLE_COLUMNS = [
+    Column(name=col.FOREIGN_ID, definition='character varying(3000)'),
+    Column(name=col.LANDING_URL, definition='character varying(1000)'),
+    Column(name=col.DIRECT_URL, definition='character varying(3000)'),
+    Column(name=col.THUMBNAIL, definition='character varying(3000)'),
+    Column(name=col.WIDTH, definition='integer'),
+    Column(name=col.HEIGHT, definition='integer'),
+    Column(name=col.FILESIZE, definition='integer'),
+    Column(name=col.LICENSE, definition='character varying(50)'),
+    Column(name=col.LICENSE_VERSION, definition='character varying(25)'),
+    Column(name=col.CREATOR, definition='character varying(2000)'),
+    Column(name=col.CREATOR_URL, definition='character varying(2000)'),
+    Column(name=col.TITLE, definition='character varying(5000)'),
+    Column(name=col.META_DATA, definition='jsonb'),
+    Column(name=col.TAGS, definition='jsonb'),
+    Column(name=col.WATERMARKED, definition='boolean'),
+    Column(name=col.PROVIDER, definition='character varying(80)'),
+    Column(name=col.SOURCE, definition='character varying(80)'),
+    Column(name=col.INGESTION_TYPE, definition='character varying(80)'),
+]
+
+
+@with_postgres_session(settings=LOAD_TABLE_SESSION_SETTINGS)
 def create_loading_table(
         postgres_conn_id,
         identifier
 ):
     """
-    Create intermediary table and indices if they do not exist
+    Create intermediary table.
+
+    The table is UNLOGGED, since it only lives for the duration of a
+    single loader run and can always be rebuilt from the staged TSV.
+    Indices are not created here; see `_create_load_table_indices`.
     """
     load_table = _get_load_table_name(identifier)
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
+    postgres = get_postgres_session(postgres_conn_id)
+    load_table_columns_string = ',\n              '.join(
+        f'{c.name} {c.definition}' for c in LOAD_TABLE_COLUMNS
+    )
     postgres.run(
         dedent(
             f'''
-            CREATE TABLE public.{load_table} (
-              {col.FOREIGN_ID} character varying(3000),
-              {col.LANDING_URL} character varying(1000),
-              {col.DIRECT_URL} character varying(3000),
-              {col.THUMBNAIL} character varying(3000),
-              {col.WIDTH} integer,
-              {col.HEIGHT} integer,
-              {col.FILESIZE} integer,
-              {col.LICENSE} character varying(50),
-              {col.LICENSE_VERSION} character varying(25),
-              {col.CREATOR} character varying(2000),
-              {col.CREATOR_URL} character varying(2000),
-              {col.TITLE} character varying(5000),
-              {col.META_DATA} jsonb,
-              {col.TAGS} jsonb,
-              {col.WATERMARKED} boolean,
-              {col.PROVIDER} character varying(80),
-              {col.SOURCE} character varying(80),
-              {col.INGESTION_TYPE} character varying(80)
+            CREATE UNLOGGED TABLE public.{load_table} (
+              {load_table_columns_string}
             );
             '''
         )
@@ -53,49 +78,93 @@ def create_loading_table(
     postgres.run(
         f'ALTER TABLE public.{load_table} OWNER TO {DB_USER_NAME};'
     )
-    postgres.run(
-        dedent(
-            f'''
-            CREATE INDEX IF NOT EXISTS {load_table}_{col.PROVIDER}_key
-            ON public.{load_table} USING btree ({col.PROVIDER});
-            '''
-        )
-    )
-    postgres.run(
-        dedent(
-            f'''
-            CREATE INDEX IF NOT EXISTS {load_table}_{col.FOREIGN_ID}_key
-            ON public.{load_table}
-            USING btree (provider, md5(({col.FOREIGN_ID})::text));
-            '''
+
+
+def _create_load_table_indices(
+        postgres_hook,
+        load_table,
+        maintenance_work_mem=LOAD_TABLE_MAINTENANCE_WORK_MEM,
+        parallel_workers=LOAD_TABLE_PARALLEL_WORKERS,
+):
+    """
+    Build the indices needed to clean the intermediary table.
+
+    This should be called after the data is loaded, so that the indices
+    are built in one sorted pass rather than maintained row by row
+    during COPY.  Only the (provider, md5(foreign_identifier)) index is
+    built, since it is the only one used by the deduplication query in
+    `_clean_intermediate_table_data`; the upsert reads the whole table
+    sequentially.
+
+    Setting `parallel_workers` requires PostgreSQL 11 or higher.
+    """
+    session_settings = {'maintenance_work_mem': maintenance_work_mem}
+    if parallel_workers is not None:
+        session_settings['max_parallel_maintenance_workers'] = parallel_workers
+    logger.info(f'Creating indices on {load_table}')
+    with postgres_hook.scope(settings=session_settings):
+        postgres_hook.run(
+            [
+                dedent(
+                    f'''
+                    CREATE INDEX IF NOT EXISTS
+                      {load_table}_{col.FOREIGN_ID}_key
+                    ON public.{load_table}
+                    USING btree (
+                      {col.PROVIDER}, md5(({col.FOREIGN_ID})::text)
+                    );
+                    '''
+                ),
+                f'ANALYZE public.{load_table};',
+            ]
         )
+
+
+@with_postgres_session(settings=LOAD_TABLE_SESSION_SETTINGS)
+def load_local_data_to_intermediate_table(
+        postgres_conn_id,
+        tsv_file_name,
+        identifier,
+        max_rows_to_skip=10,
+        maintenance_work_mem=LOAD_TABLE_MAINTENANCE_WORK_MEM,
+        parallel_workers=LOAD_TABLE_PARALLEL_WORKERS,
+):
+    copy_local_data_to_intermediate_table(
+        postgres_conn_id,
+        tsv_file_name,
+        identifier,
+        max_rows_to_skip=max_rows_to_skip,
     )
-    postgres.run(
-        dedent(
-            f'''
-            CREATE INDEX IF NOT EXISTS {load_table}_{col.DIRECT_URL}_key
-            ON public.{load_table}
-            USING btree (provider, md5(({col.DIRECT_URL})::text));
-            '''
-        )
+    clean_intermediate_table_data(
+        postgres_conn_id,
+        identifier,
+        maintenance_work_mem=maintenance_work_mem,
+        parallel_workers=parallel_workers,
     )
 
 
-def load_local_data_to_intermediate_table(
+@with_postgres_session(settings=LOAD_TABLE_SESSION_SETTINGS)
+def copy_local_data_to_intermediate_table(
         postgres_conn_id,
         tsv_file_name,
         identifier,
-        max_rows_to_skip=10
+        max_rows_to_skip=10,
 ):
+    """
+    COPY a local TSV into the intermediary table without cleaning it.
+
+    Each call uses its own connection, so several files can be copied
+    into the same table concurrently.
+    """
     load_table = _get_load_table_name(identifier)
     logger.info(f'Loading {tsv_file_name} into {load_table}')
 
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
+    postgres = get_postgres_session(postgres_conn_id)
     load_successful = False
 
     while not load_successful and max_rows_to_skip >= 0:
         try:
-            postgres.bulk_load(f'{load_table}', tsv_file_name)
+            _copy_tsv_to_table(postgres, load_table, tsv_file_name)
             load_successful = True
 
         except InvalidTextRepresentation as e:
@@ -109,19 +178,83 @@ def load_local_data_to_intermediate_table(
         raise InvalidTextRepresentation(
             'Exceeded the maximum number of allowed defective rows')
 
-    _clean_intermediate_table_data(postgres, load_table)
+
+@with_postgres_session(settings=LOAD_TABLE_SESSION_SETTINGS)
+def clean_intermediate_table_data(
+        postgres_conn_id,
+        identifier,
+        maintenance_work_mem=LOAD_TABLE_MAINTENANCE_WORK_MEM,
+        parallel_workers=LOAD_TABLE_PARALLEL_WORKERS,
+):
+    load_table = _get_load_table_name(identifier)
+    postgres = get_postgres_session(postgres_conn_id)
+    _clean_intermediate_table_data(
+        postgres,
+        load_table,
+        maintenance_work_mem=maintenance_work_mem,
+        parallel_workers=parallel_workers,
+    )
 
 
+@with_postgres_session(settings=LOAD_TABLE_SESSION_SETTINGS)
+def copy_stream_to_intermediate_table(
+        postgres_conn_id,
+        stream,
+        identifier,
+        stream_name,
+        chunk_size=streaming.COPY_CHUNK_SIZE,
+):
+    """
+    COPY TSV data from any binary file-like object into the intermediary
+    table with `COPY ... FROM STDIN`, without cleaning it.
+
+    Returns the number of bytes read from `stream`.
+    """
+    load_table = _get_load_table_name(identifier)
+    logger.info(f'Streaming {stream_name} into {load_table}')
+    postgres = get_postgres_session(postgres_conn_id)
+    return _copy_stream_to_table(
+        postgres, load_table, stream, stream_name, chunk_size
+    )
+
+
+def _copy_tsv_to_table(postgres_hook, table, tsv_file_name):
+    """
+    COPY a local TSV into `table`, adding the ingestion_type column on
+    the fly if the file does not have it.
+    """
+    with ingestion_column.open_tsv(tsv_file_name) as tsv:
+        _copy_stream_to_table(postgres_hook, table, tsv, tsv_file_name)
+
+
+def _copy_stream_to_table(
+        postgres_hook,
+        table,
+        stream,
+        stream_name,
+        chunk_size=streaming.COPY_CHUNK_SIZE,
+):
+    progress = streaming.ProgressReader(stream, stream_name)
+    postgres_hook.copy_expert(
+        f'COPY {table} FROM STDIN', progress, size=chunk_size
+    )
+    progress.log_progress()
+    return progress.bytes_read
+
+
+@with_postgres_session(settings=LOAD_TABLE_SESSION_SETTINGS)
 def load_s3_data_to_intermediate_table(
         postgres_conn_id,
         bucket,
         s3_key,
-        identifier
+        identifier,
+        maintenance_work_mem=LOAD_TABLE_MAINTENANCE_WORK_MEM,
+        parallel_workers=LOAD_TABLE_PARALLEL_WORKERS,
 ):
     load_table = _get_load_table_name(identifier)
     logger.info(f'Loading {s3_key} from S3 Bucket {bucket} into {load_table}')
 
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
+    postgres = get_postgres_session(postgres_conn_id)
     postgres.run(
         dedent(
             f"""
@@ -136,12 +269,19 @@ def load_s3_data_to_intermediate_table(
             """
         )
     )
-    _clean_intermediate_table_data(postgres, load_table)
+    _clean_intermediate_table_data(
+        postgres,
+        load_table,
+        maintenance_work_mem=maintenance_work_mem,
+        parallel_workers=parallel_workers,
+    )
 
 
 def _clean_intermediate_table_data(
         postgres_hook,
-        load_table
+        load_table,
+        maintenance_work_mem=LOAD_TABLE_MAINTENANCE_WORK_MEM,
+        parallel_workers=LOAD_TABLE_PARALLEL_WORKERS,
 ):
     postgres_hook.run(
         f'DELETE FROM {load_table} WHERE {col.DIRECT_URL} IS NULL;'
@@ -155,6 +295,12 @@ def _clean_intermediate_table_data(
     postgres_hook.run(
         f'DELETE FROM {load_table} WHERE {col.FOREIGN_ID} IS NULL;'
     )
+    _create_load_table_indices(
+        postgres_hook,
+        load_table,
+        maintenance_work_mem=maintenance_work_mem,
+        parallel_workers=parallel_workers,
+    )
     postgres_hook.run(
         dedent(
             f'''
@@ -163,12 +309,14 @@ def _clean_intermediate_table_data(
             WHERE
               p1.ctid < p2.ctid
               AND p1.{col.PROVIDER} = p2.{col.PROVIDER}
+              AND md5(p1.{col.FOREIGN_ID}) = md5(p2.{col.FOREIGN_ID})
               AND p1.{col.FOREIGN_ID} = p2.{col.FOREIGN_ID};
             '''
         )
     )
 
 
+@with_postgres_session
 def upsert_records_to_image_table(
         postgres_conn_id,
         identifier,
@@ -191,18 +339,37 @@ def upsert_records_to_image_table(
           )'''
 
     def _merge_jsonb_arrays(column):
-        return f'''{column} = COALESCE(
-            (
-              SELECT jsonb_agg(DISTINCT x)
-              FROM jsonb_array_elements(old.{column} || EXCLUDED.{column}) t(x)
-            ),
-            EXCLUDED.{column},
-            old.{column}
-          )'''
+        """
+        This function returns SQL that merges two JSONB arrays, keeping
+        each distinct element once.  Since most rows are upserted with
+        the same array they already have, and CASE only evaluates the
+        branch it needs, the set-returning subquery is only run when the
+        arrays actually differ.
+        """
+        return f'''{column} = CASE
+            WHEN
+              EXCLUDED.{column} IS NULL
+              OR old.{column} = EXCLUDED.{column}
+            THEN
+              old.{column}
+            WHEN old.{column} IS NULL THEN
+              EXCLUDED.{column}
+            ELSE
+              COALESCE(
+                (
+                  SELECT jsonb_agg(DISTINCT x)
+                  FROM jsonb_array_elements(
+                    old.{column} || EXCLUDED.{column}
+                  ) t(x)
+                ),
+                EXCLUDED.{column},
+                old.{column}
+              )
+          END'''
 
     load_table = _get_load_table_name(identifier)
     logger.info(f'Upserting new records into {image_table}.')
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
+    postgres = get_postgres_session(postgres_conn_id)
     column_inserts = {
         col.CREATED_ON: NOW,
         col.UPDATED_ON: NOW,
@@ -227,40 +394,272 @@ def upsert_records_to_image_table(
         col.TAGS: col.TAGS,
         col.WATERMARKED: col.WATERMARKED
     }
-    upsert_query = dedent(
+
+    def _get_upsert_query(target_table, where_clause=''):
+        return dedent(
+            f'''
+            INSERT INTO {target_table} AS old (
+              {', '.join(column_inserts.keys())}
+            )
+            SELECT {', '.join(column_inserts.values())}
+            FROM {load_table}
+            {where_clause}
+            ON CONFLICT ({col.PROVIDER}, md5({col.FOREIGN_ID}))
+            DO UPDATE SET
+              {col.UPDATED_ON} = {NOW},
+              {col.LAST_SYNCED} = {NOW},
+              {col.REMOVED} = {FALSE},
+              {_newest_non_null(col.INGESTION_TYPE)},
+              {_newest_non_null(col.SOURCE)},
+              {_newest_non_null(col.LANDING_URL)},
+              {_newest_non_null(col.DIRECT_URL)},
+              {_newest_non_null(col.THUMBNAIL)},
+              {_newest_non_null(col.WIDTH)},
+              {_newest_non_null(col.HEIGHT)},
+              {_newest_non_null(col.FILESIZE)},
+              {_newest_non_null(col.LICENSE)},
+              {_newest_non_null(col.LICENSE_VERSION)},
+              {_newest_non_null(col.CREATOR)},
+              {_newest_non_null(col.CREATOR_URL)},
+              {_newest_non_null(col.TITLE)},
+              {_newest_non_null(col.WATERMARKED)},
+              {_merge_jsonb_objects(col.META_DATA)},
+              {_merge_jsonb_arrays(col.TAGS)}
+            '''
+        )
+
+    upsert_queries = [
+        _get_upsert_query(target_table, where_clause)
+        for target_table, where_clause in _get_upsert_targets(
+            postgres, load_table, image_table
+        )
+    ]
+    postgres.run(upsert_queries)
+
+
+def _get_upsert_targets(postgres_hook, load_table, image_table):
+    """
+    Return a list of (table, WHERE clause) pairs saying where each row of
+    the loading table should be upserted.
+
+    If `image_table` is partitioned, the rows of each provider with its
+    own partition are upserted straight into that partition, so that
+    only its indices are searched for conflicts.  All other rows go to
+    the default partition, or are routed by `image_table` if there is
+    none.
+    """
+    partitions = get_image_partitions(postgres_hook, image_table)
+    if not partitions:
+        return [(image_table, '')]
+
+    load_providers = [
+        r[0] for r in postgres_hook.get_records(
+            f'SELECT DISTINCT {col.PROVIDER} FROM {load_table};'
+        )
+    ]
+    partitioned_providers = [
+        p for p in load_providers
+        if p is not None
+        and get_image_partition_name(p, image_table) in partitions
+    ]
+    targets = [
+        (
+            get_image_partition_name(p, image_table),
+            f"WHERE {col.PROVIDER}='{p}'"
+        )
+        for p in partitioned_providers
+    ]
+    if len(partitioned_providers) < len(load_providers):
+        default_partition = get_image_partition_name(
+            IMAGE_DEFAULT_PARTITION_SUFFIX, image_table
+        )
+        if default_partition not in partitions:
+            default_partition = image_table
+        if partitioned_providers:
+            provider_list = ', '.join(f"'{p}'" for p in partitioned_providers)
+            where_clause = (
+                f'WHERE {col.PROVIDER} IS NULL'
+                f' OR {col.PROVIDER} NOT IN ({provider_list})'
+            )
+        else:
+            where_clause = ''
+        targets.append((default_partition, where_clause))
+    return targets
+
+
+def get_image_partition_name(provider, image_table=IMAGE_TABLE_NAME):
+    partition_suffix = re.sub(r'\W', '_', provider.lower())
+    return f'{image_table}_{partition_suffix}'
+
+
+def get_image_partitions(postgres_hook, image_table=IMAGE_TABLE_NAME):
+    """
+    Return the set of names of the partitions of `image_table`, which is
+    empty if the table is not partitioned.
+    """
+    return {
+        r[0] for r in postgres_hook.get_records(
+            dedent(
+                '''
+                SELECT child.relname
+                FROM pg_inherits
+                JOIN pg_class parent ON parent.oid=pg_inherits.inhparent
+                JOIN pg_class child ON child.oid=pg_inherits.inhrelid
+                WHERE parent.relname=%s;
+                '''
+            ),
+            parameters=(image_table,),
+        )
+    }
+
+
+def get_image_table_for_provider(
+        postgres_hook,
+        provider,
+        image_table=IMAGE_TABLE_NAME,
+):
+    """
+    Return the name of the table holding the rows of `provider`.  This
+    is its partition if `image_table` is partitioned and the provider
+    has one, and `image_table` otherwise.
+    """
+    partition = get_image_partition_name(provider, image_table)
+    if partition in get_image_partitions(postgres_hook, image_table):
+        return partition
+    else:
+        return image_table
+
+
+@with_postgres_session
+def partition_image_table(
+        postgres_conn_id,
+        providers,
+        image_table=IMAGE_TABLE_NAME,
+):
+    """
+    Migrate `image_table` to a table list-partitioned by provider, with a
+    partition for each of `providers` and a default partition for the
+    rest.  This requires PostgreSQL 11 or higher.
+
+    The migration runs in one transaction.  The old table is renamed
+    with the suffix `UNPARTITIONED_IMAGE_TABLE_SUFFIX` and kept, since
+    views on it (e.g., the popularity constants) still refer to it.
+    Once those have been recreated, it can be dropped.
+    """
+    postgres = get_postgres_session(postgres_conn_id)
+    old_table = f'{image_table}_{UNPARTITIONED_IMAGE_TABLE_SUFFIX}'
+    partitions = [
+        (get_image_partition_name(p, image_table), f"FOR VALUES IN ('{p}')")
+        for p in providers
+    ] + [
+        (
+            get_image_partition_name(
+                IMAGE_DEFAULT_PARTITION_SUFFIX, image_table
+            ),
+            'DEFAULT'
+        )
+    ]
+    logger.info(f'Partitioning {image_table} into {partitions}')
+    postgres.run(
+        [
+            f'ALTER TABLE public.{image_table} RENAME TO {old_table};',
+            dedent(
+                f'''
+                ALTER INDEX IF EXISTS public.{image_table}_provider_fid_idx
+                RENAME TO {old_table}_provider_fid_idx;
+                '''
+            ),
+            dedent(
+                f'''
+                CREATE TABLE public.{image_table} (
+                  LIKE public.{old_table} INCLUDING DEFAULTS
+                ) PARTITION BY LIST ({col.PROVIDER});
+                '''
+            ),
+            f'ALTER TABLE public.{image_table} OWNER TO {DB_USER_NAME};',
+        ] + [
+            dedent(
+                f'''
+                CREATE TABLE public.{partition}
+                PARTITION OF public.{image_table} {bound};
+                ALTER TABLE public.{partition} OWNER TO {DB_USER_NAME};
+                '''
+            )
+            for partition, bound in partitions
+        ] + [
+            f'INSERT INTO public.{image_table} SELECT * FROM {old_table};',
+            _get_image_table_index_query(image_table),
+        ]
+    )
+
+
+@with_postgres_session
+def add_image_partition(
+        postgres_conn_id,
+        provider,
+        image_table=IMAGE_TABLE_NAME,
+):
+    """
+    Give `provider` its own partition of the partitioned `image_table`,
+    moving its rows out of the default partition in one transaction.
+    """
+    postgres = get_postgres_session(postgres_conn_id)
+    partition = get_image_partition_name(provider, image_table)
+    default_partition = get_image_partition_name(
+        IMAGE_DEFAULT_PARTITION_SUFFIX, image_table
+    )
+    logger.info(f'Moving {provider} rows into {partition}')
+    postgres.run(
+        [
+            dedent(
+                f'''
+                CREATE TABLE public.{partition} (
+                  LIKE public.{image_table} INCLUDING DEFAULTS
+                );
+                '''
+            ),
+            f'ALTER TABLE public.{partition} OWNER TO {DB_USER_NAME};',
+            dedent(
+                f'''
+                INSERT INTO public.{partition}
+                SELECT * FROM public.{default_partition}
+                WHERE {col.PROVIDER}='{provider}';
+                '''
+            ),
+            dedent(
+                f'''
+                DELETE FROM public.{default_partition}
+                WHERE {col.PROVIDER}='{provider}';
+                '''
+            ),
+            # Attaching builds the indices of the partitioned table.
+            dedent(
+                f'''
+                ALTER TABLE public.{image_table}
+                ATTACH PARTITION public.{partition}
+                FOR VALUES IN ('{provider}');
+                '''
+            ),
+        ]
+    )
+
+
+def _get_image_table_index_query(image_table):
+    return dedent(
         f'''
-        INSERT INTO {image_table} AS old ({', '.join(column_inserts.keys())})
-        SELECT {', '.join(column_inserts.values())}
-        FROM {load_table}
-        ON CONFLICT ({col.PROVIDER}, md5({col.FOREIGN_ID}))
-        DO UPDATE SET
-          {col.UPDATED_ON} = {NOW},
-          {col.LAST_SYNCED} = {NOW},
-          {col.REMOVED} = {FALSE},
-          {_newest_non_null(col.INGESTION_TYPE)},
-          {_newest_non_null(col.SOURCE)},
-          {_newest_non_null(col.LANDING_URL)},
-          {_newest_non_null(col.DIRECT_URL)},
-          {_newest_non_null(col.THUMBNAIL)},
-          {_newest_non_null(col.WIDTH)},
-          {_newest_non_null(col.HEIGHT)},
-          {_newest_non_null(col.FILESIZE)},
-          {_newest_non_null(col.LICENSE)},
-          {_newest_non_null(col.LICENSE_VERSION)},
-          {_newest_non_null(col.CREATOR)},
-          {_newest_non_null(col.CREATOR_URL)},
-          {_newest_non_null(col.TITLE)},
-          {_newest_non_null(col.WATERMARKED)},
-          {_merge_jsonb_objects(col.META_DATA)},
-          {_merge_jsonb_arrays(col.TAGS)}
+        CREATE UNIQUE INDEX {image_table}_provider_fid_idx
+          ON public.{image_table}
+          USING btree ({col.PROVIDER}, md5({col.FOREIGN_ID}));
+        CREATE INDEX {image_table}_identifier_idx
+          ON public.{image_table} ({col.IDENTIFIER});
         '''
     )
-    postgres.run(upsert_query)
 
 
+@with_postgres_session(settings=LOAD_TABLE_SESSION_SETTINGS)
 def drop_load_table(postgres_conn_id, identifier):
     load_table = _get_load_table_name(identifier)
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
+    postgres = get_postgres_session(postgres_conn_id)
     postgres.run(f'DROP TABLE {load_table};')
 
 
@@ -295,12 +694,13 @@ def _delete_malformed_row_in_file(tsv_file_name, line_number):
 
 def _create_temp_flickr_sub_prov_table(
         postgres_conn_id,
-        temp_table='temp_flickr_sub_prov_table'
+        temp_table='temp_flickr_sub_prov_table',
+        sub_provider_index=prov.FLICKR_SUB_PROVIDER_INDEX
 ):
     """
     Drop the temporary table if it already exists
     """
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
+    postgres = get_postgres_session(postgres_conn_id)
     postgres.run(f'DROP TABLE IF EXISTS public.{temp_table};')
 
     """
@@ -324,33 +724,48 @@ def _create_temp_flickr_sub_prov_table(
     """
     Populate the intermediary table with the sub providers of interest
     """
-    for sub_prov, user_id_set in prov.FLICKR_SUB_PROVIDERS.items():
-        for user_id in user_id_set:
-            creator_url = prov.FLICKR_PHOTO_URL_BASE + user_id
-            postgres.run(
-                dedent(
-                    f'''
-                    INSERT INTO public.{temp_table} (
-                      {col.CREATOR_URL},
-                      sub_provider
-                    )
-                    VALUES (
-                      '{creator_url}',
-                      '{sub_prov}'
-                    );
-                    '''
-                )
-            )
+    _insert_sub_provider_rows(
+        postgres,
+        temp_table,
+        col.CREATOR_URL,
+        [
+            (prov.FLICKR_PHOTO_URL_BASE + user_id, sub_prov)
+            for user_id, sub_prov in sub_provider_index.items()
+        ]
+    )
 
     return temp_table
 
 
+def _insert_sub_provider_rows(postgres, temp_table, key_column, rows):
+    """
+    Insert the (key, sub provider) pairs in `rows` into the intermediary
+    table with a single statement.
+    """
+    if not rows:
+        return
+    values = ', '.join('(%s, %s)' for _ in rows)
+    postgres.run(
+        dedent(
+            f'''
+            INSERT INTO public.{temp_table} ({key_column}, sub_provider)
+            VALUES {values};
+            '''
+        ),
+        parameters=[value for row in rows for value in row]
+    )
+
+
+@with_postgres_session
 def update_flickr_sub_providers(
   postgres_conn_id,
   image_table=IMAGE_TABLE_NAME,
   default_provider=prov.FLICKR_DEFAULT_PROVIDER,
 ):
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
+    postgres = get_postgres_session(postgres_conn_id)
+    image_table = get_image_table_for_provider(
+        postgres, default_provider, image_table
+    )
     temp_table = _create_temp_flickr_sub_prov_table(postgres_conn_id)
 
     select_query = dedent(
@@ -395,12 +810,13 @@ def update_flickr_sub_providers(
 
 def _create_temp_europeana_sub_prov_table(
         postgres_conn_id,
-        temp_table='temp_eur_sub_prov_table'
+        temp_table='temp_eur_sub_prov_table',
+        sub_provider_index=prov.EUROPEANA_SUB_PROVIDER_INDEX
 ):
     """
     Drop the temporary table if it already exists
     """
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
+    postgres = get_postgres_session(postgres_conn_id)
     postgres.run(f'DROP TABLE IF EXISTS public.{temp_table};')
 
     """
@@ -424,32 +840,27 @@ def _create_temp_europeana_sub_prov_table(
     """
     Populate the intermediary table with the sub providers of interest
     """
-    for sub_prov, data_provider in prov.EUROPEANA_SUB_PROVIDERS.items():
-        postgres.run(
-            dedent(
-                f'''
-                INSERT INTO public.{temp_table} (
-                  data_provider,
-                  sub_provider
-                )
-                VALUES (
-                  '{data_provider}',
-                  '{sub_prov}'
-                );
-                '''
-            )
-        )
+    _insert_sub_provider_rows(
+        postgres,
+        temp_table,
+        'data_provider',
+        list(sub_provider_index.items())
+    )
 
     return temp_table
 
 
+@with_postgres_session
 def update_europeana_sub_providers(
   postgres_conn_id,
   image_table=IMAGE_TABLE_NAME,
   default_provider=prov.EUROPEANA_DEFAULT_PROVIDER,
-  sub_providers=prov.EUROPEANA_SUB_PROVIDERS
+  sub_provider_index=prov.EUROPEANA_SUB_PROVIDER_INDEX
 ):
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
+    postgres = get_postgres_session(postgres_conn_id)
+    image_table = get_image_table_for_provider(
+        postgres, default_provider, image_table
+    )
     temp_table = _create_temp_europeana_sub_prov_table(postgres_conn_id)
 
     select_query = dedent(
@@ -479,8 +890,10 @@ def update_europeana_sub_providers(
         data_providers = json.loads(row[1])
         sub_provider = row[2]
 
-        eligible_sub_providers = {s for s in sub_providers if sub_providers[s]
-                                  in data_providers}
+        eligible_sub_providers = {
+            sub_provider_index[d] for d in data_providers
+            if d in sub_provider_index
+        }
         if len(eligible_sub_providers) > 1:
             raise Exception(f"More than one sub-provider identified for the "
                             f"image with foreign ID {foreign_id}")
@@ -507,13 +920,17 @@ def update_europeana_sub_providers(
     postgres.run(f'DROP TABLE public.{temp_table};')
 
 
+@with_postgres_session
 def update_smithsonian_sub_providers(
   postgres_conn_id,
   image_table=IMAGE_TABLE_NAME,
   default_provider=prov.SMITHSONIAN_DEFAULT_PROVIDER,
-  sub_providers=prov.SMITHSONIAN_SUB_PROVIDERS
+  sub_provider_index=prov.SMITHSONIAN_SUB_PROVIDER_INDEX
 ):
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
+    postgres = get_postgres_session(postgres_conn_id)
+    image_table = get_image_table_for_provider(
+        postgres, default_provider, image_table
+    )
 
     """
     Select all records where the source value is not yet updated
@@ -540,8 +957,7 @@ def update_smithsonian_sub_providers(
         foreign_id = row[0]
         unit_code = row[1]
 
-        source = next((s for s in sub_providers if unit_code in
-                       sub_providers[s]), None)
+        source = sub_provider_index.get(unit_code)
         if source is None:
             raise Exception(
                 f"An unknown unit code value {unit_code} encountered ")
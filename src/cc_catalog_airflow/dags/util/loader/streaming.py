@@ -0,0 +1,77 @@
+"""
+This module has helpers for streaming data from a file-like source into
+PostgreSQL with `COPY ... FROM STDIN`, so that a staged file can be
+loaded from the Airflow worker (from local disk, an S3 object, or the
+output of a transform) without writing an intermediate copy.
+"""
+import bz2
+import gzip
+import io
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+PROGRESS_LOG_INTERVAL_SECONDS = 30
+
+
+def open_decompressed(file_obj, file_name):
+    """
+    Wrap `file_obj` in a decompressing reader if `file_name` has a
+    compressed extension.  Otherwise, return it unchanged.
+    """
+    if file_name.endswith('.gz'):
+        logger.info(f'Decompressing {file_name} with gzip')
+        return gzip.GzipFile(fileobj=file_obj, mode='rb')
+    elif file_name.endswith('.bz2'):
+        logger.info(f'Decompressing {file_name} with bz2')
+        return bz2.BZ2File(file_obj, mode='rb')
+    else:
+        return file_obj
+
+
+class ProgressReader(io.RawIOBase):
+    """
+    A read-only stream which passes reads through to `file_obj`, and logs
+    the number of bytes read and the read rate every `log_interval`
+    seconds.
+    """
+
+    def __init__(
+            self,
+            file_obj,
+            name,
+            log_interval=PROGRESS_LOG_INTERVAL_SECONDS,
+    ):
+        self._file_obj = file_obj
+        self._name = name
+        self._log_interval = log_interval
+        self._start_time = time.monotonic()
+        self._last_log_time = self._start_time
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        data = self._file_obj.read(size)
+        self.bytes_read += len(data)
+        now = time.monotonic()
+        if now - self._last_log_time >= self._log_interval:
+            self._last_log_time = now
+            self.log_progress()
+        return data
+
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def log_progress(self):
+        elapsed = max(time.monotonic() - self._start_time, 1e-6)
+        rate = self.bytes_read / elapsed
+        logger.info(
+            f'Read {self.bytes_read} bytes from {self._name} in '
+            f'{elapsed:.1f} seconds ({rate:.0f} bytes/sec)'
+        )
@@ -12,49 +12,78 @@ RESOURCES = os.path.join(
 )
 
 
-def test_check_and_fix_file_adds_column_to_provider_api_tsv(tmpdir):
+def test_open_tsv_adds_column_to_provider_api_tsv(tmpdir):
     old_tsv_file_path = os.path.join(RESOURCES, 'old_columns_papis.tsv')
     new_tsv_file_path = os.path.join(RESOURCES, 'new_columns_papis.tsv')
     with open(old_tsv_file_path) as f:
         old_tsv_data = f.read()
     test_tsv = 'test.tsv'
     path = tmpdir.join(test_tsv)
-    backup_path = tmpdir.join(test_tsv + '.old')
     path.write(old_tsv_data)
-    ic.check_and_fix_tsv_file(path.strpath)
-    actual_tsv_data = path.read()
+    with ic.open_tsv(path.strpath) as tsv:
+        actual_tsv_data = tsv.read().decode('utf-8')
     with open(new_tsv_file_path) as f:
         expect_tsv_data = f.read()
     assert expect_tsv_data == actual_tsv_data
-    assert backup_path.read() == old_tsv_data
+    assert path.read() == old_tsv_data
 
 
-def test_check_and_fix_file_adds_column_to_common_crawl_tsv(tmpdir):
+def test_open_tsv_adds_column_to_common_crawl_tsv(tmpdir):
     old_tsv_file_path = os.path.join(RESOURCES, 'old_columns_crawl.tsv')
     new_tsv_file_path = os.path.join(RESOURCES, 'new_columns_crawl.tsv')
     with open(old_tsv_file_path) as f:
         old_tsv_data = f.read()
     test_tsv = 'test.tsv'
     path = tmpdir.join(test_tsv)
-    backup_path = tmpdir.join(test_tsv + '.old')
     path.write(old_tsv_data)
-    ic.check_and_fix_tsv_file(path.strpath)
-    actual_tsv_data = path.read()
+    with ic.open_tsv(path.strpath) as tsv:
+        actual_tsv_data = tsv.read().decode('utf-8')
     with open(new_tsv_file_path) as f:
         expect_tsv_data = f.read()
     assert expect_tsv_data == actual_tsv_data
-    assert backup_path.read() == old_tsv_data
+    assert path.read() == old_tsv_data
 
 
-def test_check_and_fix_file_leaves_unchanged_when_enough_columns_tsv(tmpdir):
+def test_open_tsv_leaves_unchanged_when_enough_columns_tsv(tmpdir):
     tsv_file_path = os.path.join(RESOURCES, 'new_columns_papis.tsv')
     with open(tsv_file_path) as f:
         tsv_data = f.read()
     test_tsv = 'test.tsv'
     path = tmpdir.join(test_tsv)
-    backup_path = tmpdir.join(test_tsv + '.old')
     path.write(tsv_data)
-    ic.check_and_fix_tsv_file(path.strpath)
-    actual_tsv_data = path.read()
+    with ic.open_tsv(path.strpath) as tsv:
+        actual_tsv_data = tsv.read().decode('utf-8')
     assert tsv_data == actual_tsv_data
-    assert not backup_path.check()
+
+
+def test_open_tsv_adds_column_with_small_reads(tmpdir):
+    old_tsv_file_path = os.path.join(RESOURCES, 'old_columns_papis.tsv')
+    new_tsv_file_path = os.path.join(RESOURCES, 'new_columns_papis.tsv')
+    with open(old_tsv_file_path) as f:
+        old_tsv_data = f.read()
+    test_tsv = 'test.tsv'
+    path = tmpdir.join(test_tsv)
+    path.write(old_tsv_data)
+    chunks = []
+    with ic.open_tsv(path.strpath, chunk_size=100) as tsv:
+        chunk = tsv.read(7)
+        while chunk:
+            chunks.append(chunk)
+            chunk = tsv.read(7)
+    with open(new_tsv_file_path) as f:
+        expect_tsv_data = f.read()
+    assert expect_tsv_data == b''.join(chunks).decode('utf-8')
+
+
+def test_open_tsv_reads_past_blank_lines(tmpdir):
+    old_tsv_file_path = os.path.join(RESOURCES, 'old_columns_papis.tsv')
+    with open(old_tsv_file_path) as f:
+        old_tsv_lines = f.readlines()
+    test_tsv = 'test.tsv'
+    path = tmpdir.join(test_tsv)
+    path.write(''.join(old_tsv_lines[:1] + ['\n'] + old_tsv_lines[1:]))
+    with ic.open_tsv(path.strpath) as tsv:
+        actual_lines = list(tsv)
+    assert len(actual_lines) == len(old_tsv_lines) + 1
+    assert actual_lines[1] == b'\n'
+    assert actual_lines[-1].endswith(b'\tprovider_api\n')
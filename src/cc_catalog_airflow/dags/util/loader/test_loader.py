@@ -0,0 +1,93 @@
+from unittest.mock import patch
+
+import pytest
+
+from util.loader import loader, paths
+
+TEST_ID = 'testing'
+
+
+def _stage_files(tmpdir, file_names):
+    staging_dir = tmpdir.mkdir(paths.STAGING_SUBDIRECTORY).mkdir(TEST_ID)
+    for file_name in file_names:
+        staging_dir.join(file_name).write('')
+    return staging_dir
+
+
+def test_load_local_data_batch_upserts_once(tmpdir):
+    _stage_files(tmpdir, ['test1.tsv', 'test2.tsv'])
+    with patch.object(
+            loader.sql, 'copy_local_data_to_intermediate_table'
+    ) as mock_copy, patch.object(
+        loader.sql, 'clean_intermediate_table_data'
+    ) as mock_clean, patch.object(
+        loader.sql, 'upsert_records_to_image_table'
+    ) as mock_upsert:
+        loader.load_local_data_batch(str(tmpdir), 'conn_id', TEST_ID)
+
+    assert mock_copy.call_count == 2
+    mock_clean.assert_called_once_with('conn_id', TEST_ID)
+    mock_upsert.assert_called_once_with('conn_id', TEST_ID)
+
+
+def test_load_local_data_batch_moves_failed_file_only(tmpdir):
+    staging_dir = _stage_files(tmpdir, ['test1.tsv', 'test2.tsv'])
+    bad_file = staging_dir.join('test1.tsv').strpath
+
+    def _copy(conn_id, tsv_file_name, identifier, max_rows_to_skip):
+        if tsv_file_name == bad_file:
+            raise ValueError('bad file')
+
+    with patch.object(
+            loader.sql,
+            'copy_local_data_to_intermediate_table',
+            side_effect=_copy
+    ), patch.object(
+        loader.sql, 'clean_intermediate_table_data'
+    ), patch.object(
+        loader.sql, 'upsert_records_to_image_table'
+    ) as mock_upsert:
+        loader.load_local_data_batch(str(tmpdir), 'conn_id', TEST_ID)
+
+    failure_path = tmpdir.join(paths.FAILURE_SUBDIRECTORY, TEST_ID, 'test1.tsv')
+    assert failure_path.check(file=1)
+    assert staging_dir.join('test2.tsv').check(file=1)
+    mock_upsert.assert_called_once()
+
+
+def test_load_local_data_batch_raises_when_all_files_fail(tmpdir):
+    _stage_files(tmpdir, ['test1.tsv'])
+    with patch.object(
+            loader.sql,
+            'copy_local_data_to_intermediate_table',
+            side_effect=ValueError('bad file')
+    ), patch.object(
+        loader.sql, 'upsert_records_to_image_table'
+    ) as mock_upsert:
+        with pytest.raises(Exception):
+            loader.load_local_data_batch(str(tmpdir), 'conn_id', TEST_ID)
+
+    mock_upsert.assert_not_called()
+
+
+def test_load_s3_data_derives_key_from_staged_file(tmpdir):
+    _stage_files(tmpdir, ['test1.tsv'])
+    with patch.object(
+            loader.s3, 'get_staged_s3_object'
+    ) as mock_list, patch.object(
+        loader.sql, 'load_s3_data_to_intermediate_table'
+    ) as mock_load, patch.object(
+        loader.sql, 'upsert_records_to_image_table'
+    ):
+        loader.load_s3_data(
+            'bucket', 'aws_conn_id', 'conn_id', TEST_ID,
+            output_dir=str(tmpdir)
+        )
+
+    mock_list.assert_not_called()
+    mock_load.assert_called_once_with(
+        'conn_id',
+        'bucket',
+        f'image/db_loader_staging/{TEST_ID}/test1.tsv',
+        TEST_ID
+    )
@@ -2,6 +2,7 @@ import time
 
 import pytest
 
+from provider_api_scripts.common.storage import manifest
 from util.loader import paths
 
 TEST_ID = 'testing'
@@ -106,6 +107,67 @@ def test_stage_oldest_tsv_file_ignores_young_tsv(tmpdir):
     assert path.check(file=1)
 
 
+def test_stage_oldest_tsv_files_stages_up_to_max_files(tmpdir):
+    tmp_directory = str(tmpdir)
+    staging_subdirectory = paths.STAGING_SUBDIRECTORY
+    identifier = TEST_ID
+    test_tsvs = ['test1.tsv', 'test2.tsv', 'test3.tsv']
+    for test_tsv in test_tsvs:
+        tmpdir.join(test_tsv).write('')
+        time.sleep(0.01)
+    tsv_found = paths.stage_oldest_tsv_files(tmp_directory, identifier, 0, 2)
+    staged_paths = [
+        tmpdir.join(staging_subdirectory, identifier, t) for t in test_tsvs
+    ]
+    assert tsv_found
+    assert staged_paths[0].check(file=1)
+    assert staged_paths[1].check(file=1)
+    assert staged_paths[2].check(file=0)
+    assert tmpdir.join(test_tsvs[2]).check(file=1)
+
+
+def test_stage_oldest_tsv_files_ignores_young_tsv(tmpdir):
+    tmp_directory = str(tmpdir)
+    identifier = TEST_ID
+    test_tsv = 'test.tsv'
+    path = tmpdir.join(test_tsv)
+    path.write('')
+    tsv_found = paths.stage_oldest_tsv_files(tmp_directory, identifier, 5, 2)
+    assert not tsv_found
+    assert path.check(file=1)
+
+
+def test_get_staged_files_gets_all_staged_files(tmpdir):
+    tmp_directory = str(tmpdir)
+    staging_subdirectory = paths.STAGING_SUBDIRECTORY
+    identifier = TEST_ID
+    staging_dir = tmpdir.mkdir(staging_subdirectory).mkdir(identifier)
+    staging_dir.join('test1.tsv').write('')
+    staging_dir.join('test2.tsv').write('')
+    staged_files = paths.get_staged_files(tmp_directory, identifier)
+    assert staged_files == [
+        staging_dir.join('test1.tsv').strpath,
+        staging_dir.join('test2.tsv').strpath,
+    ]
+
+
+def test_move_staged_file_to_failure_directory_moves_one_file(tmpdir):
+    tmp_directory = str(tmpdir)
+    staging_subdirectory = paths.STAGING_SUBDIRECTORY
+    failure_subdirectory = paths.FAILURE_SUBDIRECTORY
+    identifier = TEST_ID
+    staging_dir = tmpdir.mkdir(staging_subdirectory).mkdir(identifier)
+    staging_dir.join('test1.tsv').write('')
+    staging_dir.join('test2.tsv').write('')
+    paths.move_staged_file_to_failure_directory(
+        tmp_directory, identifier, staging_dir.join('test1.tsv').strpath
+    )
+    failure_path = tmpdir.join(failure_subdirectory, identifier, 'test1.tsv')
+    assert failure_path.check(file=1)
+    assert staging_dir.join('test1.tsv').check(file=0)
+    assert staging_dir.join('test2.tsv').check(file=1)
+
+
 def test_delete_staged_file_deletes_staged_file(tmpdir):
     tmp_directory = str(tmpdir)
     staging_subdirectory = paths.STAGING_SUBDIRECTORY
@@ -325,3 +387,64 @@ def test_get_staged_file_throws_error_for_multiple_staged_files(tmpdir):
     staged_path_two.write('')
     with pytest.raises(AssertionError):
         paths.get_staged_file(tmp_directory, identifier)
+
+
+def test_get_quarantine_file_is_in_failure_directory(tmpdir):
+    tmp_directory = str(tmpdir)
+    failure_subdirectory = paths.FAILURE_SUBDIRECTORY
+    identifier = TEST_ID
+    staged_path = tmpdir.join(
+        paths.STAGING_SUBDIRECTORY, identifier, 'test.tsv'
+    )
+    actual_path = paths.get_quarantine_file(
+        tmp_directory, identifier, staged_path.strpath
+    )
+    expect_path = tmpdir.join(
+        failure_subdirectory, identifier, 'test_quarantine.tsv'
+    )
+    assert actual_path == expect_path.strpath
+
+
+def test_stage_oldest_tsv_file_stages_registered_young_tsv(tmpdir):
+    tmp_directory = str(tmpdir)
+    identifier = TEST_ID
+    test_tsv = 'test.tsv'
+    path = tmpdir.join(test_tsv)
+    path.write('')
+    manifest.register_file(path.strpath)
+    tsv_found = paths.stage_oldest_tsv_file(tmp_directory, identifier, 5)
+    staged_path = tmpdir.join(paths.STAGING_SUBDIRECTORY, identifier, test_tsv)
+
+    assert tsv_found
+    assert staged_path.check(file=1)
+
+
+def test_stage_oldest_tsv_file_prefers_registered_tsv(tmpdir):
+    tmp_directory = str(tmpdir)
+    identifier = TEST_ID
+    old_tsv = 'old.tsv'
+    registered_tsv = 'registered.tsv'
+    tmpdir.join(old_tsv).write('')
+    time.sleep(0.01)
+    registered_path = tmpdir.join(registered_tsv)
+    registered_path.write('')
+    manifest.register_file(registered_path.strpath)
+    paths.stage_oldest_tsv_file(tmp_directory, identifier, 0)
+    staging_dir = tmpdir.join(paths.STAGING_SUBDIRECTORY, identifier)
+
+    assert staging_dir.join(registered_tsv).check(file=1)
+    assert tmpdir.join(old_tsv).check(file=1)
+
+
+def test_stage_oldest_tsv_file_skips_scan_when_unregistered_disabled(tmpdir):
+    tmp_directory = str(tmpdir)
+    identifier = TEST_ID
+    test_tsv = 'test.tsv'
+    path = tmpdir.join(test_tsv)
+    path.write('')
+    tsv_found = paths.stage_oldest_tsv_file(
+        tmp_directory, identifier, 0, scan_unregistered_files=False
+    )
+
+    assert not tsv_found
+    assert path.check(file=1)
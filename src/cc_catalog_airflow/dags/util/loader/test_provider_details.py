@@ -0,0 +1,56 @@
+import pytest
+
+from util.loader import provider_details as prov
+
+
+def test_build_sub_provider_index_maps_each_value_in_a_set():
+    sub_providers = {
+        'sub_a': {'owner_1', 'owner_2'},
+        'sub_b': {'owner_3'},
+    }
+    actual_index = prov._build_sub_provider_index(sub_providers)
+    expect_index = {
+        'owner_1': 'sub_a',
+        'owner_2': 'sub_a',
+        'owner_3': 'sub_b',
+    }
+    assert actual_index == expect_index
+
+
+def test_build_sub_provider_index_maps_single_string_values():
+    sub_providers = {
+        'sub_a': 'Data Provider A',
+        'sub_b': 'Data Provider B',
+    }
+    actual_index = prov._build_sub_provider_index(sub_providers)
+    expect_index = {
+        'Data Provider A': 'sub_a',
+        'Data Provider B': 'sub_b',
+    }
+    assert actual_index == expect_index
+
+
+def test_build_sub_provider_index_raises_on_shared_value():
+    sub_providers = {
+        'sub_a': {'owner_1', 'owner_2'},
+        'sub_b': {'owner_2'},
+    }
+    with pytest.raises(ValueError):
+        prov._build_sub_provider_index(sub_providers)
+
+
+@pytest.mark.parametrize(
+    'sub_providers, sub_provider_index',
+    [
+        (prov.FLICKR_SUB_PROVIDERS, prov.FLICKR_SUB_PROVIDER_INDEX),
+        (prov.EUROPEANA_SUB_PROVIDERS, prov.EUROPEANA_SUB_PROVIDER_INDEX),
+        (prov.SMITHSONIAN_SUB_PROVIDERS, prov.SMITHSONIAN_SUB_PROVIDER_INDEX),
+    ]
+)
+def test_sub_provider_indices_agree_with_sub_provider_dicts(
+        sub_providers, sub_provider_index
+):
+    for value, sub_provider in sub_provider_index.items():
+        values = sub_providers[sub_provider]
+        assert value == values or value in values
+    assert set(sub_provider_index.values()) == set(sub_providers)
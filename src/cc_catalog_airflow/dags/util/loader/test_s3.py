@@ -1,6 +1,8 @@
+import hashlib
+import io
 import os
 import socket
-from unittest.mock import patch
+from unittest.mock import ANY, patch
 from urllib.parse import urlparse
 
 import boto3
@@ -41,11 +43,17 @@ def empty_s3_bucket(socket_enabled):
     _delete_all_objects()
 
 
-def test_copy_file_to_s3_staging_uses_connection_id():
+def _write_test_tsv(tmpdir):
+    path = tmpdir.join('data.tsv')
+    path.write('a\tb\n')
+    return path.strpath
+
+
+def test_copy_file_to_s3_staging_uses_connection_id(tmpdir):
     identifier = TEST_ID
     media_prefix = TEST_MEDIA_PREFIX
     staging_prefix = TEST_STAGING_PREFIX
-    tsv_file_path = '/test/file/path/to/data.tsv'
+    tsv_file_path = _write_test_tsv(tmpdir)
     aws_conn_id = 'test_conn_id'
     test_bucket_name = 'test-bucket'
 
@@ -56,66 +64,166 @@ def test_copy_file_to_s3_staging_uses_connection_id():
             test_bucket_name,
             aws_conn_id,
             media_prefix=media_prefix,
-            staging_prefix=staging_prefix
+            staging_prefix=staging_prefix,
+            verify_checksum=False
         )
     mock_s3.assert_called_once_with(aws_conn_id=aws_conn_id)
 
 
-def test_copy_file_to_s3_staging_uses_bucket_environ(monkeypatch):
+def test_copy_file_to_s3_staging_uses_bucket_environ(monkeypatch, tmpdir):
     identifier = TEST_ID
     media_prefix = TEST_MEDIA_PREFIX
     staging_prefix = TEST_STAGING_PREFIX
-    tsv_file_path = '/test/file/path/to/data.tsv'
+    tsv_file_path = _write_test_tsv(tmpdir)
     aws_conn_id = 'test_conn_id'
     test_bucket_name = 'test-bucket'
     monkeypatch.setenv('CCCATALOG_STORAGE_BUCKET', test_bucket_name)
 
     with patch.object(
             s3.S3Hook,
-            'load_file'
-    ) as mock_s3_load_file:
+            'get_conn'
+    ) as mock_s3_get_conn:
         s3.copy_file_to_s3_staging(
             identifier,
             tsv_file_path,
             test_bucket_name,
             aws_conn_id,
             media_prefix=media_prefix,
-            staging_prefix=staging_prefix
+            staging_prefix=staging_prefix,
+            verify_checksum=False
         )
-    mock_s3_load_file.assert_called_once_with(
-        tsv_file_path,
+    mock_s3_get_conn.return_value.upload_fileobj.assert_called_once_with(
+        ANY,
+        test_bucket_name,
         f'{media_prefix}/{staging_prefix}/{identifier}/data.tsv',
-        bucket_name=test_bucket_name
+        Config=ANY
     )
 
 
-def test_copy_file_to_s3_staging_given_bucket_name():
+def test_copy_file_to_s3_staging_given_bucket_name(tmpdir):
     identifier = TEST_ID
     media_prefix = TEST_MEDIA_PREFIX
     staging_prefix = TEST_STAGING_PREFIX
-    tsv_file_path = '/test/file/path/to/data.tsv'
+    tsv_file_path = _write_test_tsv(tmpdir)
     aws_conn_id = 'test_conn_id'
     test_bucket_name = 'test-bucket-given'
 
     with patch.object(
             s3.S3Hook,
-            'load_file'
-    ) as mock_s3_load_file:
+            'get_conn'
+    ) as mock_s3_get_conn:
         s3.copy_file_to_s3_staging(
             identifier,
             tsv_file_path,
             test_bucket_name,
             aws_conn_id,
             media_prefix=media_prefix,
-            staging_prefix=staging_prefix
+            staging_prefix=staging_prefix,
+            verify_checksum=False
         )
-    print(mock_s3_load_file.mock_calls)
-    print(mock_s3_load_file.method_calls)
-    mock_s3_load_file.assert_called_once_with(
-        tsv_file_path,
+    mock_s3_get_conn.return_value.upload_fileobj.assert_called_once_with(
+        ANY,
+        test_bucket_name,
         f'{media_prefix}/{staging_prefix}/{identifier}/data.tsv',
-        bucket_name=test_bucket_name
+        Config=ANY
+    )
+
+
+@pytest.mark.parametrize('file_size', [10, 5 * s3.MB, 12 * s3.MB + 7])
+@pytest.mark.allow_hosts([S3_HOST])
+def test_copy_file_to_s3_staging_verifies_checksum(
+        empty_s3_bucket,
+        tmpdir,
+        file_size
+):
+    identifier = TEST_ID
+    path = tmpdir.join('data.tsv')
+    path.write('x' * file_size)
+    s3.copy_file_to_s3_staging(
+        identifier,
+        path.strpath,
+        empty_s3_bucket.name,
+        AWS_CONN_ID,
+        media_prefix=TEST_MEDIA_PREFIX,
+        staging_prefix=TEST_STAGING_PREFIX,
+        multipart_threshold=5 * s3.MB,
+        multipart_chunksize=5 * s3.MB,
     )
+    key = f'{TEST_MEDIA_PREFIX}/{TEST_STAGING_PREFIX}/{identifier}/data.tsv'
+    actual_body = empty_s3_bucket.Object(key).get()['Body'].read()
+    assert actual_body == path.read_binary()
+
+
+def test_copy_file_to_s3_staging_deletes_object_with_bad_checksum(tmpdir):
+    path = tmpdir.join('data.tsv')
+    path.write('a\tb\n')
+    with patch.object(s3.S3Hook, 'get_conn') as mock_s3_get_conn:
+        mock_client = mock_s3_get_conn.return_value
+        mock_client.head_object.return_value = {'ETag': '"wrong"'}
+        with pytest.raises(Exception):
+            s3.copy_file_to_s3_staging(
+                TEST_ID,
+                path.strpath,
+                'test-bucket',
+                'test_conn_id',
+            )
+    mock_client.delete_object.assert_called_once()
+
+
+def test_copy_file_to_s3_staging_skips_verification_for_kms(tmpdir):
+    path = tmpdir.join('data.tsv')
+    path.write('a\tb\n')
+    with patch.object(s3.S3Hook, 'get_conn') as mock_s3_get_conn:
+        mock_client = mock_s3_get_conn.return_value
+        mock_client.head_object.return_value = {
+            'ETag': '"not-an-md5"',
+            'ServerSideEncryption': 'aws:kms',
+        }
+        s3.copy_file_to_s3_staging(
+            TEST_ID,
+            path.strpath,
+            'test-bucket',
+            'test_conn_id',
+        )
+    mock_client.delete_object.assert_not_called()
+
+
+def test_copy_file_to_s3_staging_clamps_chunksize(tmpdir):
+    path = tmpdir.join('data.tsv')
+    path.write('a\tb\n')
+    with patch.object(s3.S3Hook, 'get_conn') as mock_s3_get_conn:
+        mock_client = mock_s3_get_conn.return_value
+        s3.copy_file_to_s3_staging(
+            TEST_ID,
+            path.strpath,
+            'test-bucket',
+            'test_conn_id',
+            multipart_chunksize=s3.MB,
+            verify_checksum=False,
+        )
+    transfer_config = mock_client.upload_fileobj.call_args[1]['Config']
+    assert transfer_config.multipart_chunksize == s3.MIN_PART_SIZE
+
+
+def test_etag_reader_computes_single_part_etag():
+    data = b'a\tb\n' * 10
+    reader = s3.ETagReader(io.BytesIO(data), 1000, 100)
+    assert reader.read() == data
+    assert reader.etag == hashlib.md5(data).hexdigest()
+
+
+def test_etag_reader_computes_multipart_etag():
+    data = bytes(range(256)) * 10
+    reader = s3.ETagReader(io.BytesIO(data), 1000, 1000)
+    chunk = reader.read(300)
+    while chunk:
+        chunk = reader.read(300)
+    part_digests = [
+        hashlib.md5(data[i:i + 1000]).digest()
+        for i in range(0, len(data), 1000)
+    ]
+    expect_etag = hashlib.md5(b''.join(part_digests)).hexdigest() + '-3'
+    assert reader.etag == expect_etag
 
 
 @pytest.mark.allow_hosts([S3_HOST])
@@ -32,6 +32,9 @@ RESOURCES = os.path.join(
 
 DROP_LOAD_TABLE_QUERY = f'DROP TABLE IF EXISTS {TEST_LOAD_TABLE} CASCADE;'
 DROP_IMAGE_TABLE_QUERY = f'DROP TABLE IF EXISTS {TEST_IMAGE_TABLE} CASCADE;'
+DROP_UNPARTITIONED_IMAGE_TABLE_QUERY = (
+    f'DROP TABLE IF EXISTS {TEST_IMAGE_TABLE}_unpartitioned CASCADE;'
+)
 
 CREATE_LOAD_TABLE_QUERY = (
         f'CREATE TABLE public.{TEST_LOAD_TABLE} ('
@@ -162,6 +165,23 @@ def postgres_with_load_and_image_table():
     conn.close()
 
 
+@pytest.fixture
+def postgres_with_load_and_partitioned_image_table(
+        postgres_with_load_and_image_table
+):
+    pg = postgres_with_load_and_image_table
+    pg.cursor.execute(DROP_UNPARTITIONED_IMAGE_TABLE_QUERY)
+    pg.connection.commit()
+    sql.partition_image_table(
+        POSTGRES_CONN_ID, ['flickr'], image_table=TEST_IMAGE_TABLE
+    )
+
+    yield pg
+
+    pg.cursor.execute(DROP_UNPARTITIONED_IMAGE_TABLE_QUERY)
+    pg.connection.commit()
+
+
 @pytest.fixture
 def empty_s3_bucket(socket_enabled):
     bucket = boto3.resource(
@@ -239,6 +259,34 @@ def test_create_loading_table_errors_if_run_twice_with_same_id(postgres):
         sql.create_loading_table(postgres_conn_id, identifier)
 
 
+def test_create_loading_table_creates_unlogged_table(postgres):
+    postgres_conn_id = POSTGRES_CONN_ID
+    identifier = TEST_ID
+    load_table = TEST_LOAD_TABLE
+    sql.create_loading_table(postgres_conn_id, identifier)
+
+    check_query = (
+        f"SELECT relpersistence FROM pg_class WHERE relname='{load_table}';"
+    )
+    postgres.cursor.execute(check_query)
+    check_result = postgres.cursor.fetchone()[0]
+    assert check_result == 'u'
+
+
+def test_create_loading_table_does_not_create_indices(postgres):
+    postgres_conn_id = POSTGRES_CONN_ID
+    identifier = TEST_ID
+    load_table = TEST_LOAD_TABLE
+    sql.create_loading_table(postgres_conn_id, identifier)
+
+    check_query = (
+        f"SELECT COUNT(*) FROM pg_indexes WHERE tablename='{load_table}';"
+    )
+    postgres.cursor.execute(check_query)
+    check_result = postgres.cursor.fetchone()[0]
+    assert check_result == 0
+
+
 @pytest.mark.parametrize('load_function', [_load_local_tsv, _load_s3_tsv])
 @pytest.mark.allow_hosts([S3_HOST])
 def test_loaders_load_good_tsv(
@@ -254,6 +302,24 @@ def test_loaders_load_good_tsv(
     assert num_rows == 10
 
 
+@pytest.mark.parametrize('load_function', [_load_local_tsv, _load_s3_tsv])
+@pytest.mark.allow_hosts([S3_HOST])
+def test_loaders_create_indices_after_loading(
+        postgres_with_load_table,
+        tmpdir,
+        empty_s3_bucket,
+        load_function
+):
+    load_function(tmpdir, empty_s3_bucket, 'none_missing.tsv')
+    check_query = (
+        f"SELECT indexname FROM pg_indexes "
+        f"WHERE tablename='{TEST_LOAD_TABLE}';"
+    )
+    postgres_with_load_table.cursor.execute(check_query)
+    index_names = [r[0] for r in postgres_with_load_table.cursor.fetchall()]
+    assert index_names == [f'{TEST_LOAD_TABLE}_foreign_identifier_key']
+
+
 @pytest.mark.parametrize('load_function', [_load_local_tsv])
 def test_delete_less_than_max_malformed_rows(
         postgres_with_load_table,
@@ -970,6 +1036,46 @@ def test_upsert_records_merges_tags(
     assert all([t in actual_tags for t in expect_tags])
 
 
+def test_upsert_records_keeps_identical_tags(
+        postgres_with_load_and_image_table, tmpdir
+):
+    postgres_conn_id = POSTGRES_CONN_ID
+    load_table = TEST_LOAD_TABLE
+    image_table = TEST_IMAGE_TABLE
+    identifier = TEST_ID
+
+    FID = 'a'
+    PROVIDER = 'images_provider'
+    IMG_URL = 'https://images.com/a/img.jpg'
+    LICENSE = 'by'
+
+    TAGS = [
+        {'name': 'tagtwo', 'provider': 'test'},
+        {'name': 'tagone', 'provider': 'test'}
+    ]
+
+    load_data_query = (
+        f"INSERT INTO {load_table} VALUES("
+        f"'{FID}',null,'{IMG_URL}',null,null,null,null,'{LICENSE}',null,null,"
+        f"null,null,null,'{json.dumps(TAGS)}',null,'{PROVIDER}',null"
+        f");"
+    )
+    postgres_with_load_and_image_table.cursor.execute(load_data_query)
+    postgres_with_load_and_image_table.connection.commit()
+    for _ in range(2):
+        sql.upsert_records_to_image_table(
+            postgres_conn_id,
+            identifier,
+            image_table=image_table
+        )
+    postgres_with_load_and_image_table.cursor.execute(
+        f"SELECT * FROM {image_table};"
+    )
+    actual_rows = postgres_with_load_and_image_table.cursor.fetchall()
+    assert len(actual_rows) == 1
+    assert actual_rows[0][19] == TAGS
+
+
 def test_upsert_records_does_not_replace_tags_with_null(
         postgres_with_load_and_image_table, tmpdir
 ):
@@ -1303,3 +1409,76 @@ def test_update_smithsonian_sub_providers(postgres_with_load_and_image_table):
         else:
             assert actual_row[6] == 'b' and actual_row[5] == \
                 'smithsonian_national_museum_of_natural_history'
+
+
+def _insert_load_table_rows(pg, rows):
+    for fid, provider in rows:
+        pg.cursor.execute(
+            f"INSERT INTO {TEST_LOAD_TABLE} ("
+            f"foreign_identifier, foreign_landing_url, url,"
+            f" license, license_version, provider, source"
+            f") VALUES ("
+            f"'{fid}', 'https://images.com/{fid}',"
+            f" 'https://images.com/{fid}/img.jpg', 'cc0', '1.0',"
+            f" '{provider}', '{provider}'"
+            f");"
+        )
+    pg.connection.commit()
+
+
+def _get_foreign_ids(pg, table):
+    pg.cursor.execute(f"SELECT foreign_identifier FROM {table};")
+    return sorted(r[0] for r in pg.cursor.fetchall())
+
+
+def test_upsert_records_upserts_into_provider_partitions(
+        postgres_with_load_and_partitioned_image_table
+):
+    pg = postgres_with_load_and_partitioned_image_table
+    _insert_load_table_rows(pg, [('a', 'flickr'), ('b', 'other')])
+    sql.upsert_records_to_image_table(
+        POSTGRES_CONN_ID, TEST_ID, image_table=TEST_IMAGE_TABLE
+    )
+    sql.upsert_records_to_image_table(
+        POSTGRES_CONN_ID, TEST_ID, image_table=TEST_IMAGE_TABLE
+    )
+    assert _get_foreign_ids(pg, TEST_IMAGE_TABLE) == ['a', 'b']
+    assert _get_foreign_ids(pg, f'{TEST_IMAGE_TABLE}_flickr') == ['a']
+    assert _get_foreign_ids(pg, f'{TEST_IMAGE_TABLE}_default') == ['b']
+
+
+def test_partition_image_table_keeps_rows(postgres_with_load_and_image_table):
+    pg = postgres_with_load_and_image_table
+    pg.cursor.execute(DROP_UNPARTITIONED_IMAGE_TABLE_QUERY)
+    pg.connection.commit()
+    _insert_load_table_rows(pg, [('a', 'flickr'), ('b', 'other')])
+    sql.upsert_records_to_image_table(
+        POSTGRES_CONN_ID, TEST_ID, image_table=TEST_IMAGE_TABLE
+    )
+    sql.partition_image_table(
+        POSTGRES_CONN_ID, ['flickr', 'other'], image_table=TEST_IMAGE_TABLE
+    )
+    assert _get_foreign_ids(pg, f'{TEST_IMAGE_TABLE}_flickr') == ['a']
+    assert _get_foreign_ids(pg, f'{TEST_IMAGE_TABLE}_other') == ['b']
+    assert _get_foreign_ids(pg, f'{TEST_IMAGE_TABLE}_default') == []
+    pg.cursor.execute(DROP_UNPARTITIONED_IMAGE_TABLE_QUERY)
+    pg.connection.commit()
+
+
+def test_add_image_partition_moves_rows_from_default_partition(
+        postgres_with_load_and_partitioned_image_table
+):
+    pg = postgres_with_load_and_partitioned_image_table
+    _insert_load_table_rows(pg, [('a', 'other'), ('b', 'another')])
+    sql.upsert_records_to_image_table(
+        POSTGRES_CONN_ID, TEST_ID, image_table=TEST_IMAGE_TABLE
+    )
+    sql.add_image_partition(
+        POSTGRES_CONN_ID, 'other', image_table=TEST_IMAGE_TABLE
+    )
+    assert _get_foreign_ids(pg, f'{TEST_IMAGE_TABLE}_other') == ['a']
+    assert _get_foreign_ids(pg, f'{TEST_IMAGE_TABLE}_default') == ['b']
+    sql.upsert_records_to_image_table(
+        POSTGRES_CONN_ID, TEST_ID, image_table=TEST_IMAGE_TABLE
+    )
+    assert _get_foreign_ids(pg, TEST_IMAGE_TABLE) == ['a', 'b']
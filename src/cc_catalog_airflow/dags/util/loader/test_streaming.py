@@ -0,0 +1,45 @@
+import bz2
+import gzip
+import io
+
+from util.loader import streaming
+
+TSV_DATA = b'a\tb\tc\nd\te\tf\n'
+
+
+def test_open_decompressed_leaves_uncompressed_stream_unchanged():
+    file_obj = io.BytesIO(TSV_DATA)
+    stream = streaming.open_decompressed(file_obj, 'path/to/test.tsv')
+    assert stream is file_obj
+
+
+def test_open_decompressed_decompresses_gzip():
+    file_obj = io.BytesIO(gzip.compress(TSV_DATA))
+    stream = streaming.open_decompressed(file_obj, 'path/to/test.tsv.gz')
+    assert stream.read() == TSV_DATA
+
+
+def test_open_decompressed_decompresses_bz2():
+    file_obj = io.BytesIO(bz2.compress(TSV_DATA))
+    stream = streaming.open_decompressed(file_obj, 'path/to/test.tsv.bz2')
+    assert stream.read() == TSV_DATA
+
+
+def test_progress_reader_passes_data_through_and_counts_bytes():
+    reader = streaming.ProgressReader(io.BytesIO(TSV_DATA), 'test')
+    chunks = []
+    chunk = reader.read(4)
+    while chunk:
+        chunks.append(chunk)
+        chunk = reader.read(4)
+    assert b''.join(chunks) == TSV_DATA
+    assert reader.bytes_read == len(TSV_DATA)
+
+
+def test_progress_reader_logs_progress(caplog):
+    reader = streaming.ProgressReader(
+        io.BytesIO(TSV_DATA), 'test', log_interval=0
+    )
+    with caplog.at_level('INFO'):
+        reader.read()
+    assert f'Read {len(TSV_DATA)} bytes from test' in caplog.text
@@ -0,0 +1,113 @@
+import os
+
+from util.loader import validator
+
+RESOURCES = os.path.join(
+    os.path.abspath(os.path.dirname(__file__)), 'test_resources'
+)
+
+
+def _copy_resource_to_tmpdir(tmpdir, tsv_file_name):
+    with open(os.path.join(RESOURCES, tsv_file_name)) as f:
+        tsv_data = f.read()
+    path = tmpdir.join('test.tsv')
+    path.write(tsv_data)
+    return path, tsv_data
+
+
+def test_quarantine_malformed_rows_leaves_good_tsv_unchanged(tmpdir):
+    path, tsv_data = _copy_resource_to_tmpdir(tmpdir, 'none_missing.tsv')
+    quarantine_path = tmpdir.join('failures', 'test_quarantine.tsv')
+    rejected_rows = validator.quarantine_malformed_rows(
+        path.strpath, quarantine_path.strpath
+    )
+    assert rejected_rows == 0
+    assert path.read() == tsv_data
+    assert not quarantine_path.check()
+    assert not tmpdir.join('test.tsv.valid').check()
+
+
+def test_quarantine_malformed_rows_removes_malformed_rows(tmpdir):
+    path, tsv_data = _copy_resource_to_tmpdir(
+        tmpdir, 'malformed_less_than_max_rows.tsv'
+    )
+    quarantine_path = tmpdir.join('failures', 'test_quarantine.tsv')
+    rejected_rows = validator.quarantine_malformed_rows(
+        path.strpath, quarantine_path.strpath
+    )
+    tsv_lines = tsv_data.splitlines(keepends=True)
+    expect_valid = ''.join(tsv_lines[3:8] + tsv_lines[9:])
+    expect_quarantined = ''.join(tsv_lines[:3] + tsv_lines[8:9])
+    assert rejected_rows == 4
+    assert path.read() == expect_valid
+    assert quarantine_path.read() == expect_quarantined
+
+
+def test_quarantine_malformed_rows_accepts_missing_ingestion_type(tmpdir):
+    path, tsv_data = _copy_resource_to_tmpdir(
+        tmpdir, 'old_columns_papis.tsv'
+    )
+    quarantine_path = tmpdir.join('failures', 'test_quarantine.tsv')
+    rejected_rows = validator.quarantine_malformed_rows(
+        path.strpath, quarantine_path.strpath
+    )
+    assert rejected_rows == 0
+    assert path.read() == tsv_data
+
+
+def test_quarantine_malformed_rows_rejects_wrong_number_of_columns(tmpdir):
+    path, tsv_data = _copy_resource_to_tmpdir(tmpdir, 'none_missing.tsv')
+    tsv_lines = tsv_data.splitlines(keepends=True)
+    path.write(''.join(tsv_lines[:1] + ['a\tb\n', '\n'] + tsv_lines[1:]))
+    quarantine_path = tmpdir.join('failures', 'test_quarantine.tsv')
+    rejected_rows = validator.quarantine_malformed_rows(
+        path.strpath, quarantine_path.strpath
+    )
+    assert rejected_rows == 2
+    assert path.read() == tsv_data
+    assert quarantine_path.read() == 'a\tb\n\n'
+
+
+def test_line_is_valid_rejects_non_integer_width():
+    checks = [validator._get_column_check('integer')]
+    assert validator._line_is_valid(b'100\n', checks)
+    assert validator._line_is_valid(b'\\N\n', checks)
+    assert not validator._line_is_valid(b'1.5\n', checks)
+    assert not validator._line_is_valid(b'4294967296\n', checks)
+
+
+def test_line_is_valid_matches_postgres_integer_syntax():
+    checks = [validator._get_column_check('integer')]
+    assert validator._line_is_valid(b' -42 \n', checks)
+    assert validator._line_is_valid(b'+7\n', checks)
+    assert not validator._line_is_valid(b'1_000\n', checks)
+    assert not validator._line_is_valid('\u0661\n'.encode('utf-8'), checks)
+
+
+def test_line_is_valid_rejects_long_strings():
+    checks = [validator._get_column_check('character varying(3)')]
+    assert validator._line_is_valid(b'abc\n', checks)
+    assert validator._line_is_valid(b'a\\tc\n', checks)
+    assert not validator._line_is_valid(b'abcd\n', checks)
+
+
+def test_line_is_valid_checks_booleans():
+    checks = [validator._get_column_check('boolean')]
+    assert validator._line_is_valid(b'f\n', checks)
+    assert validator._line_is_valid(b'true\n', checks)
+    assert not validator._line_is_valid(b'maybe\n', checks)
+
+
+def test_line_is_valid_rejects_nul_in_jsonb():
+    checks = [validator._get_column_check('jsonb')]
+    assert validator._line_is_valid(b'{"a": "b"}\n', checks)
+    assert not validator._line_is_valid(b'{"a": "\\\\u0000"}\n', checks)
+    assert not validator._line_is_valid(b'{"a": \n', checks)
+
+
+def test_line_is_valid_rejects_non_finite_numbers_in_jsonb():
+    checks = [validator._get_column_check('jsonb')]
+    assert validator._line_is_valid(b'{"a": 1.5}\n', checks)
+    assert not validator._line_is_valid(b'{"a": NaN}\n', checks)
+    assert not validator._line_is_valid(b'{"a": Infinity}\n', checks)
+    assert not validator._line_is_valid(b'[-Infinity]\n', checks)
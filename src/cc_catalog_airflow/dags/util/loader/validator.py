@@ -0,0 +1,197 @@
+"""
+This module checks a TSV file against the loading table schema before
+it is loaded into PostgreSQL, so that COPY does not fail partway through
+a large file because of a handful of malformed rows.
+
+The file is streamed once.  Rows which PostgreSQL would reject (wrong
+number of columns, values that do not parse as the column type, strings
+longer than the column allows) are written to a quarantine file, and the
+TSV is only rewritten if at least one row is rejected.  Rows are read
+through `ingestion_column.open_tsv`, so a rewritten file always has the
+ingestion_type column.
+"""
+import json
+import logging
+import os
+import re
+
+from util.loader import ingestion_column, sql
+
+logger = logging.getLogger(__name__)
+
+NULL = '\\N'
+INTEGER_MIN = -2 ** 31
+INTEGER_MAX = 2 ** 31 - 1
+BOOLEAN_VALUES = {
+    't', 'true', 'y', 'yes', 'on', '1',
+    'f', 'false', 'n', 'no', 'off', '0',
+}
+
+_COPY_ESCAPES = {
+    'b': '\b',
+    'f': '\f',
+    'n': '\n',
+    'r': '\r',
+    't': '\t',
+    'v': '\v',
+}
+_COPY_ESCAPE_PATTERN = re.compile(r'\\(x[0-9a-fA-F]{1,2}|[0-7]{1,3}|.)')
+_VARCHAR_PATTERN = re.compile(r'character varying\((\d+)\)')
+_INTEGER_PATTERN = re.compile(r'[+-]?[0-9]+')
+
+
+def quarantine_malformed_rows(
+        tsv_file_name,
+        quarantine_file_name,
+        columns=sql.LOAD_TABLE_COLUMNS,
+):
+    """
+    Remove rows that would not load into the loading table from
+    `tsv_file_name`, and append them to `quarantine_file_name`.
+
+    Returns the number of rows that were removed.
+    """
+    logger.info(f'Validating {tsv_file_name}')
+    checks = [_get_column_check(c.definition) for c in columns]
+    temp_tsv = tsv_file_name + '.valid'
+    rejected_rows = 0
+    offset = 0
+    valid_tsv = None
+    quarantine_tsv = None
+
+    with ingestion_column.open_tsv(tsv_file_name) as tsv:
+        for line_number, line in enumerate(tsv, start=1):
+            if _line_is_valid(line, checks):
+                if valid_tsv is not None:
+                    valid_tsv.write(line)
+            else:
+                logger.warning(
+                    f'Quarantining malformed row {line_number} '
+                    f'of {tsv_file_name}'
+                )
+                if valid_tsv is None:
+                    valid_tsv = _start_valid_copy(
+                        tsv_file_name, temp_tsv, offset
+                    )
+                    quarantine_tsv = _open_quarantine_file(
+                        quarantine_file_name
+                    )
+                quarantine_tsv.write(line)
+                rejected_rows += 1
+            offset += len(line)
+
+    if valid_tsv is not None:
+        valid_tsv.close()
+        quarantine_tsv.close()
+        os.rename(temp_tsv, tsv_file_name)
+        logger.info(
+            f'Moved {rejected_rows} malformed rows to {quarantine_file_name}'
+        )
+
+    return rejected_rows
+
+
+def _start_valid_copy(tsv_file_name, temp_tsv, offset):
+    """
+    Copy everything before the first malformed row into `temp_tsv`, and
+    return the open file so that later valid rows can be appended.
+    """
+    valid_tsv = open(temp_tsv, 'wb')
+    with ingestion_column.open_tsv(tsv_file_name) as tsv:
+        _copy_bytes(tsv, valid_tsv, offset)
+    return valid_tsv
+
+
+def _copy_bytes(source, destination, length, chunk_size=16 * 1024 * 1024):
+    while length > 0:
+        chunk = source.read(min(chunk_size, length))
+        if not chunk:
+            break
+        destination.write(chunk)
+        length -= len(chunk)
+
+
+def _open_quarantine_file(quarantine_file_name):
+    os.makedirs(os.path.dirname(quarantine_file_name), exist_ok=True)
+    return open(quarantine_file_name, 'ab')
+
+
+def _line_is_valid(line, checks):
+    try:
+        text = line.decode('utf-8')
+    except UnicodeDecodeError:
+        return False
+
+    values = text.rstrip('\n').rstrip('\r').split('\t')
+    if len(values) != len(checks):
+        return False
+
+    for value, check in zip(values, checks):
+        if value == NULL:
+            continue
+        try:
+            valid = check(_unescape_copy_value(value))
+        except ValueError:
+            valid = False
+        if not valid:
+            return False
+
+    return True
+
+
+def _get_column_check(definition):
+    varchar_match = _VARCHAR_PATTERN.fullmatch(definition)
+    if varchar_match:
+        max_length = int(varchar_match.group(1))
+        return lambda v: len(v) <= max_length and '\x00' not in v
+    elif definition == 'integer':
+        return _is_integer
+    elif definition == 'jsonb':
+        return _is_jsonb
+    elif definition == 'boolean':
+        return lambda v: v.strip().lower() in BOOLEAN_VALUES
+    else:
+        return lambda v: '\x00' not in v
+
+
+def _is_integer(value):
+    # int() also accepts underscores and non-ASCII digits, which
+    # PostgreSQL does not.
+    value = value.strip()
+    if not _INTEGER_PATTERN.fullmatch(value):
+        return False
+    return INTEGER_MIN <= int(value) <= INTEGER_MAX
+
+
+def _is_jsonb(value):
+    # PostgreSQL jsonb cannot hold NUL characters, even when escaped.
+    if '\x00' in value or '\\u0000' in value:
+        return False
+    json.loads(value, parse_constant=_reject_json_constant)
+    return True
+
+
+def _reject_json_constant(constant):
+    # PostgreSQL jsonb has no NaN or Infinity.
+    raise ValueError(f'Invalid JSON constant {constant}')
+
+
+def _unescape_copy_value(value):
+    """
+    Undo the backslash escaping used by the COPY text format.
+    """
+    if '\\' not in value:
+        return value
+    return _COPY_ESCAPE_PATTERN.sub(_replace_copy_escape, value)
+
+
+def _replace_copy_escape(match):
+    escaped = match.group(1)
+    if escaped in _COPY_ESCAPES:
+        return _COPY_ESCAPES[escaped]
+    elif escaped[0] == 'x' and len(escaped) > 1:
+        return chr(int(escaped[1:], 16))
+    elif escaped[0] in '01234567':
+        return chr(int(escaped, 8) & 0xFF)
+    else:
+        return escaped
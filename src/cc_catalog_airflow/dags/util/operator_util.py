@@ -30,10 +30,12 @@ def get_dated_main_runner_operator(
     )
 
 
-def get_main_runner_operator(dag, main_function):
+def get_main_runner_operator(dag, main_function, keyed_by_run=False):
+    op_kwargs = {'run_key': '{{ ts_nodash }}'} if keyed_by_run else None
     return PythonOperator(
         task_id='pull_image_data',
         python_callable=main_function,
+        op_kwargs=op_kwargs,
         depends_on_past=False,
         dag=dag
     )
@@ -1,10 +1,13 @@
 import logging
 from airflow.operators.python_operator import PythonOperator
+from airflow.utils.trigger_rule import TriggerRule
 
 from util.popularity import sql
 
 logger = logging.getLogger(__name__)
 
+TIMESTAMP_TEMPLATE = "{{ ts_nodash }}"
+
 
 def drop_image_popularity_relations(dag, postgres_conn_id):
     return PythonOperator(
@@ -42,28 +45,28 @@ def update_image_popularity_metrics(dag, postgres_conn_id):
     )
 
 
-def create_image_popularity_percentile(dag, postgres_conn_id):
+def update_image_popularity_metric_indices(dag, postgres_conn_id):
     return PythonOperator(
-        task_id="create_image_popularity_percentile",
-        python_callable=sql.create_image_popularity_percentile_function,
+        task_id="update_image_popularity_metric_indices",
+        python_callable=sql.update_image_popularity_metric_indices,
         op_args=[postgres_conn_id],
         dag=dag,
     )
 
 
-def create_image_popularity_constants(dag, postgres_conn_id):
+def create_image_popularity_percentile(dag, postgres_conn_id):
     return PythonOperator(
-        task_id="create_image_popularity_constants_view",
-        python_callable=sql.create_image_popularity_constants_view,
+        task_id="create_image_popularity_percentile",
+        python_callable=sql.create_image_popularity_percentile_function,
         op_args=[postgres_conn_id],
         dag=dag,
     )
 
 
-def update_image_popularity_constants(dag, postgres_conn_id):
+def create_image_popularity_constants(dag, postgres_conn_id):
     return PythonOperator(
-        task_id="update_image_popularity_constants_view",
-        python_callable=sql.update_image_popularity_constants,
+        task_id="create_image_popularity_constants_view",
+        python_callable=sql.create_image_popularity_constants_view,
         op_args=[postgres_conn_id],
         dag=dag,
     )
@@ -87,10 +90,66 @@ def create_image_view(dag, postgres_conn_id):
     )
 
 
-def update_image_view(dag, postgres_conn_id):
+def update_image_view(dag, postgres_conn_id, incremental=False):
     return PythonOperator(
         task_id="update_image_view",
         python_callable=sql.update_image_view,
         op_args=[postgres_conn_id],
+        op_kwargs={"incremental": incremental},
+        dag=dag,
+    )
+
+
+def create_staging_popularity_relations(dag, postgres_conn_id):
+    return PythonOperator(
+        task_id="create_staging_popularity_relations",
+        python_callable=sql.create_staging_popularity_relations,
+        op_args=[postgres_conn_id, TIMESTAMP_TEMPLATE],
+        dag=dag,
+    )
+
+
+def insert_staging_popularity_constants(dag, postgres_conn_id, provider):
+    return PythonOperator(
+        task_id=f"update_constants_{provider}",
+        python_callable=sql.insert_staging_popularity_constants,
+        op_args=[postgres_conn_id, provider, TIMESTAMP_TEMPLATE],
+        dag=dag,
+    )
+
+
+def insert_staging_image_view_rows(
+    dag, postgres_conn_id, provider=None, excluded_providers=()
+):
+    if provider is not None:
+        task_id = f"update_image_view_{provider}"
+        op_kwargs = {"provider": provider}
+    else:
+        task_id = "update_image_view_other_providers"
+        op_kwargs = {"excluded_providers": list(excluded_providers)}
+    return PythonOperator(
+        task_id=task_id,
+        python_callable=sql.insert_staging_image_view_rows,
+        op_args=[postgres_conn_id, TIMESTAMP_TEMPLATE],
+        op_kwargs=op_kwargs,
+        dag=dag,
+    )
+
+
+def swap_staging_popularity_relations(dag, postgres_conn_id):
+    return PythonOperator(
+        task_id="swap_staging_popularity_relations",
+        python_callable=sql.swap_staging_popularity_relations,
+        op_args=[postgres_conn_id, TIMESTAMP_TEMPLATE],
+        dag=dag,
+    )
+
+
+def drop_staging_popularity_relations(dag, postgres_conn_id):
+    return PythonOperator(
+        task_id="drop_staging_popularity_relations",
+        python_callable=sql.drop_staging_popularity_relations,
+        op_args=[postgres_conn_id, TIMESTAMP_TEMPLATE],
+        trigger_rule=TriggerRule.ALL_DONE,
         dag=dag,
     )
@@ -1,9 +1,16 @@
 from collections import namedtuple
+import logging
 from textwrap import dedent
-from airflow.hooks.postgres_hook import PostgresHook
 
 from util.loader import column_names as col
-from util.loader.sql import IMAGE_TABLE_NAME
+from util.loader.sql import (
+    IMAGE_TABLE_NAME,
+    get_image_partitions,
+    get_image_table_for_provider,
+)
+from util.postgres_session import get_postgres_session, with_postgres_session
+
+logger = logging.getLogger(__name__)
 
 DEFAULT_PERCENTILE = 0.85
 
@@ -15,11 +22,22 @@ STANDARDIZED_POPULARITY_FUNCTION_NAME = "standardized_popularity"
 POPULARITY_CONSTANTS_IDX = "image_popularity_constants_provider_metric_idx"
 IMAGE_VIEW_ID_IDX = "image_view_identifier_idx"
 IMAGE_VIEW_PROVIDER_FID_IDX = "image_view_provider_fid_idx"
+IMAGE_VIEW_UPDATED_ON_IDX = "image_view_updated_on_idx"
+POPULARITY_METRIC_IDX_SUFFIX = "popularity_idx"
+
+# Rows updated this long before the newest row in the image view are
+# recomputed by an incremental update, to catch rows from upserts which
+# were still running during the previous update.
+INCREMENTAL_UPDATE_OVERLAP = "1 day"
+# Computing the popularity constants sorts a provider's metric values,
+# if the planner does not read them from the provider's metric index.
+POPULARITY_CONSTANTS_SESSION_SETTINGS = {"work_mem": "256MB"}
 
 # Column name constants
 CONSTANT = "constant"
 FID = col.FOREIGN_ID
 IDENTIFIER = "identifier"
+UPDATED_ON = col.UPDATED_ON
 METADATA_COLUMN = col.META_DATA
 METRIC = "metric"
 PARTITION = col.PROVIDER
@@ -43,31 +61,54 @@ POPULARITY_METRICS = {
 }
 
 
+@with_postgres_session
 def drop_image_popularity_relations(
     postgres_conn_id,
     image_view=IMAGE_VIEW_NAME,
     constants=POPULARITY_CONSTANTS_VIEW_NAME,
     metrics=POPULARITY_METRICS_TABLE_NAME,
 ):
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
-    drop_image_view = (
-        f"DROP MATERIALIZED VIEW IF EXISTS public.{image_view} CASCADE;"
-    )
-    drop_popularity_constants = (
-        f"DROP MATERIALIZED VIEW IF EXISTS public.{constants} CASCADE;"
-    )
+    postgres = get_postgres_session(postgres_conn_id)
+    drop_image_view = _get_drop_relation_query(image_view)
+    drop_popularity_constants = _get_drop_relation_query(constants)
     drop_popularity_metrics = f"DROP TABLE IF EXISTS public.{metrics} CASCADE;"
     postgres.run(drop_image_view)
     postgres.run(drop_popularity_constants)
     postgres.run(drop_popularity_metrics)
 
 
+def _get_drop_relation_query(relation, cascade=True):
+    """
+    Return a query dropping `relation`, whether it is a table or a
+    materialized view.  The image view and popularity constants used to
+    be materialized views, and are tables once they have been swapped in
+    by `swap_staging_popularity_relations`.  Without `cascade`, the query
+    fails if any other object depends on `relation`.
+    """
+    drop_behavior = "CASCADE" if cascade else "RESTRICT"
+    return dedent(
+        f"""
+        DO $$
+        BEGIN
+          IF EXISTS (
+            SELECT 1 FROM pg_matviews
+            WHERE schemaname='public' AND matviewname='{relation}'
+          ) THEN
+            DROP MATERIALIZED VIEW public.{relation} {drop_behavior};
+          END IF;
+        END $$;
+        DROP TABLE IF EXISTS public.{relation} {drop_behavior};
+        """
+    )
+
+
+@with_postgres_session
 def drop_image_popularity_functions(
     postgres_conn_id,
     standardized_popularity=STANDARDIZED_POPULARITY_FUNCTION_NAME,
     popularity_percentile=POPULARITY_PERCENTILE_FUNCTION_NAME,
 ):
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
+    postgres = get_postgres_session(postgres_conn_id)
     drop_standardized_popularity = (
         f"DROP FUNCTION IF EXISTS public.{standardized_popularity} CASCADE;"
     )
@@ -78,10 +119,11 @@ def drop_image_popularity_functions(
     postgres.run(drop_popularity_percentile)
 
 
+@with_postgres_session
 def create_image_popularity_metrics(
     postgres_conn_id, popularity_metrics_table=POPULARITY_METRICS_TABLE_NAME,
 ):
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
+    postgres = get_postgres_session(postgres_conn_id)
     popularity_metrics_columns_string = ",\n          ".join(
         f"{c.name} {c.definition}" for c in POPULARITY_METRICS_TABLE_COLUMNS
     )
@@ -95,12 +137,13 @@ def create_image_popularity_metrics(
     postgres.run(query)
 
 
+@with_postgres_session
 def update_image_popularity_metrics(
     postgres_conn_id,
     popularity_metrics=POPULARITY_METRICS,
     popularity_metrics_table=POPULARITY_METRICS_TABLE_NAME,
 ):
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
+    postgres = get_postgres_session(postgres_conn_id)
     column_names = [c.name for c in POPULARITY_METRICS_TABLE_COLUMNS]
     updates_string = ",\n          ".join(
         f"{c}=EXCLUDED.{c}" for c in column_names if c != PARTITION
@@ -108,7 +151,6 @@ def update_image_popularity_metrics(
     popularity_metric_inserts = _get_popularity_metric_insert_values_string(
         popularity_metrics
     )
-
     query = dedent(
         f"""
         INSERT INTO public.{popularity_metrics_table} (
@@ -143,23 +185,160 @@ def _format_popularity_metric_insert_tuple_string(
     return f"('{provider}', '{metric}', {percentile})"
 
 
+@with_postgres_session
+def update_image_popularity_metric_indices(
+    postgres_conn_id,
+    popularity_metrics=POPULARITY_METRICS,
+    image_table=IMAGE_TABLE_NAME,
+):
+    """
+    Make sure there is exactly one partial expression index on the image
+    table for each provider's metric in `popularity_metrics`, so that
+    percentiles of the metric can be read by walking an index.
+
+    Indices for metrics which were removed are dropped, and indices left
+    invalid by a failed build are rebuilt.  Indices are built and
+    dropped concurrently, so the image table stays writable.  If the
+    image table is partitioned, each index is built on the provider's
+    partition, since partitioned tables can not be indexed concurrently.
+    """
+    postgres = get_postgres_session(postgres_conn_id)
+    expected_indices = {
+        _get_popularity_metric_index_name(
+            image_table, provider, provider_info["metric"]
+        ): _get_popularity_metric_index_query(
+            image_table,
+            provider,
+            provider_info["metric"],
+            index_table=get_image_table_for_provider(
+                postgres, provider, image_table
+            ),
+        )
+        for provider, provider_info in popularity_metrics.items()
+    }
+    image_tables = [image_table] + sorted(
+        get_image_partitions(postgres, image_table)
+    )
+    existing_indices = dict(
+        postgres.get_records(
+            dedent(
+                """
+                SELECT index_class.relname, pg_index.indisvalid
+                FROM pg_index
+                JOIN pg_class index_class
+                  ON index_class.oid=pg_index.indexrelid
+                JOIN pg_class table_class
+                  ON table_class.oid=pg_index.indrelid
+                WHERE table_class.relname=ANY(%s);
+                """
+            ),
+            parameters=(image_tables,),
+        )
+    )
+    popularity_indices = {
+        name: is_valid for name, is_valid in existing_indices.items()
+        if name.startswith(f"{image_table}_")
+        and name.endswith(f"_{POPULARITY_METRIC_IDX_SUFFIX}")
+    }
+    drop_queries = [
+        f"DROP INDEX CONCURRENTLY IF EXISTS public.{name};"
+        for name, is_valid in popularity_indices.items()
+        if name not in expected_indices or not is_valid
+    ]
+    create_queries = [
+        query for name, query in expected_indices.items()
+        if not popularity_indices.get(name)
+    ]
+    for query in drop_queries + create_queries:
+        logger.info(f"Running:  {query}")
+    # CONCURRENTLY can not be used inside a transaction block.
+    if drop_queries or create_queries:
+        postgres.run(drop_queries + create_queries, autocommit=True)
+
+
+def _get_popularity_metric_index_name(image_table, provider, metric):
+    return f"{image_table}_{provider}_{metric}_{POPULARITY_METRIC_IDX_SUFFIX}"
+
+
+def _get_popularity_metric_index_query(
+    image_table, provider, metric, index_table=None
+):
+    index_name = _get_popularity_metric_index_name(
+        image_table, provider, metric
+    )
+    index_table = index_table or image_table
+    return dedent(
+        f"""
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS {index_name}
+          ON public.{index_table} ((({METADATA_COLUMN}->>'{metric}')::float))
+          WHERE {PARTITION}='{provider}';
+        """
+    )
+
+
+@with_postgres_session
 def create_image_popularity_percentile_function(
     postgres_conn_id,
     popularity_percentile=POPULARITY_PERCENTILE_FUNCTION_NAME,
     image_table=IMAGE_TABLE_NAME,
 ):
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
+    """
+    Create a function giving the same result as `percentile_disc` of a
+    provider's metric.  Rather than sorting the metric values, it counts
+    them and reads the value at the percentile's rank in order.  Both
+    queries are built with the provider and metric as literals, so they
+    can use the partial index from `update_image_popularity_metric_indices`.
+    If the image table is partitioned, they read the provider's partition
+    directly.  All popularity constants are computed with it.
+    """
+    postgres = get_postgres_session(postgres_conn_id)
     query = dedent(
         f"""
         CREATE OR REPLACE FUNCTION public.{popularity_percentile}(
             provider text, pop_field text, percentile float
         ) RETURNS FLOAT AS $$
-          SELECT percentile_disc($3) WITHIN GROUP (
-            ORDER BY ({METADATA_COLUMN}->>$2)::float
-          )
-          FROM {image_table} WHERE {PARTITION}=$1;
+          DECLARE
+            metric_value text := format(
+              '(%I->>%L)::float', '{METADATA_COLUMN}', pop_field
+            );
+            metric_filter text := format(
+              '%I=%L AND %s IS NOT NULL', '{PARTITION}', provider, metric_value
+            );
+            source_table text := coalesce(
+              (
+                SELECT child.relname::text
+                FROM pg_inherits
+                JOIN pg_class parent ON parent.oid=pg_inherits.inhparent
+                JOIN pg_class child ON child.oid=pg_inherits.inhrelid
+                WHERE
+                  parent.relname='{image_table}'
+                  AND child.relname='{image_table}_'
+                    || regexp_replace(lower(provider), '\\W', '_', 'g')
+              ),
+              '{image_table}'
+            );
+            value_count bigint;
+            result float;
+          BEGIN
+            EXECUTE format(
+              'SELECT count(*) FROM %I WHERE %s', source_table, metric_filter
+            ) INTO value_count;
+            IF value_count = 0 THEN
+              RETURN NULL;
+            END IF;
+            EXECUTE format(
+              'SELECT %s FROM %I WHERE %s'
+              ' ORDER BY %s OFFSET %s LIMIT 1',
+              metric_value,
+              source_table,
+              metric_filter,
+              metric_value,
+              (greatest(ceil(percentile * value_count), 1) - 1)::bigint
+            ) INTO result;
+            RETURN result;
+          END;
         $$
-        LANGUAGE SQL
+        LANGUAGE plpgsql
         STABLE
         RETURNS NULL ON NULL INPUT;
         """
@@ -167,6 +346,7 @@ def create_image_popularity_percentile_function(
     postgres.run(query)
 
 
+@with_postgres_session(settings=POPULARITY_CONSTANTS_SESSION_SETTINGS)
 def create_image_popularity_constants_view(
     postgres_conn_id,
     popularity_constants=POPULARITY_CONSTANTS_VIEW_NAME,
@@ -174,59 +354,87 @@ def create_image_popularity_constants_view(
     popularity_metrics=POPULARITY_METRICS_TABLE_NAME,
     popularity_percentile=POPULARITY_PERCENTILE_FUNCTION_NAME,
 ):
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
-    create_view_query = dedent(
+    """
+    Create the view of popularity constants.  The percentiles are read
+    from the providers' metric indices by the `popularity_percentile`
+    function, as in `insert_staging_popularity_constants`, so both give
+    the same constants for the same data.
+    """
+    postgres = get_postgres_session(postgres_conn_id)
+    constants_query = _get_popularity_constants_query(
+        popularity_metrics, popularity_percentile
+    )
+    postgres.run(
+        f"CREATE MATERIALIZED VIEW public.{popularity_constants}"
+        f" AS {constants_query};"
+    )
+    postgres.run(
+        _get_popularity_constants_index_query(
+            popularity_constants, popularity_constants_idx
+        )
+    )
+
+
+def _get_popularity_constants_query(
+    popularity_metrics, popularity_percentile, provider=None,
+):
+    """
+    Return a query giving a row of popularity constants for each
+    provider in the `popularity_metrics` table, or only for `provider`,
+    if given.  The exact percentile of each provider's metric is read by
+    the `popularity_percentile` function.
+    """
+    provider_filter = (
+        f"WHERE {PARTITION}='{provider}'" if provider is not None else ""
+    )
+    return dedent(
         f"""
-        CREATE MATERIALIZED VIEW public.{popularity_constants} AS
-          WITH
-            popularity_metric_raw_values AS (
-              SELECT
-                *,
-                {popularity_percentile}({PARTITION}, {METRIC}, {PERCENTILE})
-                  AS raw_value
-              FROM {popularity_metrics}
-            ),
-            popularity_metric_values AS(
-              SELECT
-                *,
-                CASE
-                  WHEN raw_value=0 THEN
-                    1
-                  ELSE
-                    raw_value
-                END AS value
-              FROM popularity_metric_raw_values
-            )
-          SELECT *, ((1 - {PERCENTILE}) / {PERCENTILE}) * value AS {CONSTANT}
-          FROM popularity_metric_values;
+        WITH
+          popularity_metric_raw_values AS (
+            SELECT
+              {PARTITION}, {METRIC}, {PERCENTILE},
+              public.{popularity_percentile}(
+                {PARTITION}, {METRIC}, {PERCENTILE}
+              ) AS raw_value
+            FROM {popularity_metrics}
+            {provider_filter}
+          ),
+          popularity_metric_values AS(
+            SELECT
+              *,
+              CASE
+                WHEN raw_value=0 THEN
+                  1
+                ELSE
+                  raw_value
+              END AS value
+            FROM popularity_metric_raw_values
+          )
+        SELECT *, ((1 - {PERCENTILE}) / {PERCENTILE}) * value AS {CONSTANT}
+        FROM popularity_metric_values
         """
-    )
-    add_idx_query = dedent(
+    ).strip()
+
+
+def _get_popularity_constants_index_query(
+    popularity_constants, popularity_constants_idx
+):
+    return dedent(
         f"""
         CREATE UNIQUE INDEX {popularity_constants_idx}
           ON public.{popularity_constants}
           USING btree({PARTITION}, {METRIC});
         """
     )
-    postgres.run(create_view_query)
-    postgres.run(add_idx_query)
-
-
-def update_image_popularity_constants(
-    postgres_conn_id, popularity_constants_view=POPULARITY_CONSTANTS_VIEW_NAME,
-):
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
-    postgres.run(
-        f"REFRESH MATERIALIZED VIEW CONCURRENTLY {popularity_constants_view};"
-    )
 
 
+@with_postgres_session
 def create_standardized_popularity_function(
     postgres_conn_id,
     function_name=STANDARDIZED_POPULARITY_FUNCTION_NAME,
     popularity_constants=POPULARITY_CONSTANTS_VIEW_NAME,
 ):
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
+    postgres = get_postgres_session(postgres_conn_id)
     query = dedent(
         f"""
         CREATE OR REPLACE FUNCTION public.{function_name}(
@@ -243,42 +451,461 @@ def create_standardized_popularity_function(
     postgres.run(query)
 
 
+@with_postgres_session
 def create_image_view(
     postgres_conn_id,
-    standardized_popularity_func=STANDARDIZED_POPULARITY_FUNCTION_NAME,
+    popularity_constants=POPULARITY_CONSTANTS_VIEW_NAME,
     image_table_name=IMAGE_TABLE_NAME,
     image_view_name=IMAGE_VIEW_NAME,
     image_view_id_idx=IMAGE_VIEW_ID_IDX,
     image_view_provider_fid_idx=IMAGE_VIEW_PROVIDER_FID_IDX,
+    image_view_updated_on_idx=IMAGE_VIEW_UPDATED_ON_IDX,
 ):
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
+    """
+    Create the image view as a table, so that `update_image_view` can
+    maintain it with an upsert rather than recomputing every row.
+    """
+    postgres = get_postgres_session(postgres_conn_id)
+    standardized_popularity = _get_standardized_popularity_expression(
+        image_table_name, popularity_constants
+    )
     create_view_query = dedent(
         f"""
-        CREATE MATERIALIZED VIEW public.{image_view_name} AS
+        CREATE TABLE public.{image_view_name} AS
           SELECT
-            *,
-            {standardized_popularity_func}(
-              {image_table_name}.{PARTITION},
-              {image_table_name}.{METADATA_COLUMN}
-            ) AS {STANDARDIZED_POPULARITY}
-          FROM {image_table_name};
+            {image_table_name}.*,
+            {standardized_popularity} AS {STANDARDIZED_POPULARITY}
+          FROM {image_table_name}
+          LEFT JOIN {popularity_constants}
+            ON {image_table_name}.{PARTITION}
+              = {popularity_constants}.{PARTITION};
         """
     )
-    add_idx_query = dedent(
+    add_idx_query = _get_image_view_index_query(
+        image_view_name,
+        image_view_id_idx,
+        image_view_provider_fid_idx,
+        image_view_updated_on_idx,
+    )
+    postgres.run(create_view_query)
+    postgres.run(add_idx_query)
+
+
+def _get_image_view_index_query(
+    image_view_name,
+    image_view_id_idx,
+    image_view_provider_fid_idx,
+    image_view_updated_on_idx,
+):
+    return dedent(
         f"""
         CREATE UNIQUE INDEX {image_view_id_idx}
           ON public.{image_view_name} ({IDENTIFIER});
         CREATE UNIQUE INDEX {image_view_provider_fid_idx}
           ON public.{image_view_name}
           USING btree({PROVIDER}, md5({FID}));
+        CREATE INDEX {image_view_updated_on_idx}
+          ON public.{image_view_name} ({UPDATED_ON});
         """
     )
-    postgres.run(create_view_query)
-    postgres.run(add_idx_query)
 
 
+@with_postgres_session
 def update_image_view(
-    postgres_conn_id, image_view_name=IMAGE_VIEW_NAME,
+    postgres_conn_id,
+    image_view_name=IMAGE_VIEW_NAME,
+    incremental=False,
+    popularity_constants=POPULARITY_CONSTANTS_VIEW_NAME,
+    image_table_name=IMAGE_TABLE_NAME,
+    overlap=INCREMENTAL_UPDATE_OVERLAP,
 ):
-    postgres = PostgresHook(postgres_conn_id=postgres_conn_id)
-    postgres.run(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {image_view_name};")
+    """
+    Bring the image view up to date with the image table.
+
+    An incremental update only recomputes rows of the image table which
+    were updated since the newest row in the view (less `overlap`).  A
+    full update recomputes every row, and also removes rows which are
+    no longer in the image table.  Either way, only rows which actually
+    changed are written.
+
+    If the image view is still a materialized view, it is refreshed.
+    """
+    postgres = get_postgres_session(postgres_conn_id)
+    if _is_materialized_view(postgres, image_view_name):
+        logger.info(f"{image_view_name} is a materialized view.  Refreshing.")
+        postgres.run(
+            f"REFRESH MATERIALIZED VIEW CONCURRENTLY {image_view_name};"
+        )
+        return
+
+    if incremental:
+        where_clause = dedent(
+            f"""
+            WHERE {image_table_name}.{UPDATED_ON} >= (
+              SELECT
+                COALESCE(MAX({UPDATED_ON}), '-infinity')
+                - INTERVAL '{overlap}'
+              FROM public.{image_view_name}
+            )
+            """
+        )
+    else:
+        where_clause = ""
+
+    upsert_query = _get_image_view_upsert_query(
+        postgres,
+        image_view_name,
+        popularity_constants,
+        image_table_name,
+        where_clause,
+    )
+    delete_query = dedent(
+        f"""
+        DELETE FROM public.{image_view_name}
+        WHERE NOT EXISTS (
+          SELECT 1 FROM {image_table_name}
+          WHERE
+            {image_table_name}.{IDENTIFIER}
+            = {image_view_name}.{IDENTIFIER}
+        );
+        """
+    )
+    if incremental:
+        postgres.run(upsert_query)
+    else:
+        postgres.run([delete_query, upsert_query])
+
+
+def _get_image_view_upsert_query(
+    postgres,
+    image_view_name,
+    popularity_constants,
+    image_table_name,
+    where_clause="",
+):
+    """
+    Return a query upserting the rows of the image table matching
+    `where_clause` into the image view, which only writes rows that
+    actually changed.
+    """
+    standardized_popularity = _get_standardized_popularity_expression(
+        image_table_name, popularity_constants
+    )
+    view_columns = _get_column_names(postgres, image_view_name)
+    image_columns = [c for c in view_columns if c != STANDARDIZED_POPULARITY]
+    return dedent(
+        f"""
+        INSERT INTO public.{image_view_name} (
+          {', '.join(view_columns)}
+        )
+          SELECT
+            {', '.join(f"{image_table_name}.{c}" for c in image_columns)},
+            {standardized_popularity} AS {STANDARDIZED_POPULARITY}
+          FROM {image_table_name}
+          LEFT JOIN {popularity_constants}
+            ON {image_table_name}.{PARTITION}
+              = {popularity_constants}.{PARTITION}
+          {where_clause}
+        ON CONFLICT ({IDENTIFIER})
+        DO UPDATE SET
+          {', '.join(f"{c}=EXCLUDED.{c}" for c in view_columns)}
+        WHERE
+          ({', '.join(f"{image_view_name}.{c}" for c in view_columns)})
+          IS DISTINCT FROM
+          ({', '.join(f"EXCLUDED.{c}" for c in view_columns)});
+        """
+    )
+
+
+@with_postgres_session
+def create_staging_popularity_relations(
+    postgres_conn_id,
+    identifier,
+    popularity_constants=POPULARITY_CONSTANTS_VIEW_NAME,
+    image_view_name=IMAGE_VIEW_NAME,
+):
+    """
+    Create empty staging copies of the popularity constants and the
+    image view for the refresh identified by `identifier`.  The staging
+    tables are filled one provider at a time, and then swapped in by
+    `swap_staging_popularity_relations`.  The time the refresh started
+    is kept as the comment of the staging image view, so that rows
+    updated while the staging tables are filled can be replayed.
+    """
+    postgres = get_postgres_session(postgres_conn_id)
+    drop_staging_popularity_relations(
+        postgres_conn_id,
+        identifier,
+        popularity_constants=popularity_constants,
+        image_view_name=image_view_name,
+    )
+    started_at = postgres.get_first("SELECT NOW()::text;")[0]
+    staging_image_view = _get_staging_name(image_view_name, identifier)
+    postgres.run(
+        [
+            dedent(
+                f"""
+                CREATE TABLE public.{_get_staging_name(relation, identifier)}
+                  AS SELECT * FROM public.{relation} WITH NO DATA;
+                """
+            )
+            for relation in [popularity_constants, image_view_name]
+        ] + [
+            f"COMMENT ON TABLE public.{staging_image_view}"
+            f" IS '{started_at}';"
+        ]
+    )
+
+
+@with_postgres_session(settings=POPULARITY_CONSTANTS_SESSION_SETTINGS)
+def insert_staging_popularity_constants(
+    postgres_conn_id,
+    provider,
+    identifier,
+    popularity_constants=POPULARITY_CONSTANTS_VIEW_NAME,
+    popularity_metrics=POPULARITY_METRICS_TABLE_NAME,
+    popularity_percentile=POPULARITY_PERCENTILE_FUNCTION_NAME,
+):
+    """
+    Compute the popularity constants of `provider` into the staging
+    copy of the popularity constants.  The percentile is read from the
+    provider's metric index, so `update_image_popularity_metric_indices`
+    and `create_image_popularity_percentile_function` must have run.
+    """
+    postgres = get_postgres_session(postgres_conn_id)
+    staging_constants = _get_staging_name(popularity_constants, identifier)
+    constants_query = _get_popularity_constants_query(
+        popularity_metrics, popularity_percentile, provider=provider
+    )
+    postgres.run(
+        [
+            dedent(
+                f"""
+                DELETE FROM public.{staging_constants}
+                WHERE {PARTITION}='{provider}';
+                """
+            ),
+            f"INSERT INTO public.{staging_constants} {constants_query};",
+        ]
+    )
+
+
+@with_postgres_session
+def insert_staging_image_view_rows(
+    postgres_conn_id,
+    identifier,
+    provider=None,
+    excluded_providers=tuple(POPULARITY_METRICS),
+    popularity_constants=POPULARITY_CONSTANTS_VIEW_NAME,
+    image_table_name=IMAGE_TABLE_NAME,
+    image_view_name=IMAGE_VIEW_NAME,
+):
+    """
+    Copy the rows of `provider` from the image table into the staging
+    copy of the image view, with their standardized popularity computed
+    from the staging popularity constants.  If `provider` is None, the
+    rows of all providers not in `excluded_providers` are copied
+    instead.  `excluded_providers` must be exactly the providers copied
+    by their own calls, or their rows would be missing or doubled.
+    """
+    postgres = get_postgres_session(postgres_conn_id)
+    if provider is not None:
+        image_table_name = get_image_table_for_provider(
+            postgres, provider, image_table_name
+        )
+    staging_constants = _get_staging_name(popularity_constants, identifier)
+    staging_image_view = _get_staging_name(image_view_name, identifier)
+    standardized_popularity = _get_standardized_popularity_expression(
+        image_table_name, staging_constants
+    )
+    view_columns = _get_column_names(postgres, staging_image_view)
+    image_columns = [c for c in view_columns if c != STANDARDIZED_POPULARITY]
+    if provider is not None:
+        where_clause = f"{image_table_name}.{PARTITION}='{provider}'"
+        parameters = None
+    else:
+        where_clause = dedent(
+            f"""
+            {image_table_name}.{PARTITION} IS NULL
+            OR NOT {image_table_name}.{PARTITION}=ANY(%s)
+            """
+        )
+        parameters = (list(excluded_providers),)
+
+    insert_query = dedent(
+        f"""
+        INSERT INTO public.{staging_image_view} (
+          {', '.join(view_columns)}
+        )
+          SELECT
+            {', '.join(f"{image_table_name}.{c}" for c in image_columns)},
+            {standardized_popularity} AS {STANDARDIZED_POPULARITY}
+          FROM {image_table_name}
+          LEFT JOIN {staging_constants}
+            ON {image_table_name}.{PARTITION}
+              = {staging_constants}.{PARTITION}
+          WHERE {where_clause};
+        """
+    )
+    postgres.run(insert_query, parameters=parameters)
+
+
+@with_postgres_session
+def swap_staging_popularity_relations(
+    postgres_conn_id,
+    identifier,
+    popularity_constants=POPULARITY_CONSTANTS_VIEW_NAME,
+    popularity_constants_idx=POPULARITY_CONSTANTS_IDX,
+    image_view_name=IMAGE_VIEW_NAME,
+    image_view_id_idx=IMAGE_VIEW_ID_IDX,
+    image_view_provider_fid_idx=IMAGE_VIEW_PROVIDER_FID_IDX,
+    image_view_updated_on_idx=IMAGE_VIEW_UPDATED_ON_IDX,
+    image_table_name=IMAGE_TABLE_NAME,
+    overlap=INCREMENTAL_UPDATE_OVERLAP,
+):
+    """
+    Index the staging popularity constants and image view, then replace
+    the live relations with them in a single transaction, so that
+    readers see either the old data or the new, and never a mix.
+
+    The live image view is locked against writes (e.g., by
+    `update_image_view`) for the transaction, and rows of the image
+    table updated since the refresh started (less `overlap`) are
+    upserted into the staging image view first, so no update made while
+    the staging tables were filled is lost.  If any other object depends
+    on the live relations, the swap fails rather than dropping it.
+    """
+    postgres = get_postgres_session(postgres_conn_id)
+    staging_constants = _get_staging_name(popularity_constants, identifier)
+    staging_image_view = _get_staging_name(image_view_name, identifier)
+    indices = {
+        popularity_constants_idx: _get_staging_name(
+            popularity_constants_idx, identifier
+        ),
+        image_view_id_idx: _get_staging_name(image_view_id_idx, identifier),
+        image_view_provider_fid_idx: _get_staging_name(
+            image_view_provider_fid_idx, identifier
+        ),
+        image_view_updated_on_idx: _get_staging_name(
+            image_view_updated_on_idx, identifier
+        ),
+    }
+    postgres.run(
+        _get_popularity_constants_index_query(
+            staging_constants, indices[popularity_constants_idx]
+        )
+    )
+    postgres.run(
+        _get_image_view_index_query(
+            staging_image_view,
+            indices[image_view_id_idx],
+            indices[image_view_provider_fid_idx],
+            indices[image_view_updated_on_idx],
+        )
+    )
+    started_at = postgres.get_first(
+        "SELECT obj_description(%s::regclass, 'pg_class');",
+        parameters=(f"public.{staging_image_view}",),
+    )[0]
+    if started_at is None:
+        logger.warning(
+            f"No start time recorded for {staging_image_view}."
+            f"  Replaying every row of {image_table_name}."
+        )
+        started_at = "-infinity"
+    replay_where_clause = dedent(
+        f"""
+        WHERE {image_table_name}.{UPDATED_ON} >= (
+          TIMESTAMP WITH TIME ZONE '{started_at}' - INTERVAL '{overlap}'
+        )
+        """
+    )
+    if _is_materialized_view(postgres, image_view_name):
+        lock_queries = []
+    else:
+        lock_queries = [
+            f"LOCK TABLE public.{image_view_name} IN EXCLUSIVE MODE;"
+        ]
+    replay_query = _get_image_view_upsert_query(
+        postgres,
+        staging_image_view,
+        staging_constants,
+        image_table_name,
+        replay_where_clause,
+    )
+    swap_queries = lock_queries + [
+        replay_query,
+        f"COMMENT ON TABLE public.{staging_image_view} IS NULL;",
+        _get_drop_relation_query(image_view_name, cascade=False),
+        _get_drop_relation_query(popularity_constants, cascade=False),
+        f"ALTER TABLE public.{staging_constants}"
+        f" RENAME TO {popularity_constants};",
+        f"ALTER TABLE public.{staging_image_view}"
+        f" RENAME TO {image_view_name};",
+    ] + [
+        f"ALTER INDEX public.{staging_idx} RENAME TO {idx};"
+        for idx, staging_idx in indices.items()
+    ]
+    postgres.run(swap_queries)
+
+
+@with_postgres_session
+def drop_staging_popularity_relations(
+    postgres_conn_id,
+    identifier,
+    popularity_constants=POPULARITY_CONSTANTS_VIEW_NAME,
+    image_view_name=IMAGE_VIEW_NAME,
+):
+    postgres = get_postgres_session(postgres_conn_id)
+    postgres.run(
+        [
+            "DROP TABLE IF EXISTS public."
+            f"{_get_staging_name(relation, identifier)} CASCADE;"
+            for relation in [image_view_name, popularity_constants]
+        ]
+    )
+
+
+def _get_staging_name(relation, identifier):
+    # Unquoted names are folded to lower case by PostgreSQL, and we look
+    # the staging image view up by name in `information_schema`.
+    return f"{relation}_{identifier}".lower()
+
+
+def _get_standardized_popularity_expression(
+    image_table_name, popularity_constants
+):
+    """
+    Return the SQL computing the same value as the standardized
+    popularity function, from a row of the image table joined to the
+    row of the popularity constants view for its provider.  Joining
+    lets PostgreSQL look up each provider's constant once, rather than
+    calling the function for every image.
+    """
+    metric_value = (
+        f"({image_table_name}.{METADATA_COLUMN}"
+        f"->>{popularity_constants}.{METRIC})::float"
+    )
+    constant = f"{popularity_constants}.{CONSTANT}"
+    return f"{metric_value} / ({metric_value} + {constant})"
+
+
+def _is_materialized_view(postgres, relation_name):
+    return bool(
+        postgres.get_first(
+            "SELECT 1 FROM pg_matviews"
+            " WHERE schemaname='public' AND matviewname=%s;",
+            parameters=(relation_name,),
+        )
+    )
+
+
+def _get_column_names(postgres, table_name):
+    return [
+        r[0] for r in postgres.get_records(
+            "SELECT column_name FROM information_schema.columns"
+            " WHERE table_schema='public' AND table_name=%s"
+            " ORDER BY ordinal_position;",
+            parameters=(table_name,),
+        )
+    ]
@@ -19,6 +19,8 @@ TEST_POPULARITY_PERCENTILE = f"popularity_percentile_{TEST_ID}"
 TEST_POPULARITY_CONSTANTS_IDX = "test_popularity_constants_idx"
 TEST_IMAGE_VIEW_ID_IDX = "test_view_id_idx"
 TEST_IMAGE_VIEW_PROVIDER_FID_IDX = "test_view_provider_fid_idx"
+TEST_IMAGE_VIEW_UPDATED_ON_IDX = "test_view_updated_on_idx"
+TEST_STAGING_ID = "20200101T000000"
 
 UUID_FUNCTION_QUERY = (
     'CREATE EXTENSION IF NOT EXISTS "uuid-ossp" WITH SCHEMA public;'
@@ -61,8 +63,10 @@ UNIQUE_CONDITION_QUERY = (
 )
 
 DROP_TEST_RELATIONS_QUERY = f"""
-    DROP MATERIALIZED VIEW IF EXISTS {TEST_IMAGE_VIEW} CASCADE;
-    DROP MATERIALIZED VIEW IF EXISTS {TEST_CONSTANTS} CASCADE;
+    DROP TABLE IF EXISTS {TEST_IMAGE_VIEW} CASCADE;
+    {sql._get_drop_relation_query(TEST_CONSTANTS)}
+    DROP TABLE IF EXISTS {TEST_IMAGE_VIEW}_{TEST_STAGING_ID} CASCADE;
+    DROP TABLE IF EXISTS {TEST_CONSTANTS}_{TEST_STAGING_ID} CASCADE;
     DROP TABLE IF EXISTS {TEST_METRICS} CASCADE;
     DROP TABLE IF EXISTS {TEST_IMAGE_TABLE} CASCADE;
     DROP FUNCTION IF EXISTS {TEST_STANDARDIZED_POPULARITY} CASCADE;
@@ -96,11 +100,12 @@ def _set_up_image_view(pg, data_query, metrics_dict):
     _set_up_std_popularity_func(pg, data_query, metrics_dict)
     sql.create_image_view(
         conn_id,
-        standardized_popularity_func=TEST_STANDARDIZED_POPULARITY,
+        popularity_constants=TEST_CONSTANTS,
         image_table_name=TEST_IMAGE_TABLE,
         image_view_name=TEST_IMAGE_VIEW,
         image_view_id_idx=TEST_IMAGE_VIEW_ID_IDX,
         image_view_provider_fid_idx=TEST_IMAGE_VIEW_PROVIDER_FID_IDX,
+        image_view_updated_on_idx=TEST_IMAGE_VIEW_UPDATED_ON_IDX,
     )
 
 
@@ -356,6 +361,62 @@ def test_constants_view_handles_zeros_and_missing(postgres_with_image_table):
     )
 
 
+def test_staging_constants_match_constants_view(postgres_with_image_table):
+    image_table = TEST_IMAGE_TABLE
+    data_query = dedent(
+        f"""
+        INSERT INTO {image_table} (
+          created_on, updated_on, provider, foreign_identifier, url,
+          meta_data, license, removed_from_source
+        )
+        SELECT
+          NOW(), NOW(), 'my_provider', 'fid_' || i,
+          'https://test.com/' || i || '.jpg',
+          jsonb_build_object('views', i), 'cc0', false
+        FROM generate_series(1, 1000) AS i;
+        """
+    )
+    metrics = {"my_provider": {"metric": "views", "percentile": 0.5}}
+    _set_up_popularity_constants(
+        postgres_with_image_table, data_query, metrics
+    )
+    sql.create_staging_popularity_relations(
+        POSTGRES_CONN_ID, TEST_STAGING_ID, **STAGING_RELATION_NAMES
+    )
+    sql.insert_staging_popularity_constants(
+        POSTGRES_CONN_ID,
+        "my_provider",
+        TEST_STAGING_ID,
+        popularity_constants=TEST_CONSTANTS,
+        popularity_metrics=TEST_METRICS,
+        popularity_percentile=TEST_POPULARITY_PERCENTILE,
+    )
+
+    postgres_with_image_table.cursor.execute(
+        f"SELECT * FROM {TEST_CONSTANTS};"
+    )
+    view_rows = list(postgres_with_image_table.cursor)
+    postgres_with_image_table.cursor.execute(
+        f"SELECT * FROM {TEST_CONSTANTS}_{TEST_STAGING_ID};"
+    )
+    staging_rows = list(postgres_with_image_table.cursor)
+    assert view_rows == [("my_provider", "views", 0.5, 500.0, 500.0, 500.0)]
+    assert staging_rows == view_rows
+
+
+def test_get_popularity_metric_insert_values_string_uses_default_percentile():
+    metrics = {
+        "my_provider": {"metric": "views"},
+        "diff_provider": {"metric": "comments", "percentile": 0.5},
+    }
+    expect_string = (
+        "('my_provider', 'views', 0.85),\n"
+        "          ('diff_provider', 'comments', 0.5)"
+    )
+    actual_string = sql._get_popularity_metric_insert_values_string(metrics)
+    assert actual_string == expect_string
+
+
 def test_standardized_popularity_function_calculates(
         postgres_with_image_table
 ):
@@ -469,3 +530,277 @@ def test_image_view_calculates_std_pop(postgres_with_image_table):
             rd["fid_d"] == 0.75,
         ]
     )
+
+
+def _update_test_image_view(incremental):
+    sql.update_image_view(
+        POSTGRES_CONN_ID,
+        image_view_name=TEST_IMAGE_VIEW,
+        incremental=incremental,
+        popularity_constants=TEST_CONSTANTS,
+        image_table_name=TEST_IMAGE_TABLE,
+    )
+
+
+def _get_image_view_std_pop(pg):
+    pg.cursor.execute(
+        f"SELECT foreign_identifier, standardized_popularity"
+        f" FROM {TEST_IMAGE_VIEW};"
+    )
+    return dict(pg.cursor)
+
+
+def _insert_image_row(pg, fid, views, updated_on="NOW()"):
+    pg.cursor.execute(
+        dedent(
+            f"""
+            INSERT INTO {TEST_IMAGE_TABLE} (
+              created_on, updated_on, provider, foreign_identifier, url,
+              meta_data, license, removed_from_source
+            )
+            VALUES (
+              NOW(), {updated_on}, 'my_provider', '{fid}',
+              'https://test.com/{fid}.jpg', '{{"views": {views}}}', 'cc0',
+              false
+            );
+            """
+        )
+    )
+    pg.connection.commit()
+
+
+IMAGE_VIEW_DATA_QUERY = dedent(
+    f"""
+    INSERT INTO {TEST_IMAGE_TABLE} (
+      created_on, updated_on, provider, foreign_identifier, url,
+      meta_data, license, removed_from_source
+    )
+    VALUES
+      (
+        NOW(), NOW(), 'my_provider', 'fid_a', 'https://test.com/a.jpg',
+        '{{"views": 50}}', 'cc0', false
+      ),
+      (
+        NOW(), NOW(), 'my_provider', 'fid_b', 'https://test.com/b.jpg',
+        '{{"views": 150}}', 'cc0', false
+      )
+    """
+)
+IMAGE_VIEW_METRICS = {"my_provider": {"metric": "views", "percentile": 0.5}}
+
+
+def test_update_image_view_incremental_adds_and_updates_new_rows(
+        postgres_with_image_table
+):
+    pg = postgres_with_image_table
+    _set_up_image_view(pg, IMAGE_VIEW_DATA_QUERY, IMAGE_VIEW_METRICS)
+    _insert_image_row(pg, "fid_c", 75)
+    pg.cursor.execute(
+        f"UPDATE {TEST_IMAGE_TABLE}"
+        f" SET meta_data='{{\"views\": 150}}', updated_on=NOW()"
+        f" WHERE foreign_identifier='fid_a';"
+    )
+    pg.connection.commit()
+    _update_test_image_view(incremental=True)
+    rd = _get_image_view_std_pop(pg)
+    assert rd == {"fid_a": 0.75, "fid_b": 0.75, "fid_c": 0.6}
+
+
+def test_update_image_view_incremental_skips_rows_before_watermark(
+        postgres_with_image_table
+):
+    pg = postgres_with_image_table
+    _set_up_image_view(pg, IMAGE_VIEW_DATA_QUERY, IMAGE_VIEW_METRICS)
+    _insert_image_row(pg, "fid_c", 75, "NOW() - INTERVAL '3 days'")
+    _update_test_image_view(incremental=True)
+    assert "fid_c" not in _get_image_view_std_pop(pg)
+
+
+def test_update_image_view_full_adds_old_rows_and_removes_deleted_rows(
+        postgres_with_image_table
+):
+    pg = postgres_with_image_table
+    _set_up_image_view(pg, IMAGE_VIEW_DATA_QUERY, IMAGE_VIEW_METRICS)
+    _insert_image_row(pg, "fid_c", 75, "NOW() - INTERVAL '3 days'")
+    pg.cursor.execute(
+        f"DELETE FROM {TEST_IMAGE_TABLE} WHERE foreign_identifier='fid_b';"
+    )
+    pg.connection.commit()
+    _update_test_image_view(incremental=False)
+    rd = _get_image_view_std_pop(pg)
+    assert rd == {"fid_a": 0.5, "fid_c": 0.6}
+
+
+def _get_test_image_table_indices(pg):
+    pg.cursor.execute(
+        f"SELECT indexname FROM pg_indexes"
+        f" WHERE tablename='{TEST_IMAGE_TABLE}';"
+    )
+    return {r[0] for r in pg.cursor}
+
+
+def test_update_metric_indices_creates_and_drops_indices(
+        postgres_with_image_table
+):
+    metrics = {
+        "my_provider": {"metric": "views"},
+        "diff_provider": {"metric": "comments"},
+    }
+    sql.update_image_popularity_metric_indices(
+        POSTGRES_CONN_ID,
+        popularity_metrics=metrics,
+        image_table=TEST_IMAGE_TABLE,
+    )
+    my_provider_idx = f"{TEST_IMAGE_TABLE}_my_provider_views_popularity_idx"
+    diff_provider_idx = (
+        f"{TEST_IMAGE_TABLE}_diff_provider_comments_popularity_idx"
+    )
+    indices = _get_test_image_table_indices(postgres_with_image_table)
+    assert my_provider_idx in indices
+    assert diff_provider_idx in indices
+
+    del metrics["diff_provider"]
+    sql.update_image_popularity_metric_indices(
+        POSTGRES_CONN_ID,
+        popularity_metrics=metrics,
+        image_table=TEST_IMAGE_TABLE,
+    )
+    indices = _get_test_image_table_indices(postgres_with_image_table)
+    assert my_provider_idx in indices
+    assert diff_provider_idx not in indices
+    assert f"{TEST_IMAGE_TABLE}_provider_fid_idx" in indices
+
+
+STAGING_RELATION_NAMES = dict(
+    popularity_constants=TEST_CONSTANTS,
+    image_view_name=TEST_IMAGE_VIEW,
+)
+
+
+def _fill_staging_popularity_relations(
+        pg, excluded_providers, stale_metrics=None
+):
+    _set_up_image_view(pg, IMAGE_VIEW_DATA_QUERY, IMAGE_VIEW_METRICS)
+    if stale_metrics is not None:
+        # Metrics of providers which are no longer configured stay in the
+        # metrics table.
+        sql.update_image_popularity_metrics(
+            POSTGRES_CONN_ID,
+            popularity_metrics=stale_metrics,
+            popularity_metrics_table=TEST_METRICS,
+        )
+    _insert_image_row(pg, "fid_c", 75)
+    pg.cursor.execute(
+        dedent(
+            f"""
+            INSERT INTO {TEST_IMAGE_TABLE} (
+              created_on, updated_on, provider, foreign_identifier, url,
+              meta_data, license, removed_from_source
+            )
+            VALUES (
+              NOW(), NOW(), 'other_provider', 'fid_d',
+              'https://test.com/d.jpg', '{{"views": 10}}', 'cc0', false
+            );
+            """
+        )
+    )
+    pg.connection.commit()
+    sql.create_staging_popularity_relations(
+        POSTGRES_CONN_ID, TEST_STAGING_ID, **STAGING_RELATION_NAMES
+    )
+    sql.insert_staging_popularity_constants(
+        POSTGRES_CONN_ID,
+        "my_provider",
+        TEST_STAGING_ID,
+        popularity_constants=TEST_CONSTANTS,
+        popularity_metrics=TEST_METRICS,
+        popularity_percentile=TEST_POPULARITY_PERCENTILE,
+    )
+    for provider in ["my_provider", None]:
+        sql.insert_staging_image_view_rows(
+            POSTGRES_CONN_ID,
+            TEST_STAGING_ID,
+            provider=provider,
+            excluded_providers=excluded_providers,
+            image_table_name=TEST_IMAGE_TABLE,
+            **STAGING_RELATION_NAMES,
+        )
+
+
+def _swap_staging_popularity_relations():
+    sql.swap_staging_popularity_relations(
+        POSTGRES_CONN_ID,
+        TEST_STAGING_ID,
+        popularity_constants_idx=TEST_POPULARITY_CONSTANTS_IDX,
+        image_view_id_idx=TEST_IMAGE_VIEW_ID_IDX,
+        image_view_provider_fid_idx=TEST_IMAGE_VIEW_PROVIDER_FID_IDX,
+        image_view_updated_on_idx=TEST_IMAGE_VIEW_UPDATED_ON_IDX,
+        image_table_name=TEST_IMAGE_TABLE,
+        **STAGING_RELATION_NAMES,
+    )
+
+
+def test_staging_popularity_relations_are_swapped_in(
+        postgres_with_image_table
+):
+    pg = postgres_with_image_table
+    _fill_staging_popularity_relations(pg, ["my_provider"])
+    assert _get_image_view_std_pop(pg) == {"fid_a": 0.5, "fid_b": 0.75}
+
+    _swap_staging_popularity_relations()
+    rd = _get_image_view_std_pop(pg)
+    assert rd == {"fid_a": 0.4, "fid_b": 2 / 3, "fid_c": 0.5, "fid_d": None}
+    pg.cursor.execute(
+        f"SELECT indexname FROM pg_indexes"
+        f" WHERE tablename='{TEST_IMAGE_VIEW}';"
+    )
+    assert {r[0] for r in pg.cursor} == {
+        TEST_IMAGE_VIEW_ID_IDX,
+        TEST_IMAGE_VIEW_PROVIDER_FID_IDX,
+        TEST_IMAGE_VIEW_UPDATED_ON_IDX,
+    }
+
+
+def test_staging_image_view_keeps_providers_only_in_metrics_table(
+        postgres_with_image_table
+):
+    pg = postgres_with_image_table
+    _fill_staging_popularity_relations(
+        pg,
+        ["my_provider"],
+        stale_metrics={"other_provider": {"metric": "views"}},
+    )
+    _swap_staging_popularity_relations()
+    assert "fid_d" in _get_image_view_std_pop(pg)
+
+
+def test_swap_staging_replays_rows_updated_during_refresh(
+        postgres_with_image_table
+):
+    pg = postgres_with_image_table
+    _fill_staging_popularity_relations(pg, ["my_provider"])
+    pg.cursor.execute(
+        f"UPDATE {TEST_IMAGE_TABLE}"
+        f" SET meta_data='{{\"views\": 75}}', updated_on=NOW()"
+        f" WHERE foreign_identifier='fid_a';"
+    )
+    pg.connection.commit()
+    _swap_staging_popularity_relations()
+    assert _get_image_view_std_pop(pg)["fid_a"] == 0.5
+
+
+def test_swap_staging_fails_instead_of_dropping_dependent_views(
+        postgres_with_image_table
+):
+    pg = postgres_with_image_table
+    _fill_staging_popularity_relations(pg, ["my_provider"])
+    dependent_view = f"{TEST_IMAGE_VIEW}_dependent"
+    pg.cursor.execute(
+        f"CREATE VIEW {dependent_view} AS SELECT * FROM {TEST_IMAGE_VIEW};"
+    )
+    pg.connection.commit()
+    with pytest.raises(Exception):
+        _swap_staging_popularity_relations()
+    assert _get_image_view_std_pop(pg) == {"fid_a": 0.5, "fid_b": 0.75}
+    pg.cursor.execute(f"DROP VIEW {dependent_view};")
+    pg.connection.commit()
@@ -0,0 +1,268 @@
+"""
+This module holds a scoped PostgreSQL session, so that the SQL helpers
+called within one Airflow task share a single connection, rather than
+each statement opening its own.
+
+Helpers decorated with `with_postgres_session` get the session for their
+`postgres_conn_id` with `get_postgres_session`.  If a session for that
+connection id is already open in the current thread, it is reused;
+otherwise a session is opened for the duration of the helper.  A task
+can open a session around several helpers to share it between them:
+
+    with postgres_session(conn_id, settings={'work_mem': '256MB'}):
+        sql.create_loading_table(conn_id, identifier)
+        sql.upsert_records_to_image_table(conn_id, identifier)
+
+Sessions are per thread, since a psycopg2 connection can only run one
+statement at a time.  The connection is opened when the first statement
+is run, so a session that runs no SQL costs nothing.
+"""
+from contextlib import contextmanager
+import functools
+import logging
+import threading
+
+from airflow.hooks.postgres_hook import PostgresHook
+from psycopg2.extensions import TRANSACTION_STATUS_INERROR
+
+logger = logging.getLogger(__name__)
+
+_open_sessions = threading.local()
+
+
+class PostgresSession:
+    """
+    A single connection to the database given by `postgres_conn_id`.
+    `run`, `get_records` and `get_first` behave like those of
+    `PostgresHook`, except that every statement runs on the same
+    connection.
+
+    Outside of a transaction scope, each call is committed (or rolled
+    back, if it fails) before it returns.  Inside one, nothing is
+    committed until the outermost transaction scope exits.
+    """
+
+    def __init__(self, postgres_conn_id):
+        self.postgres_conn_id = postgres_conn_id
+        self._connection = None
+        self._scopes = []
+        self._transaction_depth = 0
+
+    @contextmanager
+    def scope(self, settings=None, transaction=False):
+        """
+        Apply the run-time parameters in `settings` (e.g., `work_mem`)
+        until the scope exits, when their previous values are restored.
+        If `transaction` is True, everything run in the scope is part of
+        one transaction.
+        """
+        scope = {'settings': settings or {}, 'previous': None}
+        self._scopes.append(scope)
+        if self._connection is not None:
+            self._apply_settings(scope)
+        if transaction:
+            self._transaction_depth += 1
+        try:
+            yield self
+        except Exception:
+            if transaction and self._connection is not None:
+                self._connection.rollback()
+            raise
+        else:
+            if transaction and self._transaction_depth == 1:
+                self._commit()
+        finally:
+            if transaction:
+                self._transaction_depth -= 1
+            self._scopes.pop()
+            self._restore_settings(scope)
+
+    def run(self, sql, autocommit=False, parameters=None):
+        """
+        Run a statement, or a list of statements, on the session's
+        connection.  Statements such as `CREATE INDEX CONCURRENTLY`
+        need `autocommit`, which can not be used in a transaction scope.
+        """
+        statements = [sql] if isinstance(sql, str) else sql
+        if autocommit:
+            if self._transaction_depth > 0:
+                raise ValueError(
+                    'Cannot run autocommit statements in a transaction.'
+                )
+            connection = self.get_conn()
+            connection.autocommit = True
+            try:
+                self._execute_all(statements, parameters)
+            finally:
+                connection.autocommit = False
+        else:
+            self._run_and_finish(
+                lambda: self._execute_all(statements, parameters)
+            )
+
+    def get_records(self, sql, parameters=None):
+        return self._run_and_finish(
+            lambda: self._execute(sql, parameters).fetchall()
+        )
+
+    def get_first(self, sql, parameters=None):
+        return self._run_and_finish(
+            lambda: self._execute(sql, parameters).fetchone()
+        )
+
+    def copy_expert(self, sql, file_obj, size=8192):
+        """
+        Run a `COPY ... FROM STDIN` or `COPY ... TO STDOUT` statement,
+        reading from or writing to the file-like `file_obj`.
+        """
+        def _copy():
+            with self.get_conn().cursor() as cur:
+                cur.copy_expert(sql, file_obj, size=size)
+
+        self._run_and_finish(_copy)
+
+    def get_conn(self):
+        if self._connection is None:
+            logger.info(f'Connecting to {self.postgres_conn_id}')
+            self._connection = PostgresHook(
+                postgres_conn_id=self.postgres_conn_id
+            ).get_conn()
+            for scope in self._scopes:
+                self._apply_settings(scope)
+            if any(scope['settings'] for scope in self._scopes):
+                self._finish()
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _run_and_finish(self, function):
+        try:
+            result = function()
+        except Exception:
+            if self._transaction_depth == 0 and self._connection is not None:
+                self._connection.rollback()
+            raise
+        self._finish()
+        return result
+
+    def _execute_all(self, statements, parameters):
+        for statement in statements:
+            self._execute(statement, parameters)
+
+    def _execute(self, sql, parameters=None):
+        logger.info(sql)
+        cur = self.get_conn().cursor()
+        if parameters is not None:
+            cur.execute(sql, parameters)
+        else:
+            cur.execute(sql)
+        return cur
+
+    def _apply_settings(self, scope):
+        if not scope['settings']:
+            return
+        scope['previous'] = {
+            name: self._execute(
+                'SELECT current_setting(%s);', (name,)
+            ).fetchone()[0]
+            for name in scope['settings']
+        }
+        self._set_settings(scope['settings'])
+
+    def _restore_settings(self, scope):
+        # Nothing more can run in a failed transaction until it is rolled
+        # back, which also undoes settings changed within it.
+        if (
+                self._connection is None
+                or not scope['previous']
+                or self._connection.get_transaction_status()
+                == TRANSACTION_STATUS_INERROR
+        ):
+            return
+        self._set_settings(scope['previous'])
+        self._finish()
+
+    def _set_settings(self, settings):
+        for name, value in settings.items():
+            self._execute(
+                'SELECT set_config(%s, %s, false);', (name, str(value))
+            )
+
+    def _finish(self):
+        if self._transaction_depth == 0:
+            self._commit()
+
+    def _commit(self):
+        if self._connection is not None:
+            self._connection.commit()
+
+
+@contextmanager
+def postgres_session(postgres_conn_id, settings=None, transaction=False):
+    """
+    Open a session for `postgres_conn_id` in the current thread, or
+    reuse the one that is already open.  See `PostgresSession.scope`
+    for `settings` and `transaction`.
+    """
+    sessions = _get_open_sessions()
+    session = sessions.get(postgres_conn_id)
+    if session is not None:
+        with session.scope(settings=settings, transaction=transaction):
+            yield session
+        return
+
+    session = PostgresSession(postgres_conn_id)
+    sessions[postgres_conn_id] = session
+    try:
+        with session.scope(settings=settings, transaction=transaction):
+            yield session
+    finally:
+        del sessions[postgres_conn_id]
+        session.close()
+
+
+def get_postgres_session(postgres_conn_id):
+    """
+    Return the session open for `postgres_conn_id` in the current
+    thread.
+    """
+    session = _get_open_sessions().get(postgres_conn_id)
+    if session is None:
+        raise RuntimeError(f'No session is open for {postgres_conn_id}')
+    return session
+
+
+def with_postgres_session(function=None, settings=None, transaction=False):
+    """
+    Decorate a function taking `postgres_conn_id` as its first argument,
+    so that it runs in a session for that connection id.  The decorator
+    can be given `settings` and `transaction` for the session's scope:
+
+        @with_postgres_session(settings={'synchronous_commit': 'off'})
+        def load(postgres_conn_id, ...):
+    """
+    if function is None:
+        return functools.partial(
+            with_postgres_session, settings=settings, transaction=transaction
+        )
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        postgres_conn_id = kwargs.get(
+            'postgres_conn_id', args[0] if args else None
+        )
+        with postgres_session(
+                postgres_conn_id, settings=settings, transaction=transaction
+        ):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def _get_open_sessions():
+    if not hasattr(_open_sessions, 'sessions'):
+        _open_sessions.sessions = {}
+    return _open_sessions.sessions
@@ -69,3 +69,42 @@ def test_create_day_partitioned_ingestion_dag_with_multi_layer_dependencies():
         [today_id, ingest1_id, ingest2_id, ingest3_id, ingest4_id, ingest5_id]
     )
     assert finish_task.downstream_task_ids == set()
+
+
+def test_create_popularity_refresh_dag_runs_providers_in_parallel():
+    dag = df.create_popularity_refresh_dag(
+        'test_dag',
+        'test_conn_id',
+        popularity_metrics={'a': {'metric': 'views'}, 'b': {'metric': 'x'}},
+    )
+    create_staging_id = 'create_staging_popularity_relations'
+    swap_staging_id = 'swap_staging_popularity_relations'
+    drop_staging_id = 'drop_staging_popularity_relations'
+    other_providers_id = 'update_image_view_other_providers'
+    finish_id = 'test_dag_Finished'
+    create_staging_task = dag.get_task(create_staging_id)
+    assert create_staging_task.upstream_task_ids == set(
+        ['create_image_popularity_percentile']
+    )
+    assert dag.get_task(
+        'create_image_popularity_percentile'
+    ).upstream_task_ids == set(['update_image_popularity_metric_indices'])
+    assert create_staging_task.downstream_task_ids == set(
+        ['update_constants_a', 'update_constants_b', other_providers_id]
+    )
+    assert dag.get_task(other_providers_id).op_kwargs == {
+        'excluded_providers': ['a', 'b']
+    }
+    for provider in ['a', 'b']:
+        constants_task = dag.get_task(f'update_constants_{provider}')
+        assert constants_task.downstream_task_ids == set(
+            [f'update_image_view_{provider}']
+        )
+    swap_staging_task = dag.get_task(swap_staging_id)
+    assert swap_staging_task.upstream_task_ids == set(
+        ['update_image_view_a', 'update_image_view_b', other_providers_id]
+    )
+    assert swap_staging_task.downstream_task_ids == set(
+        [drop_staging_id, finish_id]
+    )
+    assert dag.get_task(drop_staging_id).trigger_rule == 'all_done'
@@ -0,0 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from util import postgres_session as ps
+
+TEST_CONN_ID = 'test_conn_id'
+
+
+@pytest.fixture
+def mock_get_conn():
+    with patch.object(ps, 'PostgresHook') as mock_hook:
+        mock_get_conn = mock_hook.return_value.get_conn
+        mock_get_conn.return_value.get_transaction_status.return_value = 0
+        yield mock_get_conn
+
+
+@ps.with_postgres_session
+def _run_statement(postgres_conn_id, statement):
+    ps.get_postgres_session(postgres_conn_id).run(statement)
+
+
+def _get_executed_statements(mock_get_conn):
+    cursor = mock_get_conn.return_value.cursor.return_value
+    return [c[0][0] for c in cursor.execute.call_args_list]
+
+
+def test_helpers_share_connection_in_session(mock_get_conn):
+    with ps.postgres_session(TEST_CONN_ID):
+        _run_statement(TEST_CONN_ID, 'SELECT 1;')
+        _run_statement(TEST_CONN_ID, 'SELECT 2;')
+    assert mock_get_conn.call_count == 1
+    assert _get_executed_statements(mock_get_conn) == [
+        'SELECT 1;', 'SELECT 2;'
+    ]
+    assert mock_get_conn.return_value.commit.call_count == 2
+    mock_get_conn.return_value.close.assert_called_once()
+
+
+def test_helper_opens_own_session_outside_session(mock_get_conn):
+    _run_statement(TEST_CONN_ID, 'SELECT 1;')
+    _run_statement(TEST_CONN_ID, 'SELECT 2;')
+    assert mock_get_conn.call_count == 2
+
+
+def test_session_does_not_connect_without_statements(mock_get_conn):
+    with ps.postgres_session(TEST_CONN_ID, settings={'work_mem': '1GB'}):
+        pass
+    mock_get_conn.assert_not_called()
+
+
+def test_transaction_commits_once_at_end(mock_get_conn):
+    with ps.postgres_session(TEST_CONN_ID, transaction=True):
+        _run_statement(TEST_CONN_ID, 'SELECT 1;')
+        _run_statement(TEST_CONN_ID, 'SELECT 2;')
+        mock_get_conn.return_value.commit.assert_not_called()
+    mock_get_conn.return_value.commit.assert_called_once()
+
+
+def test_transaction_rolls_back_on_error(mock_get_conn):
+    with pytest.raises(ValueError):
+        with ps.postgres_session(TEST_CONN_ID, transaction=True):
+            _run_statement(TEST_CONN_ID, 'SELECT 1;')
+            raise ValueError('test error')
+    mock_get_conn.return_value.rollback.assert_called_once()
+    mock_get_conn.return_value.commit.assert_not_called()
+
+
+def test_autocommit_is_not_allowed_in_transaction(mock_get_conn):
+    with ps.postgres_session(TEST_CONN_ID, transaction=True) as session:
+        with pytest.raises(ValueError):
+            session.run('CREATE INDEX CONCURRENTLY x ON y (z);', True)
+
+
+def test_settings_are_applied_and_restored(mock_get_conn):
+    cursor = mock_get_conn.return_value.cursor.return_value
+    cursor.fetchone.return_value = ('4MB',)
+    with ps.postgres_session(TEST_CONN_ID):
+        _run_statement(TEST_CONN_ID, 'SELECT 1;')
+        with ps.postgres_session(TEST_CONN_ID, settings={'work_mem': '1GB'}):
+            _run_statement(TEST_CONN_ID, 'SELECT 2;')
+    set_config_calls = [
+        c[0][1] for c in cursor.execute.call_args_list
+        if c[0][0].startswith('SELECT set_config')
+    ]
+    assert set_config_calls == [('work_mem', '1GB'), ('work_mem', '4MB')]
+
+
+def test_settings_are_applied_when_connecting(mock_get_conn):
+    cursor = mock_get_conn.return_value.cursor.return_value
+    cursor.fetchone.return_value = ('on',)
+    settings = {'synchronous_commit': 'off'}
+    with ps.postgres_session(TEST_CONN_ID, settings=settings):
+        _run_statement(TEST_CONN_ID, 'SELECT 1;')
+    assert _get_executed_statements(mock_get_conn) == [
+        'SELECT current_setting(%s);',
+        'SELECT set_config(%s, %s, false);',
+        'SELECT 1;',
+        'SELECT set_config(%s, %s, false);',
+    ]
+
+
+def test_threads_get_separate_sessions(mock_get_conn):
+    with ps.postgres_session(TEST_CONN_ID) as session:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            other_session = executor.submit(
+                _get_session_in_new_thread
+            ).result()
+    assert other_session is not session
+
+
+def _get_session_in_new_thread():
+    with ps.postgres_session(TEST_CONN_ID) as session:
+        return session
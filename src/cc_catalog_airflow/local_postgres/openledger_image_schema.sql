@@ -14,7 +14,7 @@ CREATE EXTENSION IF NOT EXISTS "uuid-ossp" WITH SCHEMA public;
 COMMENT ON EXTENSION "uuid-ossp" IS 'generate universally unique identifiers (UUIDs)';
 
 CREATE TABLE public.image (
-    identifier uuid PRIMARY KEY DEFAULT public.uuid_generate_v4(),
+    identifier uuid DEFAULT public.uuid_generate_v4() NOT NULL,
     created_on timestamp with time zone NOT NULL,
     updated_on timestamp with time zone NOT NULL,
     ingestion_type character varying(80),
@@ -37,10 +37,30 @@ CREATE TABLE public.image (
     watermarked boolean,
     last_synced_with_source timestamp with time zone,
     removed_from_source boolean NOT NULL
-);
+) PARTITION BY LIST (provider);
 
 
 ALTER TABLE public.image OWNER TO deploy;
+
+CREATE TABLE public.image_flickr
+  PARTITION OF public.image FOR VALUES IN ('flickr');
+CREATE TABLE public.image_wikimedia
+  PARTITION OF public.image FOR VALUES IN ('wikimedia');
+CREATE TABLE public.image_smithsonian
+  PARTITION OF public.image FOR VALUES IN ('smithsonian');
+CREATE TABLE public.image_europeana
+  PARTITION OF public.image FOR VALUES IN ('europeana');
+CREATE TABLE public.image_default
+  PARTITION OF public.image DEFAULT;
+
+ALTER TABLE public.image_flickr OWNER TO deploy;
+ALTER TABLE public.image_wikimedia OWNER TO deploy;
+ALTER TABLE public.image_smithsonian OWNER TO deploy;
+ALTER TABLE public.image_europeana OWNER TO deploy;
+ALTER TABLE public.image_default OWNER TO deploy;
+
 CREATE UNIQUE INDEX image_provider_fid_idx
   ON public.image
   USING btree (provider, md5(foreign_identifier));
+CREATE INDEX image_identifier_idx
+  ON public.image (identifier);